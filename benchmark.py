@@ -0,0 +1,496 @@
+"""
+Script de mediciones de rendimiento del generador de documentos.
+Cada escenario imprime la latencia por documento (o por operación) de la
+ruta anterior y de la ruta optimizada.
+
+Uso:
+    python benchmark.py [escenario ...] [--repeticiones N]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.image.image import Image as ImagenDocx
+from docx.opc.oxml import serialize_part_xml
+from PIL import Image
+
+from src.generador import (
+    ETIQUETAS_TECNICAS, agregar_tabla_masiva, agregar_tabla_tecnica, construir_documento
+)
+from src.imagenes import CacheImagenes, cargar_imagen
+from src.utils import validar_imagen
+from src.empaquetado import PoliticaCompresion, POLITICA_PYTHON_DOCX, guardar_documento
+from src.metricas import obtener_metricas
+from src.plantillas import obtener_plantilla
+from src.renderizador_xml import comparar_document_xml, renderizar_documento_xml
+from src.servicio import ServicioDocumentos
+from src.esquema import validar_registro
+from src.consolidado import generar_consolidado
+from src.publicacion import POLITICAS_FSYNC, publicar, sincronizar_pendientes
+
+# document.xml de referencia de cada caso de casos_paridad(), generados con el
+# generador original (commit base, python-docx sin plantillas en caché) con las
+# imágenes de imagenes/. Si un caso cambia, hay que volver a generarlo desde ese commit
+CARPETA_REFERENCIAS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   "referencias", "paridad")
+
+# Registro datos de ejemplo usado por todos los escenarios
+ARBOL_EJEMPLO = {
+    "id": "BENCH001",
+    "nombre": "Ceiba de prueba",
+    "descripcion": "Registro sintético para mediciones de rendimiento",
+    "ubicacion": "Parque Central",
+    "especie": "Ceiba pentandra",
+    "altura_metros": 25.0,
+    "edad_aproximada": "80 años",
+    "estado_salud": "Bueno",
+    "fecha": "2024-04-12",
+    "imagen": "ceiba.jpg",
+    "tabla_extendida": [
+        {"atributo": "Diámetro del tronco", "valor": "1.2 metros"},
+        {"atributo": "Tipo de corteza", "valor": "Lisa con espinas"}
+    ],
+    "pie_imagen": "Vista frontal de la ceiba"
+}
+
+
+def medir(funcion, repeticiones):
+    """
+    Ejecuta una función varias veces y devuelve sus tiempos en milisegundos.
+
+    Returns:
+        list: Duración de cada repetición en ms
+    """
+    if repeticiones > 1:
+        funcion()  # Calentamiento (carga de módulos y cachés)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def reportar(nombre, tiempos):
+    """Imprime la mediana y el percentil 95 de una serie de tiempos"""
+    ordenados = sorted(tiempos)
+    p95 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))]
+    print(f"  {nombre:<40} mediana {statistics.median(ordenados):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def escenario_plantillas(repeticiones):
+    """Document() desde disco frente a copias del pool de plantillas"""
+    plantilla = obtener_plantilla()
+
+    def guardar(doc):
+        doc.add_paragraph("Texto de prueba")
+        doc.save(io.BytesIO())
+
+    reportar("Document() (antes)", medir(Document, repeticiones))
+    reportar("pool.nuevo_documento() (después)", medir(plantilla.nuevo_documento, repeticiones))
+    reportar("Document() + save (antes)", medir(lambda: guardar(Document()), repeticiones))
+    reportar("pool + save (después)",
+             medir(lambda: guardar(plantilla.nuevo_documento()), repeticiones))
+
+
+def casos_paridad():
+    """
+    Registros que cubren las ramas del diseño y los casos límite del texto.
+
+    Returns:
+        list: Pares (nombre_del_caso, registro)
+    """
+    sin_extras = {k: v for k, v in ARBOL_EJEMPLO.items()
+                  if k not in ("tabla_extendida", "imagen", "pie_imagen")}
+    return [
+        ("completo", ARBOL_EJEMPLO),
+        ("minimo", {"id": "P1", "nombre": "N", "descripcion": "", "fecha": "2024-01-01"}),
+        ("sin_extras", sin_extras),
+        ("pie_tabla", dict(ARBOL_EJEMPLO, pie_tabla="Datos de campo 2024")),
+        ("imagen_sin_pie", {k: v for k, v in ARBOL_EJEMPLO.items() if k != "pie_imagen"}),
+        ("imagen_inexistente", dict(ARBOL_EJEMPLO, imagen="no_existe.jpg")),
+        ("texto_especial", dict(
+            ARBOL_EJEMPLO,
+            nombre="Árbol <raro> & \"comillas\"",
+            descripcion="  espacios\tcon tab\ny salto\r\nfinal  ",
+            ubicacion=" Parque\tNorte ",
+            tabla_extendida=[{"atributo": " a ", "valor": "x\ty"}, {"atributo": "", "valor": ""}],
+        )),
+    ]
+
+
+def casos_invalidos():
+    """
+    Registros que el validador debe rechazar con un error, sin lanzar excepciones.
+
+    Returns:
+        list: Tuplas (nombre_del_caso, registro, error_esperado)
+    """
+    return [
+        ("altura_desbordada", dict(ARBOL_EJEMPLO, altura_metros=10 ** 400),
+         "altura_metros: debe ser un número finito"),
+        ("altura_infinita", dict(ARBOL_EJEMPLO, altura_metros="1e999"),
+         "altura_metros: debe ser un número finito"),
+        ("altura_texto", dict(ARBOL_EJEMPLO, altura_metros="alto"),
+         "altura_metros: debe ser un número"),
+    ]
+
+
+def escenario_paridad(repeticiones):
+    """Compara document.xml de ambos motores con el del generador original"""
+    # En formato normal cada motor se compara con la referencia de
+    # CARPETA_REFERENCIAS; el formato compacto no existía en el original, así
+    # que ahí se comparan los dos motores entre sí
+    fallos = 0
+
+    def comprobar(etiqueta, esperado, obtenido):
+        nonlocal fallos
+        iguales, mensaje = comparar_document_xml(esperado, obtenido)
+        fallos += not iguales
+        print(f"  {'✅' if iguales else '❌'} {etiqueta:<42} {mensaje}")
+
+    for compacto in (False, True):
+        for nombre, registro in casos_paridad():
+            doc = construir_documento(registro, "imagenes", formato_compacto=compacto)
+            xml_docx = serialize_part_xml(doc.element)
+            contenido = renderizar_documento_xml(registro, "imagenes", formato_compacto=compacto)
+            with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+                xml_xml = zf.read("word/document.xml")
+            if compacto:
+                comprobar(f"{nombre} (compacto) xml = docx", xml_docx, xml_xml)
+                continue
+            with open(os.path.join(CARPETA_REFERENCIAS, f"{nombre}.xml"), "rb") as f:
+                referencia = f.read()
+            comprobar(f"{nombre} docx = original", referencia, xml_docx)
+            comprobar(f"{nombre} xml = original", referencia, xml_xml)
+    for nombre, registro, esperado in casos_invalidos():
+        try:
+            errores = validar_registro(registro)
+        except Exception as e:
+            errores = [f"{type(e).__name__}: {e}"]
+        rechazado = errores == [esperado]
+        fallos += not rechazado
+        print(f"  {'✅' if rechazado else '❌'} {f'{nombre} rechazado':<42} {'; '.join(errores)}")
+    if fallos:
+        sys.exit(1)
+
+
+def escenario_motores(repeticiones):
+    """Documento completo en memoria con el motor python-docx y con el motor XML"""
+    def motor_docx():
+        construir_documento(ARBOL_EJEMPLO, "imagenes").save(io.BytesIO())
+
+    reportar("motor docx", medir(motor_docx, repeticiones))
+    reportar("motor xml", medir(lambda: renderizar_documento_xml(ARBOL_EJEMPLO, "imagenes"),
+                                repeticiones))
+
+
+def tabla_por_filas(doc, filas):
+    """Ruta anterior: add_row() + cells[...] por cada fila (cuadrática)"""
+    tabla = doc.add_table(rows=0, cols=2)
+    tabla.style = 'Table Grid'
+    tabla.autofit = True
+    for atributo, valor in filas:
+        fila = tabla.add_row()
+        fila.cells[0].text = atributo
+        fila.cells[1].text = valor
+    return tabla
+
+
+def escenario_tabla_extendida(repeticiones, max_filas_antes=1000):
+    """tabla_extendida con add_row() frente al constructor en bloque (10, 1k y 10k filas)"""
+    plantilla = obtener_plantilla()
+    for cantidad in (10, 1000, 10000):
+        filas = [(f"Medición {i}", f"{i * 0.1:.1f} cm") for i in range(cantidad)]
+        # La ruta anterior es cuadrática: se mide una sola vez a partir de 1k filas
+        veces = repeticiones if cantidad < 1000 else 1
+        if cantidad <= max_filas_antes:
+            reportar(f"{cantidad} filas add_row (antes)",
+                     medir(lambda: tabla_por_filas(plantilla.nuevo_documento(), filas), veces))
+        else:
+            print(f"  {cantidad} filas add_row (antes)              omitido (cuadrático)")
+        reportar(f"{cantidad} filas en bloque (después)",
+                 medir(lambda: agregar_tabla_masiva(plantilla.nuevo_documento(), filas,
+                                                    'Table Grid', autoajuste=True), veces))
+
+
+def escenario_tabla_tecnica(repeticiones):
+    """Etapa de la tabla técnica: 10 llamadas a cell().text frente al fragmento clonado"""
+    plantilla = obtener_plantilla()
+    valores = ["Parque Central", "Ceiba pentandra", "25.0", "80 años", "Bueno"]
+    documentos = [plantilla.nuevo_documento() for _ in range(repeticiones + 1)]
+
+    def tabla_por_celdas():
+        tabla = documentos.pop().add_table(rows=5, cols=2)
+        tabla.style = 'Light Grid Accent 1'
+        for i, (campo, valor) in enumerate(zip(ETIQUETAS_TECNICAS, valores)):
+            tabla.cell(i, 0).text = campo
+            tabla.cell(i, 1).text = valor
+
+    reportar("add_table + cell().text (antes)", medir(tabla_por_celdas, repeticiones))
+    documentos = [plantilla.nuevo_documento() for _ in range(repeticiones + 1)]
+    reportar("fragmento precompilado (después)",
+             medir(lambda: agregar_tabla_tecnica(documentos.pop(), valores), repeticiones))
+
+
+def escenario_estilos(repeticiones):
+    """Resolución de los cuatro estilos del diseño: XPath sobre styles.xml frente a la caché"""
+    plantilla = obtener_plantilla()
+    estilos = [("Title", WD_STYLE_TYPE.PARAGRAPH), ("Intense Quote", WD_STYLE_TYPE.PARAGRAPH),
+               ("Light Grid Accent 1", WD_STYLE_TYPE.TABLE), ("Table Grid", WD_STYLE_TYPE.TABLE)]
+    parte = plantilla.nuevo_documento().part
+
+    reportar("get_style_id (antes)",
+             medir(lambda: [parte.get_style_id(n, t) for n, t in estilos], repeticiones))
+    reportar("caché de la plantilla (después)",
+             medir(lambda: [plantilla.id_estilo(n, t) for n, t in estilos], repeticiones))
+    metricas = obtener_metricas()
+    print(f"  aciertos {metricas.get('estilos_cache_aciertos', 0)}"
+          f"   fallos {metricas.get('estilos_cache_fallos', 0)}")
+
+
+def escenario_formato_compacto(repeticiones):
+    """Formato directo por run frente a estilos de carácter compartidos"""
+    registro = dict(ARBOL_EJEMPLO, pie_tabla="Datos de campo 2024", tabla_extendida=[
+        {"atributo": f"Medición {i}", "valor": f"{i} cm"} for i in range(20)
+    ])
+    for compacto in (False, True):
+        nombre = "compacto (después)" if compacto else "directo (antes)"
+        doc = construir_documento(registro, "imagenes", formato_compacto=compacto)
+        xml = serialize_part_xml(doc.element)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        print(f"  {nombre:<40} document.xml {len(xml):7d} B   .docx {len(buffer.getvalue()):7d} B")
+        reportar(f"serializar document.xml {nombre}",
+                 medir(lambda: serialize_part_xml(doc.element), repeticiones))
+
+
+def escenario_imagenes(repeticiones):
+    """Lectura + análisis + SHA1 de la foto por documento frente a la caché LRU"""
+    ruta = "imagenes/ceiba.jpg"
+
+    def sin_cache():
+        ImagenDocx.from_file(ruta).sha1
+
+    cache = CacheImagenes(64 * 1024 * 1024)
+    reportar("Image.from_file + sha1 (antes)", medir(sin_cache, repeticiones))
+    reportar("caché por ruta/mtime/tamaño (después)", medir(lambda: cache.obtener(ruta), repeticiones))
+    estadisticas = cache.estadisticas()
+    print(f"  aciertos {estadisticas['aciertos']}   fallos {estadisticas['fallos']}"
+          f"   desalojos {estadisticas['desalojos']}   tasa {estadisticas['tasa_aciertos']:.1%}")
+
+
+def escenario_preparacion_imagen(repeticiones):
+    """Foto de 2000x1500 incrustada tal cual frente a la variante redimensionada a 4 pulgadas"""
+    temporal = tempfile.mkdtemp()
+    try:
+        # Contenido aleatorio: su variante nunca está aún en la caché en disco
+        ruta = os.path.join(temporal, "grande.jpg")
+        Image.effect_noise((2000, 1500), 64).convert("RGB").save(ruta, quality=95)
+
+        inicio = time.perf_counter()
+        preparada, _ = CacheImagenes(64 * 1024 * 1024).obtener(ruta, optimizar=True)
+        print(f"  primera preparación (caché en disco vacía) {(time.perf_counter() - inicio) * 1000:8.3f} ms")
+        reportar("preparación desde la caché en disco",
+                 medir(lambda: CacheImagenes(64 * 1024 * 1024).obtener(ruta, optimizar=True),
+                       repeticiones))
+        cache = CacheImagenes(64 * 1024 * 1024)
+        reportar("preparación desde la caché en memoria",
+                 medir(lambda: cache.obtener(ruta, optimizar=True), repeticiones))
+        print(f"  original  {os.path.getsize(ruta):9d} B  2000x1500")
+        print(f"  preparada {len(preparada.blob):9d} B  {preparada.px_width}x{preparada.px_height}")
+    finally:
+        shutil.rmtree(temporal)
+
+
+def escenario_carga_imagen(repeticiones):
+    """validar_imagen (PIL) + lectura para python-docx frente a una sola lectura por imagen"""
+    ruta = "imagenes/ceiba.jpg"
+
+    def dos_lecturas():
+        validar_imagen(ruta)
+        ImagenDocx.from_file(ruta).sha1
+
+    def una_lectura():
+        CacheImagenes(64 * 1024 * 1024).obtener(ruta)  # Caché vacía: mide la lectura
+
+    reportar("validar + from_file (antes)", medir(dos_lecturas, repeticiones))
+    reportar("lectura única sin caché (después)", medir(una_lectura, repeticiones))
+    reportar("cargar_imagen con caché", medir(lambda: cargar_imagen(ruta), repeticiones))
+
+
+def escenario_compresion(repeticiones):
+    """Document.save() (ZIP_DEFLATED en todo) frente a la política por tipo de contenido"""
+    politicas = [
+        ("Document.save (antes)", None),
+        ("deflate 6, medios también", POLITICA_PYTHON_DOCX),
+        ("xml nivel 6, medios almacenados", PoliticaCompresion(6, True)),
+        ("xml nivel 1, medios almacenados", PoliticaCompresion(1, True)),
+        ("xml nivel 9, medios almacenados", PoliticaCompresion(9, True)),
+    ]
+    registro = dict(ARBOL_EJEMPLO, tabla_extendida=[
+        {"atributo": f"Atributo {n}", "valor": f"Valor {n}"} for n in range(1000)
+    ])
+    for nombre_caso, datos in (("foto", ARBOL_EJEMPLO), ("foto + 1000 filas", registro)):
+        doc = construir_documento(datos, "imagenes")
+        print(f"  {nombre_caso}")
+        for nombre, politica in politicas:
+            def guardar():
+                salida = io.BytesIO()
+                if politica is None:
+                    doc.save(salida)
+                else:
+                    guardar_documento(doc, salida, politica)
+                return salida
+
+            tiempos = medir(guardar, repeticiones)
+            mediana = statistics.median(tiempos)
+            print(f"    {nombre:<33} mediana {mediana:8.3f} ms  {1000 / mediana:7.0f} docs/s"
+                  f"  {len(guardar().getvalue()):8d} B")
+
+
+
+def escenario_servicio(repeticiones, niveles=(1, 4)):
+    """Latencia de POST /documentos en el servicio HTTP con clientes concurrentes"""
+    cuerpo = json.dumps(ARBOL_EJEMPLO).encode('utf-8')
+    solicitud = (b'POST /documentos HTTP/1.1\r\nHost: localhost\r\n'
+                 b'Content-Type: application/json\r\n'
+                 b'Content-Length: ' + str(len(cuerpo)).encode() + b'\r\n\r\n' + cuerpo)
+
+    async def cliente(puerto, cantidad, tiempos):
+        lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+        for _ in range(cantidad):
+            inicio = time.perf_counter()
+            escritor.write(solicitud)
+            cabecera = await lector.readuntil(b'\r\n\r\n')
+            longitud = int(cabecera.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+            await lector.readexactly(longitud)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        escritor.close()
+
+    async def rechazo(puerto, registro):
+        cuerpo_invalido = json.dumps(registro).encode('utf-8')
+        lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+        escritor.write(b'POST /documentos HTTP/1.1\r\nHost: localhost\r\n'
+                       b'Content-Length: ' + str(len(cuerpo_invalido)).encode() + b'\r\n'
+                       b'Connection: close\r\n\r\n' + cuerpo_invalido)
+        respuesta = await lector.read()
+        escritor.close()
+        return respuesta.split(b' ', 2)[1].decode() if respuesta else 'conexión cerrada'
+
+    async def medir_servicio():
+        servicio = ServicioDocumentos("imagenes")
+        servidor = await servicio.iniciar('127.0.0.1', 0)
+        puerto = servidor.sockets[0].getsockname()[1]
+        try:
+            for nombre, registro, _ in casos_invalidos():
+                estado = await rechazo(puerto, registro)
+                print(f"  {'✅' if estado == '400' else '❌'} {f'{nombre} -> 400':<40} {estado}")
+            await cliente(puerto, servicio.trabajadores, [])  # Calentamiento
+            print(f"  {servicio.trabajadores} procesos, {repeticiones} solicitudes por cliente")
+            for clientes in niveles:
+                tiempos = []
+                await asyncio.gather(*(cliente(puerto, repeticiones, tiempos)
+                                       for _ in range(clientes)))
+                ordenados = sorted(tiempos)
+                p99 = ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))]
+                print(f"  {f'{clientes} clientes concurrentes':<40} mediana "
+                      f"{statistics.median(ordenados):8.3f} ms   p99 {p99:8.3f} ms")
+            render = servicio.latencias_render.resumen()
+            print(f"  {'renderizado en el trabajador':<40} mediana {render['p50_ms']:8.3f} ms   "
+                  f"p99 {render['p99_ms']:8.3f} ms")
+        finally:
+            servicio.cerrar()
+
+    asyncio.run(medir_servicio())
+
+
+
+def escenario_consolidado(repeticiones, arboles=1000):
+    """Mil árboles como documentos individuales frente a un informe consolidado en streaming"""
+    registros = [dict(ARBOL_EJEMPLO, id=f"BENCH{i:05d}") for i in range(arboles)]
+    with tempfile.TemporaryDirectory() as carpeta:
+        def individuales():
+            for registro in registros:
+                renderizar_documento_xml(registro, "imagenes")
+
+        def consolidado():
+            return generar_consolidado(iter(registros), os.path.join(carpeta, "informe.docx"),
+                                       "imagenes")
+
+        for nombre, funcion in (("documentos individuales (xml)", individuales),
+                                ("informe consolidado", consolidado)):
+            tiempos = medir(funcion, max(1, repeticiones // 25))
+            print(f"    {nombre:<33} mediana {statistics.median(tiempos) / arboles:8.3f} ms/árbol")
+        estado = consolidado()
+        tamano = os.path.getsize(os.path.join(carpeta, "informe.docx"))
+        print(f"    {arboles} árboles, {estado['imagenes']} imagen(es) en el paquete, {tamano} B")
+
+
+def escenario_publicacion(repeticiones, documentos=200):
+    """Escritura directa frente a temporal + renombrado con cada política de fsync"""
+    contenido = renderizar_documento_xml(ARBOL_EJEMPLO, "imagenes")
+    with tempfile.TemporaryDirectory() as carpeta:
+        def directa():
+            for n in range(documentos):
+                with open(os.path.join(carpeta, f"directo_{n}.docx"), 'wb') as f:
+                    f.write(contenido)
+
+        def atomica(fsync):
+            def escribir():
+                for n in range(documentos):
+                    publicar(os.path.join(carpeta, f"{fsync}_{n}.docx"), contenido, fsync)
+                sincronizar_pendientes()
+            return escribir
+
+        casos = [("escritura directa (antes)", directa)]
+        casos += [(f"temporal + renombrado, fsync {fsync}", atomica(fsync))
+                  for fsync in POLITICAS_FSYNC]
+        for nombre, funcion in casos:
+            tiempos = medir(funcion, max(1, repeticiones // 25))
+            print(f"    {nombre:<40} mediana {statistics.median(tiempos) / documentos:8.3f} ms/doc")
+
+
+ESCENARIOS = {
+    "plantillas": escenario_plantillas,
+    "paridad": escenario_paridad,
+    "motores": escenario_motores,
+    "tabla_extendida": escenario_tabla_extendida,
+    "tabla_tecnica": escenario_tabla_tecnica,
+    "estilos": escenario_estilos,
+    "formato_compacto": escenario_formato_compacto,
+    "imagenes": escenario_imagenes,
+    "preparacion_imagen": escenario_preparacion_imagen,
+    "carga_imagen": escenario_carga_imagen,
+    "compresion": escenario_compresion,
+    "servicio": escenario_servicio,
+    "consolidado": escenario_consolidado,
+    "publicacion": escenario_publicacion,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mediciones de rendimiento")
+    parser.add_argument("escenarios", nargs="*", default=list(ESCENARIOS),
+                        help=f"Escenarios a ejecutar: {', '.join(ESCENARIOS)}")
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    for nombre in args.escenarios:
+        print(f"📊 {nombre}: {ESCENARIOS[nombre].__doc__}")
+        ESCENARIOS[nombre](args.repeticiones)
+
+
+if __name__ == "__main__":
+    main()
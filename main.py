@@ -1,45 +1,265 @@
 """
 Script principal para la generación de documentos de árboles.
 Este módulo coordina la carga de archivos JSON y la generación de documentos Word.
+
+Los archivos se procesan como un flujo: os.scandir → lectura → validación →
+renderizado, repartido entre varios procesos (--jobs) y sin cargar nunca la
+lista completa de árboles en memoria. También procesa inventarios JSON Lines
+(.jsonl, .jsonl.gz, .jsonl.xz) línea por línea, reanudando desde su punto de
+control si se interrumpieron. Con --actualizar solo se regeneran, en paralelo,
+los documentos cuya imagen o plantilla cambió desde que se generaron. Con
+--consolidado cada inventario produce un único documento con todos sus árboles.
+Con --profile se guarda el perfil de cProfile de los documentos lentos en perfiles/.
+Al terminar se muestra un resumen de rendimiento.
 """
 
-import json
+import argparse
 import os
-from src.generador import generar_documento
+import time
+from src.consolidado import generar_consolidado
+from src.distribucion import obtener_manifiesto
+from src.lectores import EXTENSIONES_JSONL, PuntoControl, es_jsonl, leer_jsonl
+from src.perfilado import agregar_argumentos, desde_argumentos
+from src.procesamiento import (
+    crear_pool, numero_trabajadores, mapear_acotado, omitir_existentes, procesar_archivo,
+    procesar_jsonl, renderizar_registro, documentos_desactualizados, regenerar_documento,
+    reportar_metricas
+)
+from src.utils import logger
 
 # Definición de rutas principales del proyecto
 CARPETA_ENTRADA = "entrada"    # Carpeta donde se encuentran los archivos JSON
 CARPETA_IMAGENES = "imagenes"  # Carpeta donde se almacenan las imágenes de los árboles
 CARPETA_SALIDA = "salida"      # Carpeta donde se guardarán los documentos generados
 
-def cargar_jsons(carpeta):
+# Trabajos enviados por proceso sin terminar: mantiene ocupados a los
+# trabajadores sin acumular la carpeta entera en la cola del pool
+EN_VUELO_POR_TRABAJADOR = 4
+
+def iterar_jsons(carpeta):
     """
-    Carga todos los archivos JSON de una carpeta especificada.
-    
+    Recorre los archivos JSON de una carpeta a medida que se consumen.
+
     Args:
         carpeta (str): Ruta de la carpeta que contiene los archivos JSON
-        
+
+    Returns:
+        Iterator[str]: Ruta de cada archivo .json
+    """
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if entrada.name.endswith('.json') and entrada.is_file():
+                yield entrada.path
+
+def buscar_inventarios(carpeta):
+    """
+    Devuelve los archivos JSON Lines de una carpeta.
+
+    Args:
+        carpeta (str): Ruta de la carpeta de entrada
+
     Returns:
-        list: Lista de diccionarios con la información de cada árbol
+        list: Rutas de los archivos .jsonl, .jsonl.gz y .jsonl.xz
+    """
+    with os.scandir(carpeta) as entradas:
+        return sorted(e.path for e in entradas if e.is_file() and es_jsonl(e.name))
+
+class Resumen:
+    """Contadores y tiempos de la ejecución para el reporte final"""
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.primer_documento = None
+        self.completados = 0
+        self.fallidos = 0
+        self.reutilizados = 0
+
+    def registrar(self, exito, reutilizado=False):
+        """Cuenta un documento terminado (o fallido, o sin cambios según el índice)"""
+        if exito and reutilizado:
+            self.reutilizados += 1
+        elif exito:
+            self.completados += 1
+            if self.primer_documento is None:
+                self.primer_documento = time.perf_counter() - self.inicio
+        else:
+            self.fallidos += 1
+
+    def reportar(self, trabajadores):
+        """Registra el total, la duración, el rendimiento y el tiempo al primer documento"""
+        duracion = time.perf_counter() - self.inicio
+        total = self.completados + self.fallidos
+        logger.info(
+            f"📈 {self.completados} documentos generados, {self.fallidos} fallidos, "
+            f"{self.reutilizados} sin cambios omitidos, "
+            f"en {duracion:.2f} s con {trabajadores} procesos "
+            f"({total / duracion if duracion else 0:.1f} archivos/s)"
+        )
+        if self.primer_documento is not None:
+            logger.info(f"⏱️ Primer documento a los {self.primer_documento:.2f} s")
+
+def procesar_jsons(pool, carpeta, trabajadores, resumen):
+    """
+    Genera un documento por cada archivo JSON de la carpeta.
+
+    Args:
+        pool (ProcessPoolExecutor): Pool de procesos
+        carpeta (str): Carpeta con los archivos JSON
+        trabajadores (int): Número de procesos del pool
+        resumen (Resumen): Contadores de la ejecución
+    """
+    resultados = mapear_acotado(
+        pool, procesar_archivo, iterar_jsons(carpeta), trabajadores * EN_VUELO_POR_TRABAJADOR,
+        CARPETA_IMAGENES, CARPETA_SALIDA
+    )
+    for ruta, resultado in resultados:
+        if isinstance(resultado, Exception):  # Proceso trabajador caído
+            logger.error(f"❌ Error al procesar {ruta}: {resultado}")
+            resumen.registrar(False)
+        else:
+            resumen.registrar(resultado[0], resultado[2])
+
+def procesar_inventarios(pool, rutas, trabajadores, resumen):
+    """
+    Genera un documento por cada registro de los inventarios JSON Lines.
+
+    Los registros se leen en streaming; el avance queda en
+    <inventario>.checkpoint, de modo que una ejecución interrumpida (Ctrl+C)
+    continúa donde se detuvo. Al terminar un inventario se borra su punto de
+    control: la siguiente ejecución lo recorre completo y el índice omite los
+    documentos sin cambios.
+
+    Args:
+        pool (ProcessPoolExecutor): Pool de procesos
+        rutas (list): Rutas de los archivos JSON Lines
+        trabajadores (int): Número de procesos del pool
+        resumen (Resumen): Contadores de la ejecución
+    """
+    def terminado(futuro):
+        if futuro.cancelled():
+            return
+        if futuro.exception() is not None:  # Proceso trabajador caído
+            resumen.registrar(False)
+            return
+        exito, _, reutilizado = futuro.result()
+        resumen.registrar(exito, reutilizado)
+
+    def enviar(registro):
+        futuro = pool.submit(renderizar_registro, registro, CARPETA_IMAGENES, CARPETA_SALIDA)
+        futuro.add_done_callback(terminado)
+        return futuro
+
+    # Los registros sin cambios se detectan en bloque y no llegan al pool
+    existentes = omitir_existentes(CARPETA_IMAGENES, CARPETA_SALIDA)
+    for ruta in rutas:
+        estado = procesar_jsonl(ruta, enviar, trabajadores * EN_VUELO_POR_TRABAJADOR,
+                                existentes=existentes)
+        resumen.reutilizados += estado['reutilizados']
+        # Los registros enviados al pool ya se cuentan al terminar su futuro;
+        # los inválidos nunca llegaron a él
+        resumen.fallidos += estado['invalidos']
+        if estado['terminado']:
+            PuntoControl(ruta).eliminar()
+        logger.info(f"📦 {ruta}: {estado['completados']} documentos, "
+                    f"{estado['fallidos']} fallidos, {estado['reutilizados']} sin cambios "
+                    f"(línea {estado['linea']})")
+
+def actualizar_documentos(pool, trabajadores, resumen):
+    """
+    Regenera los documentos cuya imagen o plantilla cambió desde que se generaron.
+
+    Cada documento se sobrescribe en su misma ruta; los que no dependen de
+    ningún recurso modificado no se tocan.
+
+    Args:
+        pool (ProcessPoolExecutor): Pool de procesos
+        trabajadores (int): Número de procesos del pool
+        resumen (Resumen): Contadores de la ejecución
+    """
+    filas = documentos_desactualizados()
+    logger.info(f"🔄 {len(filas)} documentos con dependencias modificadas")
+    resultados = mapear_acotado(
+        pool, regenerar_documento, filas, trabajadores * EN_VUELO_POR_TRABAJADOR
+    )
+    for fila, resultado in resultados:
+        if isinstance(resultado, Exception):  # Proceso trabajador caído
+            logger.error(f"❌ Error al regenerar {fila['ruta_salida']}: {resultado}")
+            resumen.registrar(False)
+        else:
+            resumen.registrar(resultado[0])
+
+def consolidar_inventarios(rutas, resumen):
     """
-    archivos = [f for f in os.listdir(carpeta) if f.endswith('.json')]
-    datos = []
-    for archivo in archivos:
-        with open(os.path.join(carpeta, archivo), 'r', encoding='utf-8') as f:
-            datos.append(json.load(f))
-    return datos
+    Genera un documento por inventario con todos sus árboles (p. ej. uno por parque).
+
+    Args:
+        rutas (list): Rutas de los archivos JSON Lines
+        resumen (Resumen): Contadores de la ejecución
+    """
+    for ruta in rutas:
+        def registros():
+            for _, _, registro, error in leer_jsonl(ruta):
+                if registro is None:
+                    logger.error(f"❌ {ruta}: {error}")
+                yield registro
+
+        nombre = os.path.basename(ruta)
+        for extension in EXTENSIONES_JSONL:
+            if nombre.endswith(extension):
+                nombre = nombre[:-len(extension)]
+                break
+        destino = os.path.join(CARPETA_SALIDA, f"{nombre}.docx")
+        try:
+            estado = generar_consolidado(registros(), destino, CARPETA_IMAGENES)
+        except Exception as e:
+            logger.error(f"❌ Error al consolidar {ruta}: {e}")
+            resumen.registrar(False)
+            continue
+        manifiesto = obtener_manifiesto(CARPETA_SALIDA)
+        if manifiesto is not None:
+            manifiesto.registrar(nombre, destino)
+        resumen.registrar(True)
+        resumen.fallidos += estado['omitidos']
 
 def main():
     """
     Función principal que coordina el proceso de generación de documentos.
-    Lee los archivos JSON y genera un documento Word para cada árbol.
+    Genera un documento Word por cada JSON de la carpeta de entrada y luego
+    procesa los inventarios JSON Lines indicados (o los de la carpeta de entrada).
     """
-    # Cargar todos los datos de los árboles
-    arboles = cargar_jsons(CARPETA_ENTRADA)
-    
-    # Generar un documento para cada árbol
-    for arbol in arboles:
-        generar_documento(arbol, CARPETA_IMAGENES, CARPETA_SALIDA)
+    parser = argparse.ArgumentParser(description="Genera documentos Word de árboles")
+    parser.add_argument("inventarios", nargs="*",
+                        help="Archivos JSON Lines a procesar (por defecto, los de entrada/)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Número de procesos (por defecto, todos los núcleos)")
+    parser.add_argument("--actualizar", action="store_true",
+                        help="Solo regenerar los documentos cuya imagen o plantilla cambió")
+    parser.add_argument("--consolidado", action="store_true",
+                        help="Un solo documento por inventario con todos sus árboles")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    trabajadores = numero_trabajadores(args.jobs)
+    resumen = Resumen()
+    if args.consolidado:
+        # Un documento por inventario escrito en streaming: no hace falta el pool
+        consolidar_inventarios(args.inventarios or buscar_inventarios(CARPETA_ENTRADA), resumen)
+        resumen.reportar(1)
+        reportar_metricas()
+        return
+    try:
+        with crear_pool(trabajadores, perfilado=desde_argumentos(args)) as pool:
+            if args.actualizar:
+                actualizar_documentos(pool, trabajadores, resumen)
+            else:
+                if not args.inventarios:
+                    procesar_jsons(pool, CARPETA_ENTRADA, trabajadores, resumen)
+                procesar_inventarios(pool, args.inventarios or buscar_inventarios(CARPETA_ENTRADA),
+                                     trabajadores, resumen)
+    except KeyboardInterrupt:
+        logger.info("🛑 Interrumpido: los inventarios se reanudarán desde su punto de control")
+    resumen.reportar(trabajadores)
+    # Duración y bytes por etapa de todos los procesos: metricas.prom y metricas.json
+    reportar_metricas()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
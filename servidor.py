@@ -0,0 +1,35 @@
+"""
+Servicio HTTP local para generar documentos de árboles bajo demanda.
+
+Otras herramientas envían el JSON del árbol y reciben el .docx en la respuesta,
+sin dejar archivos en entrada/ ni esperar en salida/:
+
+    curl -X POST --data @arbol.json http://127.0.0.1:8080/documentos -o arbol.docx
+    curl http://127.0.0.1:8080/metricas
+"""
+
+import argparse
+import asyncio
+from src.config import SERVICIO_HOST, SERVICIO_PUERTO
+from src.servicio import servir
+from src.utils import logger
+
+# Carpeta que contiene las imágenes referenciadas por los JSON
+CARPETA_IMAGENES = "imagenes"
+
+def main():
+    """Inicia el servicio hasta que se presione Ctrl+C"""
+    parser = argparse.ArgumentParser(description="Servicio HTTP de documentos de árboles")
+    parser.add_argument("--host", default=SERVICIO_HOST)
+    parser.add_argument("--puerto", type=int, default=SERVICIO_PUERTO)
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Número de procesos (por defecto, todos los núcleos)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(servir(CARPETA_IMAGENES, args.host, args.puerto, args.jobs))
+    except KeyboardInterrupt:
+        logger.info("✅ Servicio detenido correctamente")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Módulo de Bitácora para el Generador de Documentos de Árboles
+Este módulo configura el logging del proyecto de forma que la escritura en
+consola y en disco no ocurra en el camino del renderizado.
+
+Características principales:
+- Los registros se encolan y un hilo en segundo plano los escribe
+- Los procesos del pool envían sus registros al proceso principal por una
+  cola compartida: un solo escritor por archivo, también al rotarlo
+- Rotación de app.log por tamaño o por tiempo
+- Formato de texto o JSON Lines con campos por registro (id, etapa, duración)
+- Límite de mensajes repetidos por línea de código, con muestreo del exceso
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.queues
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.config import (
+    LOG_ARCHIVO, LOG_NIVEL, LOG_FORMATO, LOG_ROTACION, LOG_MAX_BYTES, LOG_ROTACION_CUANDO,
+    LOG_RESPALDOS, LOG_LIMITE_REPETIDOS, LOG_VENTANA_REPETIDOS, LOG_MUESTREO_REPETIDOS
+)
+
+# Formato: [Fecha y Hora] - [Nivel de Log] - Mensaje
+FORMATO_TEXTO = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Campos propios que acepta un registro: logger.info(..., extra={'id': ..., 'etapa': ...,
+# 'duracion': segundos})
+CAMPOS_EXTRA = ('id', 'etapa', 'duracion')
+
+# Hilos escritores y manejadores del proceso principal
+_oyentes: List[logging.handlers.QueueListener] = []
+_manejadores: List[logging.Handler] = []
+_cola_procesos: Optional[multiprocessing.queues.Queue] = None
+_bloqueo = threading.Lock()
+_configurada = False
+
+
+class FormatoTexto(logging.Formatter):
+    """Formato de texto que indica cuántos mensajes similares se omitieron antes"""
+    def format(self, registro: logging.LogRecord) -> str:
+        texto = super().format(registro)
+        omitidos = getattr(registro, 'omitidos', 0)
+        if omitidos:
+            texto += f" (+{omitidos} mensajes similares omitidos)"
+        return texto
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro: fecha, nivel, proceso, mensaje y los campos extra presentes"""
+    def format(self, registro: logging.LogRecord) -> str:
+        entrada = {
+            'fecha': datetime.fromtimestamp(registro.created).isoformat(timespec='milliseconds'),
+            'nivel': registro.levelname,
+            'proceso': registro.process,
+            'mensaje': registro.getMessage(),
+        }
+        for campo in CAMPOS_EXTRA:
+            valor = getattr(registro, campo, None)
+            if valor is None:
+                continue
+            if campo == 'duracion':
+                entrada['duracion_ms'] = round(valor * 1000, 3)
+            else:
+                entrada[campo] = valor
+        omitidos = getattr(registro, 'omitidos', 0)
+        if omitidos:
+            entrada['omitidos'] = omitidos
+        if registro.exc_info:
+            entrada['excepcion'] = self.formatException(registro.exc_info)
+        return json.dumps(entrada, ensure_ascii=False, default=str)
+
+
+class LimiteRepetidos(logging.Filter):
+    """
+    Limita los mensajes que se repiten desde una misma línea de código.
+
+    En cada ventana pasan los primeros `limite` registros de cada línea; de los
+    siguientes solo 1 de cada `muestreo` (ninguno si es 0). El registro que
+    pasa tras una omisión lleva la cuenta en el campo 'omitidos'. Los errores
+    nunca se descartan.
+
+    Args:
+        limite (int): Registros por línea de código y ventana (0 desactiva el límite)
+        ventana (float): Duración de la ventana en segundos
+        muestreo (int): Pasado el límite, se conserva 1 de cada `muestreo`
+    """
+    def __init__(self, limite: int = LOG_LIMITE_REPETIDOS,
+                 ventana: float = LOG_VENTANA_REPETIDOS,
+                 muestreo: int = LOG_MUESTREO_REPETIDOS):
+        super().__init__()
+        self.limite = limite
+        self.ventana = ventana
+        self.muestreo = muestreo
+        # (archivo, línea) -> [inicio de la ventana, vistos en la ventana, omitidos sin informar]
+        self._contadores: Dict[Tuple[str, int], List] = {}
+        self._bloqueo = threading.Lock()
+
+    def filter(self, registro: logging.LogRecord) -> bool:
+        if not self.limite or registro.levelno >= logging.ERROR:
+            return True
+        clave = (registro.pathname, registro.lineno)
+        ahora = time.monotonic()
+        with self._bloqueo:
+            contador = self._contadores.get(clave)
+            if contador is None or ahora - contador[0] >= self.ventana:
+                contador = self._contadores[clave] = [ahora, 0, contador[2] if contador else 0]
+            contador[1] += 1
+            exceso = contador[1] - self.limite
+            if exceso > 0 and (not self.muestreo or exceso % self.muestreo):
+                contador[2] += 1
+                return False
+            omitidos, contador[2] = contador[2], 0
+        if omitidos:
+            registro.omitidos = omitidos
+        return True
+
+
+def _crear_manejadores() -> List[logging.Handler]:
+    """Manejadores finales (archivo con rotación y consola) que usa el hilo escritor"""
+    if LOG_ROTACION == 'tamano':
+        archivo = logging.handlers.RotatingFileHandler(
+            LOG_ARCHIVO, maxBytes=LOG_MAX_BYTES, backupCount=LOG_RESPALDOS,
+            encoding='utf-8', delay=True)
+    elif LOG_ROTACION == 'tiempo':
+        archivo = logging.handlers.TimedRotatingFileHandler(
+            LOG_ARCHIVO, when=LOG_ROTACION_CUANDO, backupCount=LOG_RESPALDOS,
+            encoding='utf-8', delay=True)
+    elif LOG_ROTACION is None:
+        archivo = logging.FileHandler(LOG_ARCHIVO, encoding='utf-8', delay=True)
+    else:
+        raise ValueError(f"Rotación de log desconocida: {LOG_ROTACION}")
+    archivo.setFormatter(FormatoJSON() if LOG_FORMATO == 'json' else FormatoTexto(FORMATO_TEXTO))
+    consola = logging.StreamHandler()
+    consola.setFormatter(FormatoTexto(FORMATO_TEXTO))
+    return [archivo, consola]
+
+
+def _encolar_en(cola) -> None:
+    """Reemplaza los manejadores del logger raíz por uno que solo encola"""
+    raiz = logging.getLogger()
+    for manejador in raiz.handlers[:]:
+        raiz.removeHandler(manejador)
+    manejador = logging.handlers.QueueHandler(cola)
+    manejador.addFilter(LimiteRepetidos())
+    raiz.addHandler(manejador)
+
+
+def _iniciar_oyente(cola) -> None:
+    """Arranca un hilo que pasa los registros de la cola a los manejadores finales"""
+    oyente = logging.handlers.QueueListener(cola, *_manejadores, respect_handler_level=True)
+    oyente.start()
+    _oyentes.append(oyente)
+
+
+def configurar_bitacora(nivel: Optional[str] = None) -> None:
+    """
+    Instala el logging encolado en el proceso (solo la primera vez).
+
+    En un proceso hijo no se instala ningún escritor: el pool lo conecta a la
+    cola del proceso principal con conectar_proceso().
+
+    Args:
+        nivel (str, opcional): Nivel mínimo; si es None se usa LOG_NIVEL
+    """
+    global _configurada
+    with _bloqueo:
+        if _configurada:
+            return
+        _configurada = True
+    logging.getLogger().setLevel(nivel or LOG_NIVEL)
+    if multiprocessing.parent_process() is not None:
+        return
+    _manejadores.extend(_crear_manejadores())
+    cola = queue.SimpleQueue()
+    _encolar_en(cola)
+    _iniciar_oyente(cola)
+    atexit.register(detener_bitacora)
+
+
+def cola_procesos() -> Optional[multiprocessing.queues.Queue]:
+    """
+    Cola por la que los procesos del pool envían sus registros a este proceso.
+
+    Se crea (con su hilo escritor) la primera vez que se pide.
+
+    Returns:
+        Queue: Cola para conectar_proceso(), o None si este proceso no escribe la bitácora
+    """
+    global _cola_procesos
+    with _bloqueo:
+        if _cola_procesos is None and _manejadores:
+            _cola_procesos = multiprocessing.get_context('spawn').Queue()
+            _iniciar_oyente(_cola_procesos)
+        return _cola_procesos
+
+
+def conectar_proceso(cola: Optional[multiprocessing.queues.Queue]) -> None:
+    """
+    Envía los registros de este proceso (un trabajador del pool) a la cola del principal.
+
+    Args:
+        cola (Queue, opcional): Cola devuelta por cola_procesos() en el proceso principal
+    """
+    if cola is not None:
+        _encolar_en(cola)
+
+
+def detener_bitacora() -> None:
+    """Escribe los registros pendientes y detiene los hilos escritores"""
+    with _bloqueo:
+        oyentes = _oyentes[:]
+        del _oyentes[:]
+    for oyente in oyentes:
+        oyente.stop()
+    for manejador in _manejadores:
+        manejador.flush()
@@ -0,0 +1,109 @@
+"""
+Configuración del Generador de Documentos de Árboles
+Este módulo centraliza los parámetros ajustables del sistema.
+"""
+
+# Motor de renderizado por defecto:
+# - 'docx': construye el documento con los objetos de python-docx
+# - 'xml':  escribe word/document.xml directamente desde fragmentos precompilados
+MOTOR_RENDER = 'docx'
+
+# Formato compacto: descripciones y pies de foto referencian estilos de carácter
+# (DescripcionArbol, PieTabla, PieFoto) en lugar de repetir el formato en cada run.
+# Solo hay tres runs así por documento: document.xml baja unos 56 bytes pero
+# styles.xml crece unos 515, así que el .docx sale ~90 bytes más grande y no
+# se genera más rápido; útil solo si se quiere editar el formato por estilo
+FORMATO_COMPACTO = False
+
+# Presupuesto en bytes de la caché de imágenes analizadas compartida por el proceso
+CACHE_IMAGENES_BYTES = 64 * 1024 * 1024
+
+# Preparación de imágenes: redimensionar al tamaño con que se muestran en el
+# documento (4 pulgadas de ancho) y recomprimir antes de incrustarlas. Cambia el
+# documento generado: las fotos más anchas que 4 pulgadas a IMAGEN_DPI se
+# reducen y recomprimen, y su alto mostrado (cy) puede variar unos EMU por el
+# redondeo del nuevo tamaño; por eso está desactivada por defecto
+OPTIMIZAR_IMAGENES = False
+IMAGEN_DPI = 220                     # Resolución objetivo a 4 pulgadas de ancho
+IMAGEN_CALIDAD_JPEG = 85             # Calidad de recompresión JPEG (1-95)
+CARPETA_CACHE_IMAGENES = ".cache/imagenes"  # Caché en disco de variantes optimizadas
+
+# Compresión del paquete .docx: nivel de zlib (0-9) para las partes XML y si las
+# imágenes (ya comprimidas como JPEG/PNG) se almacenan sin volver a comprimir
+COMPRESION_NIVEL_XML = 6
+ALMACENAR_MEDIOS = True
+
+# Distribución de los documentos dentro de salida/ para no acumular cientos de
+# miles de archivos en una sola carpeta:
+# - 'plana':     todos en la carpeta de salida
+# - 'fecha':     AAAA/MM/DD según la fecha de generación
+# - 'hash':      dos niveles con el prefijo del hash del id (p. ej. 3f/a2/)
+# - 'ubicacion': una carpeta por valor del campo ubicacion
+DISTRIBUCION_SALIDA = 'plana'
+# Manifiesto de solo agregado (id -> ruta, tamaño, SHA-256) dentro de la carpeta
+# de salida, para que nadie necesite listarla; None lo desactiva
+MANIFIESTO_SALIDA = 'manifiesto.jsonl'
+# Durabilidad al publicar cada documento (se escribe en un temporal y se renombra):
+# - 'ninguno': se confía en el sistema operativo (máximo rendimiento)
+# - 'archivo': fsync del documento y de su carpeta antes de darlo por publicado
+# - 'lote':    fsync cada FSYNC_LOTE documentos publicados y al terminar el proceso
+FSYNC_PUBLICACION = 'ninguno'
+FSYNC_LOTE = 64
+
+# Procesamiento en paralelo: número de procesos trabajadores (None usa todos los
+# núcleos) y archivos que pueden esperar en cola antes de frenar a quien encola
+TRABAJADORES = None
+TAMANO_COLA = 256
+INTERVALO_ESTADO = 10  # Segundos entre reportes de archivos en proceso y en cola
+INTERVALO_RECONCILIACION = 60  # Segundos entre escaneos de entrada/ en busca de archivos sin procesar
+ESPERA_ESCRITURA = 2.0  # Segundos sin cambios de tamaño/fecha para considerar completo un JSON
+INTERVALO_PUNTO_CONTROL = 2.0  # Segundos entre guardados del punto de control de un JSON Lines
+
+# Índice de idempotencia: un registro sin cambios (mismo contenido, imagen,
+# plantilla y opciones) reutiliza el documento ya generado en lugar de renderizarlo
+USAR_INDICE = True
+RUTA_INDICE = ".cache/indice.sqlite3"
+LOTE_INDICE = 256  # Registros por consulta en bloque al índice en el modo por lotes
+# El observador también vigila imagenes/ y regenera los documentos que usan una
+# imagen modificada (requiere USAR_INDICE)
+VIGILAR_IMAGENES = True
+
+# Servicio HTTP local (servidor.py): POST /documentos devuelve el .docx generado
+SERVICIO_HOST = "127.0.0.1"
+SERVICIO_PUERTO = 8080
+SERVICIO_MAX_CUERPO = 1024 * 1024  # Bytes máximos del JSON recibido
+# Solicitudes esperando un proceso libre; las siguientes reciben 503 de inmediato
+# en lugar de acumular latencia
+SERVICIO_EN_COLA = 32
+
+# Logging (src/bitacora.py): un hilo en segundo plano escribe en consola y en
+# LOG_ARCHIVO; los procesos del pool le envían sus registros por una cola
+LOG_ARCHIVO = "app.log"
+LOG_NIVEL = "INFO"
+LOG_FORMATO = 'texto'       # 'texto' o 'json' (JSON Lines con id, etapa y duración)
+# Rotación del archivo: 'tamano', 'tiempo' o None para no rotarlo
+LOG_ROTACION = 'tamano'
+LOG_MAX_BYTES = 10 * 1024 * 1024    # Tamaño máximo antes de rotar ('tamano')
+LOG_ROTACION_CUANDO = 'midnight'    # Momento de rotación ('tiempo'), ver TimedRotatingFileHandler
+LOG_RESPALDOS = 5                   # Archivos rotados que se conservan
+# Mensajes repetidos: por cada línea de código pasan LOG_LIMITE_REPETIDOS
+# registros por ventana de LOG_VENTANA_REPETIDOS segundos; de los siguientes
+# solo 1 de cada LOG_MUESTREO_REPETIDOS (los errores nunca se descartan)
+LOG_LIMITE_REPETIDOS = 50
+LOG_VENTANA_REPETIDOS = 10.0
+LOG_MUESTREO_REPETIDOS = 100
+
+# Métricas por etapa (duración y bytes) exportadas al terminar main.py y el
+# observador: archivo para el textfile collector de Prometheus (node_exporter)
+# y resumen JSON con p50/p95/p99; None desactiva cada uno
+METRICAS_PROMETHEUS = "metricas.prom"
+METRICAS_JSON = "metricas.json"
+
+# Perfilado (--profile en main.py y watch.py): cProfile de cada N-ésimo documento
+# de cada trabajador o de los que superan el umbral; por cada uno se guardan
+# .pstats, pilas colapsadas (.folded, para flamegraph) y el registro (.json).
+# Los documentos bajo el umbral no se perfilan (solo se cronometran); los que lo
+# superan se renderizan una segunda vez bajo cProfile
+PERFIL_CARPETA = "perfiles"
+PERFIL_CADA = None          # Perfilar 1 de cada N documentos (None: solo por umbral)
+PERFIL_UMBRAL_MS = 500      # Guardar el perfil de los documentos más lentos que esto
@@ -0,0 +1,229 @@
+"""
+Módulo de Informes Consolidados para el Generador de Documentos de Árboles
+Este módulo genera un solo .docx con todos los árboles de un inventario
+(p. ej. uno por parque), en lugar de un archivo por árbol.
+
+Características principales:
+- Cada árbol se agrega como una sección al final de word/document.xml, que
+  se comprime a medida que se escribe: la memoria no depende del número de árboles
+- Estilos y partes fijas de la plantilla compartidos por todas las secciones
+- Imágenes idénticas (mismo SHA1) guardadas una sola vez en el paquete
+- Medios acumulados en un archivo temporal hasta cerrar el documento
+- El .docx se publica de forma atómica al terminar (nunca queda a medias)
+"""
+
+import itertools
+import tempfile
+import time
+import zipfile
+from typing import Dict, Iterable, Optional, Tuple
+
+from docx.image.image import Image as ImagenDocx
+from docx.opc.packuri import PackURI
+
+from src.config import FORMATO_COMPACTO
+from src.empaquetado import POLITICA_DEFECTO, PoliticaCompresion
+from src.metricas import etapa
+from src.publicacion import descartar, publicar_archivo, ruta_temporal
+from src.esquema import validar_registro
+from src.renderizador_xml import obtener_renderizador
+from src.utils import logger
+
+# Párrafo con salto de página que separa las secciones de cada árbol
+SALTO_PAGINA = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+# Bytes copiados por lectura al pasar los medios del temporal al paquete
+_BLOQUE_COPIA = 1024 * 1024
+
+
+class InformeConsolidado:
+    """
+    Documento .docx con una sección por árbol, escrito en streaming.
+
+    Usa el motor XML: cada árbol se renderiza con los mismos fragmentos que un
+    documento individual y se escribe de inmediato en el ZIP.
+
+    Uso:
+        with InformeConsolidado('salida/parque.docx', 'imagenes') as informe:
+            for registro in registros:
+                informe.agregar(registro)
+
+    Args:
+        destino (str): Ruta del .docx a generar
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+        formato_compacto (bool, opcional): Usar estilos de carácter compartidos.
+            Si es None se usa FORMATO_COMPACTO de la configuración
+        politica (PoliticaCompresion, opcional): Compresión del paquete; None usa
+            la política configurada
+        fsync (str, opcional): Durabilidad al publicar ('ninguno', 'archivo' o
+            'lote'); None usa FSYNC_PUBLICACION
+    """
+    def __init__(self, destino: str, carpeta_imagenes: str, ruta_plantilla: Optional[str] = None,
+                 formato_compacto: Optional[bool] = None,
+                 politica: Optional[PoliticaCompresion] = None, fsync: Optional[str] = None):
+        self.destino = destino
+        self.carpeta_imagenes = carpeta_imagenes
+        self.formato_compacto = FORMATO_COMPACTO if formato_compacto is None else formato_compacto
+        self.politica = politica or POLITICA_DEFECTO
+        self.fsync = fsync
+        self.arboles = 0
+        self.imagenes_repetidas = 0
+
+        self._renderizador = obtener_renderizador(ruta_plantilla, self.formato_compacto)
+        self._marco = self._renderizador.marco(self.politica)
+        self._identificadores = self._renderizador.identificadores_imagen()
+        self._ids_forma = itertools.count(self._renderizador.primer_id_forma)
+        # SHA1 -> (rId, nombre de la parte, posición y longitud en el temporal de medios)
+        self._imagenes: Dict[str, Tuple[str, PackURI, int, int]] = {}
+
+        # El paquete parte del ZIP con las partes fijas y se completa en un temporal
+        self._temporal = ruta_temporal(destino)
+        with open(self._temporal, 'wb') as f:
+            f.write(self._marco.zip_estatico)
+        nivel = self.politica.nivel_xml
+        self._zip = zipfile.ZipFile(
+            self._temporal, 'a',
+            compression=zipfile.ZIP_DEFLATED if nivel else zipfile.ZIP_STORED,
+            compresslevel=nivel or None,
+        )
+        self._medios = tempfile.TemporaryFile()
+        self._documento = self._zip.open(self._marco.documento, 'w', force_zip64=True)
+        self._documento.write(self._marco.documento_inicio)
+
+    def _referenciar(self, imagen: ImagenDocx) -> Tuple[str, int]:
+        """Devuelve (rId, id de forma) de la imagen, guardándola solo la primera vez"""
+        entrada = self._imagenes.get(imagen.sha1)
+        if entrada is None:
+            rid, nombre = next(self._identificadores)
+            posicion = self._medios.tell()
+            self._medios.write(imagen.blob)
+            entrada = (rid, PackURI(f'{nombre}.{imagen.ext}'), posicion, len(imagen.blob))
+            self._imagenes[imagen.sha1] = entrada
+        else:
+            self.imagenes_repetidas += 1
+        # Cada aparición necesita su propio id de forma, aunque comparta la imagen
+        return entrada[0], next(self._ids_forma)
+
+    def agregar(self, data: dict) -> None:
+        """
+        Agrega la sección de un árbol al final del documento.
+
+        Args:
+            data (dict): Diccionario con los datos del árbol (ya validado)
+        """
+        with etapa('construir'):
+            cuerpo, _ = self._renderizador.cuerpo(data, self.carpeta_imagenes,
+                                                  self.formato_compacto, self._referenciar)
+        if self.arboles:
+            cuerpo = SALTO_PAGINA + cuerpo
+        with etapa('consolidar') as medicion:
+            contenido = cuerpo.encode('utf-8')
+            self._documento.write(contenido)
+            medicion.escritos = len(contenido)
+        self.arboles += 1
+
+    @property
+    def imagenes(self) -> int:
+        """Número de imágenes distintas guardadas en el paquete"""
+        return len(self._imagenes)
+
+    def cerrar(self) -> str:
+        """
+        Termina el paquete (relaciones y medios) y lo publica en el destino.
+
+        Returns:
+            str: Ruta del documento generado
+        """
+        marco = self._marco
+        self._documento.write(marco.documento_fin)
+        self._documento.close()
+
+        with self._zip.open(marco.rels, 'w') as rels:
+            rels.write(marco.rels_inicio)
+            for rid, nombre, _, _ in self._imagenes.values():
+                rels.write(self._renderizador.relacion_imagen(rid, nombre))
+            rels.write(marco.rels_fin)
+
+        # Los medios ya vienen comprimidos: se almacenan o desinflan según la política
+        compresion = zipfile.ZIP_STORED if self.politica.almacenar_medios else zipfile.ZIP_DEFLATED
+        for _, nombre, posicion, longitud in self._imagenes.values():
+            info = zipfile.ZipInfo(nombre.membername, date_time=time.localtime()[:6])
+            info.compress_type = compresion
+            self._medios.seek(posicion)
+            with self._zip.open(info, 'w') as parte:
+                restante = longitud
+                while restante:
+                    bloque = self._medios.read(min(_BLOQUE_COPIA, restante))
+                    parte.write(bloque)
+                    restante -= len(bloque)
+
+        self._zip.close()
+        self._medios.close()
+        return publicar_archivo(self._temporal, self.destino, self.fsync)
+
+    def descartar(self) -> None:
+        """Abandona el documento sin publicarlo y borra los temporales"""
+        try:
+            self._documento.close()
+            self._zip.close()
+        except Exception:
+            pass  # Un ZIP a medias se borra de todos modos
+        self._medios.close()
+        descartar(self._temporal)
+
+    def __enter__(self) -> "InformeConsolidado":
+        return self
+
+    def __exit__(self, tipo, valor, traza) -> None:
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+
+
+def generar_consolidado(registros: Iterable[Optional[dict]], destino: str, carpeta_imagenes: str,
+                        ruta_plantilla: Optional[str] = None,
+                        formato_compacto: Optional[bool] = None,
+                        politica: Optional[PoliticaCompresion] = None) -> Dict[str, int]:
+    """
+    Genera un .docx consolidado con todos los registros válidos, en orden.
+
+    Los registros se consumen a medida que se escriben, así que pueden venir de
+    un generador (p. ej. leer_jsonl) sin cargarse completos en memoria. Los
+    registros inválidos (o None) se registran y se omiten.
+
+    Args:
+        registros (Iterable[dict]): Datos de cada árbol
+        destino (str): Ruta del .docx a generar
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        ruta_plantilla (str, opcional): Plantilla .docx base
+        formato_compacto (bool, opcional): Usar estilos de carácter compartidos
+        politica (PoliticaCompresion, opcional): Compresión del paquete
+
+    Returns:
+        Dict[str, int]: Árboles incluidos, registros omitidos, imágenes
+            distintas y apariciones de imágenes repetidas
+    """
+    omitidos = 0
+    with InformeConsolidado(destino, carpeta_imagenes, ruta_plantilla,
+                            formato_compacto, politica) as informe:
+        for registro in registros:
+            if registro is None:
+                omitidos += 1
+                continue
+            errores = validar_registro(registro)
+            if errores:
+                identificador = registro.get('id') if isinstance(registro, dict) else None
+                logger.error(f"❌ Registro {identificador} omitido: {'; '.join(errores)}")
+                omitidos += 1
+                continue
+            informe.agregar(registro)
+    logger.info(f"📚 Informe consolidado: {destino} ({informe.arboles} árboles, "
+                f"{informe.imagenes} imágenes distintas, {omitidos} omitidos)")
+    return {
+        'arboles': informe.arboles,
+        'omitidos': omitidos,
+        'imagenes': informe.imagenes,
+        'imagenes_repetidas': informe.imagenes_repetidas,
+    }
@@ -0,0 +1,196 @@
+"""
+Módulo de Distribución de Salida para el Generador de Documentos de Árboles
+Este módulo decide en qué subcarpeta de salida/ se guarda cada documento y
+lleva el manifiesto de los documentos generados.
+
+Características principales:
+- Distribución plana, por fecha, por prefijo del hash del id o por ubicación
+- Nombres deterministas: id más el hash del registro, sin colisiones en paralelo
+- Subcarpetas creadas una sola vez por proceso
+- Manifiesto JSON Lines de solo agregado: id, ruta, tamaño y SHA-256
+- Cada entrada se agrega con una sola escritura en modo append, segura entre
+  procesos que escriben a la vez
+- Lectura del manifiesto con la entrada vigente de cada documento
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Set
+
+from src.config import DISTRIBUCION_SALIDA, MANIFIESTO_SALIDA
+from src.utils import generar_nombre_archivo
+
+DISTRIBUCIONES = ('plana', 'fecha', 'hash', 'ubicacion')
+
+# Carpeta usada cuando el registro no tiene ubicación
+SIN_UBICACION = 'sin_ubicacion'
+
+# Subcarpetas ya creadas por este proceso
+_CREADAS: Set[str] = set()
+
+
+def _limpiar(texto: str) -> str:
+    """Convierte un valor libre en un nombre de carpeta seguro"""
+    limpio = ''.join(c if c.isalnum() or c in '-_' else '_' for c in texto.strip())
+    return limpio.strip('_')[:64]
+
+
+def subcarpeta(data: dict, distribucion: Optional[str] = None,
+               fecha: Optional[datetime] = None) -> str:
+    """
+    Devuelve la subcarpeta relativa a salida/ que corresponde al registro.
+
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        distribucion (str, opcional): 'plana', 'fecha', 'hash' o 'ubicacion'.
+            Si es None se usa DISTRIBUCION_SALIDA de la configuración
+        fecha (datetime, opcional): Fecha de generación (por defecto, ahora)
+
+    Returns:
+        str: Ruta relativa ('' para la distribución plana)
+    """
+    distribucion = distribucion or DISTRIBUCION_SALIDA
+    if distribucion == 'plana':
+        return ''
+    if distribucion == 'fecha':
+        return (fecha or datetime.now()).strftime(os.path.join('%Y', '%m', '%d'))
+    if distribucion == 'hash':
+        huella = hashlib.sha1(str(data['id']).encode('utf-8')).hexdigest()
+        return os.path.join(huella[:2], huella[2:4])
+    if distribucion == 'ubicacion':
+        return _limpiar(str(data.get('ubicacion') or '')) or SIN_UBICACION
+    raise ValueError(f"Distribución de salida desconocida: {distribucion}")
+
+
+def huella_registro(data: dict) -> str:
+    """
+    Hash SHA-256 del contenido del registro, sin importar el orden de sus campos.
+
+    Args:
+        data (dict): Diccionario con los datos del árbol
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    canonico = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonico.encode('utf-8')).hexdigest()
+
+
+def ruta_documento(data: dict, carpeta_salida: str, extension: str = '.docx',
+                   distribucion: Optional[str] = None) -> str:
+    """
+    Ruta del documento del registro, creando su subcarpeta si hace falta.
+
+    El nombre es el id más un prefijo del hash del registro: volver a generar
+    el mismo registro da la misma ruta, y dos registros distintos con el mismo
+    id nunca se pisan aunque se generen en el mismo segundo.
+
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        carpeta_salida (str): Carpeta raíz de los documentos
+        extension (str): Extensión del archivo
+        distribucion (str, opcional): Ver subcarpeta()
+
+    Returns:
+        str: Ruta del documento dentro de la carpeta de salida
+    """
+    carpeta = os.path.join(carpeta_salida, subcarpeta(data, distribucion))
+    if carpeta not in _CREADAS:
+        os.makedirs(carpeta, exist_ok=True)
+        _CREADAS.add(carpeta)
+    return os.path.join(carpeta, generar_nombre_archivo(str(data['id']), extension,
+                                                        huella_registro(data)))
+
+
+class Manifiesto:
+    """
+    Registro de solo agregado de los documentos publicados en una carpeta de salida.
+
+    Cada línea es un objeto JSON con id, ruta (relativa a la carpeta de
+    salida), tamaño, sha256 y fecha de generación. Cada documento generado o
+    regenerado agrega una línea nueva: la última de cada id es la vigente,
+    aunque su ruta haya cambiado (otro hash del registro u otra distribución
+    de subcarpetas).
+
+    Args:
+        carpeta_salida (str): Carpeta raíz de los documentos
+        nombre (str): Nombre del archivo de manifiesto dentro de esa carpeta
+    """
+    def __init__(self, carpeta_salida: str, nombre: str = MANIFIESTO_SALIDA):
+        self.carpeta_salida = carpeta_salida
+        self.ruta = os.path.join(carpeta_salida, nombre)
+        self._bloqueo = threading.Lock()
+
+    def registrar(self, id_documento: str, ruta: str, contenido: Optional[bytes] = None) -> dict:
+        """
+        Agrega la entrada de un documento recién escrito.
+
+        Args:
+            id_documento (str): Identificador del árbol (o del informe)
+            ruta (str): Ruta del documento
+            contenido (bytes, opcional): Contenido ya en memoria; si es None se
+                lee el archivo para calcular su hash
+
+        Returns:
+            dict: Entrada agregada
+        """
+        if contenido is None:
+            sha = hashlib.sha256()
+            with open(ruta, 'rb') as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(bloque)
+            huella, tamano = sha.hexdigest(), os.path.getsize(ruta)
+        else:
+            huella, tamano = hashlib.sha256(contenido).hexdigest(), len(contenido)
+        entrada = {
+            'id': id_documento,
+            'ruta': os.path.relpath(ruta, self.carpeta_salida),
+            'tamano': tamano,
+            'sha256': huella,
+            'generado': datetime.now().isoformat(timespec='seconds'),
+        }
+        linea = (json.dumps(entrada, ensure_ascii=False) + '\n').encode('utf-8')
+        # Sin búfer y en modo append: una sola escritura que no se intercala con
+        # las de otros procesos
+        with self._bloqueo, open(self.ruta, 'ab', buffering=0) as f:
+            f.write(linea)
+        return entrada
+
+    def leer(self) -> Iterator[dict]:
+        """Recorre todas las entradas en orden de escritura (omite líneas truncadas)"""
+        try:
+            f = open(self.ruta, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue  # Última línea a medio escribir tras una caída
+
+    def vigentes(self) -> Dict[str, dict]:
+        """
+        Devuelve la entrada vigente de cada documento.
+
+        Returns:
+            Dict[str, dict]: Id del documento -> última entrada registrada para él
+        """
+        return {entrada['id']: entrada for entrada in self.leer()}
+
+
+# Manifiesto por carpeta de salida, compartido por todo el proceso
+_MANIFIESTOS: Dict[str, Manifiesto] = {}
+
+
+def obtener_manifiesto(carpeta_salida: str) -> Optional[Manifiesto]:
+    """Devuelve el manifiesto de la carpeta, o None si está desactivado (MANIFIESTO_SALIDA)"""
+    if not MANIFIESTO_SALIDA:
+        return None
+    manifiesto = _MANIFIESTOS.get(carpeta_salida)
+    if manifiesto is None:
+        manifiesto = _MANIFIESTOS.setdefault(carpeta_salida, Manifiesto(carpeta_salida))
+    return manifiesto
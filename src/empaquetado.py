@@ -0,0 +1,90 @@
+"""
+Módulo de Empaquetado para el Generador de Documentos de Árboles
+Este módulo escribe el contenedor ZIP del .docx con una política de compresión
+por tipo de contenido, en lugar del ZIP_DEFLATED uniforme de python-docx.
+
+Características principales:
+- Medios ya comprimidos (JPEG, PNG, GIF...) almacenados sin recomprimir
+- Nivel de zlib configurable para las partes XML
+- Mismo contenido y orden de partes que Document.save()
+- Utilizado por ambos motores de renderizado
+"""
+
+import zipfile
+from typing import NamedTuple
+
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+
+from src.config import COMPRESION_NIVEL_XML, ALMACENAR_MEDIOS
+
+
+class PoliticaCompresion(NamedTuple):
+    """
+    Política de compresión del paquete .docx.
+
+    Args:
+        nivel_xml (int): Nivel de zlib (0-9) para las partes XML; 0 las almacena
+        almacenar_medios (bool): Guardar imágenes y otros medios sin comprimir
+    """
+    nivel_xml: int = COMPRESION_NIVEL_XML
+    almacenar_medios: bool = ALMACENAR_MEDIOS
+
+
+# Política configurada por defecto y la equivalente a Document.save()
+POLITICA_DEFECTO = PoliticaCompresion()
+POLITICA_PYTHON_DOCX = PoliticaCompresion(nivel_xml=6, almacenar_medios=False)
+
+# Tipos de contenido que ya vienen comprimidos
+_PREFIJOS_MEDIOS = ('image/', 'audio/', 'video/')
+
+
+def es_medio(tipo_contenido: str) -> bool:
+    """Indica si el tipo de contenido corresponde a un medio ya comprimido"""
+    return tipo_contenido.startswith(_PREFIJOS_MEDIOS)
+
+
+def escribir_parte(zf: zipfile.ZipFile, nombre: str, blob: bytes, politica: PoliticaCompresion,
+                   medio: bool = False) -> None:
+    """
+    Escribe una parte en el ZIP con la compresión que le corresponde.
+
+    Args:
+        zf (ZipFile): Archivo ZIP abierto para escritura
+        nombre (str): Nombre del miembro dentro del ZIP
+        blob (bytes): Contenido de la parte
+        politica (PoliticaCompresion): Política a aplicar
+        medio (bool): True si la parte es una imagen u otro medio comprimido
+    """
+    if (medio and politica.almacenar_medios) or politica.nivel_xml == 0:
+        zf.writestr(nombre, blob, compress_type=zipfile.ZIP_STORED)
+    elif medio:
+        zf.writestr(nombre, blob, compress_type=zipfile.ZIP_DEFLATED)
+    else:
+        zf.writestr(nombre, blob, compress_type=zipfile.ZIP_DEFLATED,
+                    compresslevel=politica.nivel_xml)
+
+
+def guardar_documento(doc, destino, politica: PoliticaCompresion = POLITICA_DEFECTO) -> None:
+    """
+    Equivalente a doc.save() aplicando la política de compresión indicada.
+
+    Args:
+        doc (Document): Documento de python-docx a guardar
+        destino (str | file): Ruta del archivo o flujo binario de salida
+        politica (PoliticaCompresion): Compresión de partes XML y medios
+    """
+    paquete = doc.part.package
+    partes = list(paquete.parts)
+    for parte in partes:
+        parte.before_marshal()
+
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        escribir_parte(zf, CONTENT_TYPES_URI.membername,
+                       _ContentTypesItem.from_parts(partes).blob, politica)
+        escribir_parte(zf, PACKAGE_URI.rels_uri.membername, paquete.rels.xml, politica)
+        for parte in partes:
+            escribir_parte(zf, parte.partname.membername, parte.blob, politica,
+                           es_medio(parte.content_type))
+            if len(parte.rels):
+                escribir_parte(zf, parte.partname.rels_uri.membername, parte.rels.xml, politica)
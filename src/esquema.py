@@ -0,0 +1,198 @@
+"""
+Módulo de Esquema para el Generador de Documentos de Árboles
+Este módulo valida los registros de árboles contra un esquema declarativo
+antes de que lleguen al renderizado.
+
+Características principales:
+- Esquema declarativo de todos los campos, incluidas las filas de tabla_extendida
+- Compilado una sola vez en funciones de verificación por campo
+- Todos los errores de un registro en una sola pasada (no solo el primero)
+- Validación de lotes completos antes de enviarlos al pool
+- Mismas restricciones que impone el renderizado: texto donde se escribe
+  texto y sin caracteres de control que el XML no admite
+"""
+
+import re
+from datetime import date
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Caracteres que no pueden aparecer en el XML del documento
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+_FECHA = re.compile(r'\d{4}-\d{2}-\d{2}\Z')
+
+_NOMBRES_TIPO = {str: 'texto', int: 'entero', float: 'número', list: 'lista', dict: 'objeto'}
+
+
+class Campo(NamedTuple):
+    """
+    Declaración de un campo del registro.
+
+    Args:
+        tipos (Tuple[type, ...]): Tipos JSON admitidos (bool nunca cuenta como número)
+        requerido (bool): El campo debe estar presente
+        formato (str, opcional): 'fecha' (AAAA-MM-DD) o 'numero' (número o texto numérico)
+        minimo (float, opcional): Valor mínimo para los campos numéricos
+        no_vacio (bool): El texto (o la lista) no puede estar vacío
+        filas (Dict[str, Campo], opcional): Esquema de cada elemento de una lista de objetos
+    """
+    tipos: Tuple[type, ...] = (str,)
+    requerido: bool = False
+    formato: Optional[str] = None
+    minimo: Optional[float] = None
+    no_vacio: bool = False
+    filas: Optional[Dict[str, "Campo"]] = None
+
+
+# Esquema del registro de un árbol
+ESQUEMA_ARBOL: Dict[str, Campo] = {
+    'id': Campo(tipos=(str, int), requerido=True, no_vacio=True),
+    'nombre': Campo(requerido=True),
+    'descripcion': Campo(requerido=True),
+    'fecha': Campo(requerido=True, formato='fecha'),
+    'ubicacion': Campo(),
+    'especie': Campo(),
+    'altura_metros': Campo(tipos=(int, float, str), formato='numero', minimo=0),
+    'edad_aproximada': Campo(),
+    'estado_salud': Campo(),
+    'imagen': Campo(no_vacio=True),
+    'pie_imagen': Campo(),
+    'pie_tabla': Campo(),
+    'tabla_extendida': Campo(tipos=(list,), filas={
+        'atributo': Campo(requerido=True),
+        'valor': Campo(requerido=True),
+    }),
+}
+
+# Verificación compilada: (valor, ruta del campo, lista de errores) -> None
+Verificador = Callable[[object, str, List[str]], None]
+
+
+def _nombre_tipo(valor: object) -> str:
+    """Nombre legible del tipo de un valor JSON"""
+    if valor is None:
+        return 'null'
+    if isinstance(valor, bool):
+        return 'booleano'
+    return _NOMBRES_TIPO.get(type(valor), type(valor).__name__)
+
+
+def _compilar_campo(campo: Campo) -> Verificador:
+    """Construye la función que verifica un campo, con solo las comprobaciones que declara"""
+    tipos = campo.tipos
+    esperado = ' o '.join(_NOMBRES_TIPO.get(t, t.__name__) for t in tipos)
+    comprobaciones: List[Verificador] = []
+
+    if campo.no_vacio:
+        def no_vacio(valor, ruta, errores):
+            if (isinstance(valor, str) and not valor.strip()) or valor == []:
+                errores.append(f"{ruta}: no puede estar vacío")
+        comprobaciones.append(no_vacio)
+
+    if str in tipos:
+        def texto_xml(valor, ruta, errores):
+            if isinstance(valor, str) and _CARACTERES_INVALIDOS.search(valor):
+                errores.append(f"{ruta}: contiene caracteres de control no permitidos")
+        comprobaciones.append(texto_xml)
+
+    if campo.formato == 'fecha':
+        def fecha(valor, ruta, errores):
+            try:
+                if not _FECHA.match(valor):
+                    raise ValueError
+                date.fromisoformat(valor)
+            except ValueError:
+                errores.append(f"{ruta}: Formato de fecha inválido. Use: YYYY-MM-DD")
+        comprobaciones.append(fecha)
+
+    if campo.formato == 'numero':
+        minimo = campo.minimo
+
+        def numero(valor, ruta, errores):
+            try:
+                cantidad = float(valor)
+            except ValueError:
+                errores.append(f"{ruta}: debe ser un número")
+                return
+            except OverflowError:
+                # Entero JSON demasiado grande para un float
+                errores.append(f"{ruta}: debe ser un número finito")
+                return
+            if cantidad != cantidad or cantidad in (float('inf'), float('-inf')):
+                errores.append(f"{ruta}: debe ser un número finito")
+            elif minimo is not None and cantidad < minimo:
+                errores.append(f"{ruta}: debe ser mayor o igual a {minimo}")
+        comprobaciones.append(numero)
+
+    if campo.filas is not None:
+        verificar_fila = _compilar_objeto(campo.filas)
+
+        def filas(valor, ruta, errores):
+            for indice, fila in enumerate(valor):
+                ruta_fila = f"{ruta}[{indice}]"
+                if not isinstance(fila, dict):
+                    errores.append(f"{ruta_fila}: debe ser objeto (recibido {_nombre_tipo(fila)})")
+                else:
+                    verificar_fila(fila, ruta_fila, errores)
+        comprobaciones.append(filas)
+
+    def verificar(valor, ruta, errores):
+        if isinstance(valor, bool) or not isinstance(valor, tipos):
+            errores.append(f"{ruta}: debe ser {esperado} (recibido {_nombre_tipo(valor)})")
+            return
+        for comprobar in comprobaciones:
+            comprobar(valor, ruta, errores)
+    return verificar
+
+
+def _compilar_objeto(esquema: Dict[str, Campo]) -> Callable[[dict, str, List[str]], None]:
+    """Compila todos los campos de un objeto; los campos no declarados se ignoran"""
+    campos = [(nombre, campo.requerido, _compilar_campo(campo))
+              for nombre, campo in esquema.items()]
+
+    def verificar(datos, prefijo, errores):
+        for nombre, requerido, verificar_campo in campos:
+            ruta = f"{prefijo}.{nombre}" if prefijo else nombre
+            if nombre in datos:
+                verificar_campo(datos[nombre], ruta, errores)
+            elif requerido:
+                errores.append(f"Campo requerido faltante: {ruta}")
+    return verificar
+
+
+def compilar(esquema: Dict[str, Campo]) -> Callable[[object], List[str]]:
+    """
+    Compila un esquema en una función de validación.
+
+    Args:
+        esquema (Dict[str, Campo]): Campos del registro
+
+    Returns:
+        Callable[[object], List[str]]: Devuelve todos los errores del registro
+            (lista vacía si es válido)
+    """
+    verificar_objeto = _compilar_objeto(esquema)
+
+    def validar(datos: object) -> List[str]:
+        if not isinstance(datos, dict):
+            return [f"El registro debe ser un objeto JSON (recibido {_nombre_tipo(datos)})"]
+        errores: List[str] = []
+        verificar_objeto(datos, '', errores)
+        return errores
+    return validar
+
+
+# Validador del registro de un árbol, compilado al importar el módulo
+validar_registro = compilar(ESQUEMA_ARBOL)
+
+
+def validar_lote(registros: Iterable[object]) -> List[List[str]]:
+    """
+    Valida un lote completo de registros antes de procesarlo.
+
+    Args:
+        registros (Iterable): Registros a validar
+
+    Returns:
+        List[List[str]]: Errores de cada registro, en el mismo orden
+    """
+    return [validar_registro(registro) for registro in registros]
@@ -1,114 +1,353 @@
 # Importaciones necesarias para la generación de documentos
-from docx import Document  # Para crear y manipular documentos de Word
-from docx.shared import Pt, Inches, RGBColor  # Utilidades para formato de documento
+from docx.shared import Inches  # Utilidades para formato de documento
+from docx.oxml import parse_xml  # Para construir filas de tabla en bloque
+from docx.oxml.ns import nsdecls
+from docx.enum.style import WD_STYLE_TYPE
+import io  # Documentos en memoria
 import os  # Para manejo de rutas de archivos
-from src.utils import logger, validar_imagen, generar_nombre_archivo
+import time  # Duración de cada documento en la bitácora
+from src.utils import logger
+from src.plantillas import obtener_plantilla, ESTILOS_CARACTER  # Pool de plantillas ya analizadas
+from src.renderizador_xml import renderizar_documento_xml, filas_tabla_xml  # Motor rápido basado en XML
+from src.imagenes import cargar_imagen, agregar_imagen  # Caché de imágenes analizadas
+from src.empaquetado import guardar_documento, POLITICA_DEFECTO  # Compresión por tipo de parte
+from src.indice import clave_documento, dependencias_documento, obtener_indice  # Documentos ya generados
+from src.distribucion import ruta_documento, obtener_manifiesto  # Subcarpetas de salida y manifiesto
+from src.publicacion import publicar  # Escritura atómica con política de fsync
+from src.metricas import etapa, registrar_etapa  # Duración y bytes por etapa
+from src.perfilado import perfilar  # cProfile de los documentos lentos (--profile)
+from src.config import (
+    MOTOR_RENDER, FORMATO_COMPACTO, USAR_INDICE, OPTIMIZAR_IMAGENES, IMAGEN_DPI,
+    IMAGEN_CALIDAD_JPEG
+)
 
-def generar_documento(data, carpeta_imagenes, carpeta_salida):
+# Etiquetas fijas de la tabla de información técnica
+ETIQUETAS_TECNICAS = [
+    "📍 Ubicación",
+    "�� Especie",
+    "📏 Altura (m)",
+    "⏳ Edad Aproximada",
+    "❤️ Estado de Salud"
+]
+
+def _construir_tabla_tecnica(doc):
+    """Construye la tabla técnica con sus etiquetas y las celdas de valor vacías"""
+    tabla = doc.add_table(rows=len(ETIQUETAS_TECNICAS), cols=2)
+    tabla.style = 'Light Grid Accent 1'
+    for i, etiqueta in enumerate(ETIQUETAS_TECNICAS):
+        tabla.cell(i, 0).text = etiqueta
+        tabla.cell(i, 1).text = ""
+    return tabla._tbl
+
+def agregar_tabla_tecnica(doc, valores, ruta_plantilla=None):
+    """
+    Agrega la tabla de información técnica a partir del fragmento precompilado.
+    
+    La tabla (forma, estilo y etiquetas) se construye una sola vez por plantilla;
+    cada documento solo clona el fragmento y escribe el texto de los valores.
+    
+    Args:
+        doc (Document): Documento al que se agrega la tabla
+        valores (List[str]): Valor de cada fila, en el orden de ETIQUETAS_TECNICAS
+        ruta_plantilla (str, opcional): Plantilla de la que proviene el documento
+    """
+    tbl = obtener_plantilla(ruta_plantilla).fragmento('tabla_tecnica', _construir_tabla_tecnica)
+    for tr, valor in zip(tbl.tr_lst, valores):
+        tr.tc_lst[1].p_lst[0].r_lst[0].text = valor
+    doc.element.body._insert_tbl(tbl)
+
+def agregar_parrafo_con_estilo(doc, texto, estilo, ruta_plantilla=None):
+    """
+    Equivalente a doc.add_paragraph(texto, style=estilo) usando la caché de
+    styleId de la plantilla en lugar de buscar el nombre en styles.xml.
+    """
+    parrafo = doc.add_paragraph(texto)
+    parrafo._p.style = obtener_plantilla(ruta_plantilla).id_estilo(estilo, WD_STYLE_TYPE.PARAGRAPH)
+    return parrafo
+
+def agregar_run_formateado(parrafo, texto, estilo, formato_compacto=False, ruta_plantilla=None):
+    """
+    Agrega un run con el formato de ESTILOS_CARACTER[estilo].
+    
+    En formato compacto el run solo referencia el estilo de carácter de la
+    plantilla; en caso contrario se aplican negrita/cursiva, tamaño y color directos.
+    """
+    run = parrafo.add_run(texto)
+    if formato_compacto:
+        run._r.style = obtener_plantilla(ruta_plantilla, True).estilos_compactos()[estilo]
+        return run
+
+    formato = ESTILOS_CARACTER[estilo]
+    if 'negrita' in formato:
+        run.bold = formato['negrita']
+    if 'cursiva' in formato:
+        run.italic = formato['cursiva']
+    run.font.size = formato['tamano']
+    run.font.color.rgb = formato['color']
+    return run
+
+def agregar_tabla_masiva(doc, filas, estilo=None, autoajuste=None, ruta_plantilla=None):
+    """
+    Agrega una tabla de dos columnas construyendo todas sus filas en una sola pasada.
+    
+    A diferencia de add_row() + cells[...], que recorre la tabla completa en cada
+    acceso, el costo es lineal en el número de filas.
+    
+    Args:
+        doc (Document): Documento al que se agrega la tabla
+        filas (Iterable[Tuple[str, str]]): Texto de las celdas de cada fila
+        estilo (str, opcional): Nombre del estilo de tabla
+        autoajuste (bool, opcional): Valor de Table.autofit (None para no cambiarlo)
+        ruta_plantilla (str, opcional): Plantilla de la que proviene el documento
+        
+    Returns:
+        Table: Tabla agregada al documento
+    """
+    # Igual que doc.add_table(rows=0, cols=2), que además asigna style=None
+    # buscando el estilo por defecto en styles.xml (y obliga a copiarlo)
+    tabla = doc._body.add_table(0, 2, doc._block_width)
+    if estilo is not None:
+        tabla._tbl.tblStyle_val = obtener_plantilla(ruta_plantilla).id_estilo(
+            estilo, WD_STYLE_TYPE.TABLE
+        )
+    if autoajuste is not None:
+        tabla.autofit = autoajuste
+
+    # Todas las filas se analizan de una vez y se mueven a la tabla
+    ancho = tabla._tbl.tblGrid.gridCol_lst[0].w.twips
+    contenedor = parse_xml(f'<w:tbl {nsdecls("w")}>{filas_tabla_xml(filas, ancho)}</w:tbl>')
+    tabla._tbl.extend(list(contenedor))
+    return tabla
+
+def construir_documento(data, carpeta_imagenes, ruta_plantilla=None, formato_compacto=False):
+    """
+    Construye en memoria el documento Word del árbol con python-docx.
+    
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        carpeta_imagenes (str): Ruta a la carpeta donde se encuentran las imágenes
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+        formato_compacto (bool): Referenciar estilos de carácter en lugar de
+            formatear cada run directamente
+        
+    Returns:
+        Document: Documento de python-docx listo para guardarse
+    """
+    # Crear un nuevo documento a partir de la plantilla ya analizada
+    # (la copia compacta de la plantilla ya incluye los estilos de carácter)
+    plantilla = obtener_plantilla(ruta_plantilla, formato_compacto)
+    doc = plantilla.nuevo_documento()
+
+    # Agregar título principal con emoji de árbol
+    agregar_parrafo_con_estilo(doc, f"🌳 {data['nombre']}", 'Title', ruta_plantilla)
+    doc.add_paragraph("")  # Espacio después del título
+
+    # Agregar descripción con formato destacado
+    parrafo_desc = doc.add_paragraph()
+    # Negrita, 12 pt, color azul
+    agregar_run_formateado(parrafo_desc, data['descripcion'], 'DescripcionArbol',
+                           formato_compacto, ruta_plantilla)
+    doc.add_paragraph("")  # Espacio después de la descripción
+
+    # Crear tabla con información técnica básica
+    agregar_parrafo_con_estilo(doc, "📊 Información Técnica:", 'Intense Quote', ruta_plantilla)
+
+    # Valores de la tabla técnica, en el orden de ETIQUETAS_TECNICAS
+    valores = [
+        data.get("ubicacion", "No especificada"),
+        data.get("especie", "Desconocida"),
+        str(data.get("altura_metros", "N/A")),
+        data.get("edad_aproximada", "N/A"),
+        data.get("estado_salud", "No registrado")
+    ]
+    agregar_tabla_tecnica(doc, valores, ruta_plantilla)
+
+    doc.add_paragraph("")  # Espacio después de la tabla
+
+    # Agregar pie de tabla si existe
+    if "pie_tabla" in data:
+        pie_tabla = doc.add_paragraph()
+        # Cursiva, 9 pt, color gris
+        agregar_run_formateado(pie_tabla, data["pie_tabla"], 'PieTabla',
+                               formato_compacto, ruta_plantilla)
+        doc.add_paragraph("")
+
+    # Agregar tabla extendida si existe información adicional
+    if "tabla_extendida" in data:
+        doc.add_paragraph("📑 Información Extendida:")
+
+        # Encabezados seguidos de los datos proporcionados, construidos en bloque
+        filas = [("Atributo", "Valor")]
+        filas.extend((entrada["atributo"], entrada["valor"]) for entrada in data["tabla_extendida"])
+        agregar_tabla_masiva(doc, filas, 'Table Grid', autoajuste=True, ruta_plantilla=ruta_plantilla)
+
+        doc.add_paragraph("")  # Espacio después de la tabla extendida
+
+    # Agregar fecha del registro
+    doc.add_paragraph(f"📅 Fecha de registro: {data['fecha']}")
+    doc.add_paragraph("")
+
+    # Validar y procesar imagen
+    imagen_path = os.path.join(carpeta_imagenes, data.get("imagen", ""))
+    if "imagen" in data:
+        imagen, mensaje = cargar_imagen(imagen_path)  # Una sola lectura: validar e incrustar
+        if imagen is not None:
+            doc.add_paragraph("📸 Fotografía del Árbol:")
+            agregar_imagen(doc, imagen, Inches(4.0))
+            if "pie_imagen" in data:
+                pie = doc.add_paragraph()
+                agregar_run_formateado(pie, data["pie_imagen"], 'PieFoto',
+                                       formato_compacto, ruta_plantilla)
+        else:
+            logger.warning(f"⚠️ Problema con la imagen: {mensaje}")
+            doc.add_paragraph(f"⚠️ Imagen no válida: {mensaje}")
+    else:
+        doc.add_paragraph("⚠️ No se proporcionó imagen.")
+
+    return doc
+
+def opciones_render(motor=None, formato_compacto=None, politica=None):
+    """
+    Opciones que cambian el documento generado, para la clave del índice.
+
+    Returns:
+        tuple: Motor, formato compacto, política de compresión y preparación de imágenes
+    """
+    return (
+        motor or MOTOR_RENDER,
+        FORMATO_COMPACTO if formato_compacto is None else formato_compacto,
+        tuple(politica or POLITICA_DEFECTO),
+        (OPTIMIZAR_IMAGENES, IMAGEN_DPI, IMAGEN_CALIDAD_JPEG),
+    )
+
+def documento_en_memoria(data, carpeta_imagenes, ruta_plantilla=None, motor=None,
+                         formato_compacto=None, politica=None):
+    """
+    Renderiza el documento Word del árbol y devuelve el contenido del .docx.
+    
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        carpeta_imagenes (str): Ruta a la carpeta donde se encuentran las imágenes
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+        motor (str, opcional): Motor de renderizado ('docx' o 'xml'). Si es None
+            se usa MOTOR_RENDER de la configuración
+        formato_compacto (bool, opcional): Usar estilos de carácter compartidos.
+            Si es None se usa FORMATO_COMPACTO de la configuración
+        politica (PoliticaCompresion, opcional): Compresión del .docx. Si es
+            None se usa la configurada
+
+    Returns:
+        bytes: Contenido del archivo .docx
+    """
+    motor = motor or MOTOR_RENDER
+    if formato_compacto is None:
+        formato_compacto = FORMATO_COMPACTO
+
+    if motor == 'xml':
+        # Motor rápido: escribe word/document.xml directamente
+        return renderizar_documento_xml(data, carpeta_imagenes, ruta_plantilla,
+                                        formato_compacto, politica)
+    if motor == 'docx':
+        with etapa('construir'):
+            doc = construir_documento(data, carpeta_imagenes, ruta_plantilla, formato_compacto)
+        with etapa('guardar') as medicion:
+            salida = io.BytesIO()
+            guardar_documento(doc, salida, politica or POLITICA_DEFECTO)
+            contenido = salida.getvalue()
+            medicion.escritos = len(contenido)
+        return contenido
+    raise ValueError(f"Motor de renderizado desconocido: {motor}")
+
+def generar_documento(data, carpeta_imagenes, carpeta_salida, ruta_plantilla=None, motor=None,
+                      formato_compacto=None, politica=None, reutilizar=None, ruta_destino=None):
     """
     Genera un documento Word con la información del árbol proporcionada.
+
+    Igual que generar_o_reutilizar, pero devuelve solo la ruta del documento.
+    """
+    return generar_o_reutilizar(data, carpeta_imagenes, carpeta_salida, ruta_plantilla, motor,
+                                formato_compacto, politica, reutilizar, ruta_destino)[0]
+
+def generar_o_reutilizar(data, carpeta_imagenes, carpeta_salida, ruta_plantilla=None, motor=None,
+                         formato_compacto=None, politica=None, reutilizar=None, ruta_destino=None):
+    """
+    Genera el documento Word del árbol, o reutiliza el ya generado si no cambió.
     
     Args:
         data (dict): Diccionario con los datos del árbol
         carpeta_imagenes (str): Ruta a la carpeta donde se encuentran las imágenes
         carpeta_salida (str): Ruta donde se guardará el documento generado
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+        motor (str, opcional): Motor de renderizado ('docx' o 'xml'). Si es None
+            se usa MOTOR_RENDER de la configuración
+        formato_compacto (bool, opcional): Usar estilos de carácter compartidos.
+            Si es None se usa FORMATO_COMPACTO de la configuración
+        politica (PoliticaCompresion, opcional): Compresión del .docx (nivel de
+            zlib para XML, medios almacenados). Si es None se usa la configurada
+        reutilizar (bool, opcional): Devolver el documento ya generado si el
+            registro no cambió. Si es None se usa USAR_INDICE de la configuración
+        ruta_destino (str, opcional): Ruta del documento a sobrescribir (al
+            regenerarlo porque cambió su imagen o plantilla). Si es None se
+            genera un nombre nuevo
+
+    Returns:
+        tuple: (ruta del documento, True si se reutilizó uno ya generado)
     """
+    inicio = time.perf_counter()
     try:
-        # Crear un nuevo documento
-        doc = Document()
-
-        # Agregar título principal con emoji de árbol
-        doc.add_heading(f"🌳 {data['nombre']}", level=0)
-        doc.add_paragraph("")  # Espacio después del título
-
-        # Agregar descripción con formato destacado
-        parrafo_desc = doc.add_paragraph()
-        run_desc = parrafo_desc.add_run(data['descripcion'])
-        run_desc.bold = True  # Texto en negrita
-        run_desc.font.size = Pt(12)  # Tamaño de fuente
-        run_desc.font.color.rgb = RGBColor(0, 102, 204)  # Color azul
-        doc.add_paragraph("")  # Espacio después de la descripción
-
-        # Crear tabla con información técnica básica
-        doc.add_paragraph("📊 Información Técnica:", style='Intense Quote')
-        tabla = doc.add_table(rows=5, cols=2)
-        tabla.style = 'Light Grid Accent 1'
-
-        # Definir campos de la tabla técnica con emojis
-        campos = [
-            ("📍 Ubicación", data.get("ubicacion", "No especificada")),
-            ("�� Especie", data.get("especie", "Desconocida")),
-            ("📏 Altura (m)", str(data.get("altura_metros", "N/A"))),
-            ("⏳ Edad Aproximada", data.get("edad_aproximada", "N/A")),
-            ("❤️ Estado de Salud", data.get("estado_salud", "No registrado"))
-        ]
-
-        # Llenar la tabla con los campos definidos
-        for i, (campo, valor) in enumerate(campos):
-            tabla.cell(i, 0).text = campo
-            tabla.cell(i, 1).text = valor
-
-        doc.add_paragraph("")  # Espacio después de la tabla
-
-        # Agregar pie de tabla si existe
-        if "pie_tabla" in data:
-            pie_tabla = doc.add_paragraph()
-            run_pie_tabla = pie_tabla.add_run(data["pie_tabla"])
-            run_pie_tabla.italic = True  # Texto en cursiva
-            run_pie_tabla.font.size = Pt(9)  # Tamaño pequeño
-            run_pie_tabla.font.color.rgb = RGBColor(100, 100, 100)  # Color gris
-            doc.add_paragraph("")
-
-        # Agregar tabla extendida si existe información adicional
-        if "tabla_extendida" in data:
-            doc.add_paragraph("📑 Información Extendida:")
-            tabla_ext = doc.add_table(rows=1, cols=2)
-            tabla_ext.style = 'Table Grid'
-            tabla_ext.autofit = True
-
-            # Configurar encabezados de la tabla extendida
-            tabla_ext.cell(0, 0).text = "Atributo"
-            tabla_ext.cell(0, 1).text = "Valor"
-
-            # Llenar la tabla extendida con los datos proporcionados
-            for entrada in data["tabla_extendida"]:
-                fila = tabla_ext.add_row()
-                fila.cells[0].text = entrada["atributo"]
-                fila.cells[1].text = entrada["valor"]
-
-            doc.add_paragraph("")  # Espacio después de la tabla extendida
-
-        # Agregar fecha del registro
-        doc.add_paragraph(f"📅 Fecha de registro: {data['fecha']}")
-        doc.add_paragraph("")
+        motor = motor or MOTOR_RENDER
+        if formato_compacto is None:
+            formato_compacto = FORMATO_COMPACTO
+        if reutilizar is None:
+            reutilizar = USAR_INDICE
 
-        # Validar y procesar imagen
-        imagen_path = os.path.join(carpeta_imagenes, data.get("imagen", ""))
-        if "imagen" in data:
-            es_valida, mensaje = validar_imagen(imagen_path)
-            if es_valida:
-                doc.add_paragraph("📸 Fotografía del Árbol:")
-                doc.add_picture(imagen_path, width=Inches(4.0))
-                if "pie_imagen" in data:
-                    pie = doc.add_paragraph()
-                    run_pie = pie.add_run(data["pie_imagen"])
-                    run_pie.italic = True
-                    run_pie.font.size = Pt(9)
-                    run_pie.font.color.rgb = RGBColor(100, 100, 100)
-            else:
-                logger.warning(f"⚠️ Problema con la imagen: {mensaje}")
-                doc.add_paragraph(f"⚠️ Imagen no válida: {mensaje}")
+        # Registro sin cambios desde la última vez: se reutiliza su documento
+        if reutilizar:
+            with etapa('indice_buscar'):
+                dependencias = dependencias_documento(data, carpeta_imagenes, carpeta_salida,
+                                                      ruta_plantilla)
+                clave = clave_documento(data, carpeta_imagenes, carpeta_salida, ruta_plantilla,
+                                        opciones_render(motor, formato_compacto, politica),
+                                        dependencias)
+                existente = obtener_indice().buscar(clave) if ruta_destino is None else None
+            if existente is not None:
+                logger.info(f"♻️ Sin cambios, se reutiliza: {existente}",
+                            extra={'id': str(data['id']), 'etapa': 'reutilizar',
+                                   'duracion': time.perf_counter() - inicio})
+                return existente, True
+
+        if ruta_destino is not None:
+            ruta_salida = ruta_destino
         else:
-            doc.add_paragraph("⚠️ No se proporcionó imagen.")
+            # Nombre determinista (id + hash del registro), en su subcarpeta de salida/
+            ruta_salida = ruta_documento(data, carpeta_salida)
+
+        # Con --profile, los documentos lentos (o 1 de cada N) dejan su perfil
+        contenido = perfilar(data, documento_en_memoria, data, carpeta_imagenes, ruta_plantilla,
+                             motor, formato_compacto, politica)
+        # Temporal y renombrado: nadie ve nunca un documento a medio escribir
+        with etapa('publicar') as medicion:
+            publicar(ruta_salida, contenido)
+            medicion.escritos = len(contenido)
+
+        manifiesto = obtener_manifiesto(carpeta_salida)
+        if manifiesto is not None:
+            with etapa('manifiesto'):
+                manifiesto.registrar(str(data['id']), ruta_salida, contenido)
+
+        if reutilizar:
+            with etapa('indice_registrar'):
+                obtener_indice().registrar(clave, str(data['id']), ruta_salida, dependencias)
 
-        # Generar nombre único para el documento
-        filename = generar_nombre_archivo(data['id'], '.docx')
-        ruta_salida = os.path.join(carpeta_salida, filename)
-        doc.save(ruta_salida)
+        registrar_etapa('documento', time.perf_counter() - inicio)
 
-        logger.info(f"✅ Documento generado: {ruta_salida}")
-        return ruta_salida
+        logger.info(f"✅ Documento generado: {ruta_salida}",
+                    extra={'id': str(data['id']), 'etapa': 'generar',
+                           'duracion': time.perf_counter() - inicio})
+        return ruta_salida, False
 
     except Exception as e:
-        logger.error(f"❌ Error al generar documento: {e}")
+        logger.error(f"❌ Error al generar documento: {e}",
+                     extra={'id': str(data.get('id')), 'etapa': 'generar',
+                            'duracion': time.perf_counter() - inicio})
         raise
\ No newline at end of file
@@ -0,0 +1,307 @@
+"""
+Módulo de Imágenes para el Generador de Documentos de Árboles
+Este módulo evita volver a leer y analizar la misma fotografía en cada documento.
+
+Características principales:
+- Caché LRU de imágenes ya analizadas, compartida por todo el proceso
+- Clave por ruta, fecha de modificación y tamaño del archivo
+- Presupuesto máximo de bytes con desalojo de las menos usadas
+- Inserción directa de la imagen analizada en el documento
+- Redimensionado y recompresión opcionales al tamaño mostrado
+  (OPTIMIZAR_IMAGENES), con caché en disco direccionada por contenido y
+  compartida entre ejecuciones y procesos
+- Validación e inserción a partir de una sola lectura del archivo
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from docx.image.image import Image as ImagenDocx
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.shape import CT_Inline
+
+from src.config import (
+    CACHE_IMAGENES_BYTES, OPTIMIZAR_IMAGENES, IMAGEN_DPI, IMAGEN_CALIDAD_JPEG,
+    CARPETA_CACHE_IMAGENES
+)
+from src.metricas import incrementar, medido, registrar_etapa
+from src.utils import logger, EXTENSIONES_PERMITIDAS, TAMANO_MAXIMO, DIMENSIONES_MAXIMAS
+
+
+class CacheImagenes:
+    """
+    Caché LRU de objetos Image de python-docx con presupuesto en bytes.
+
+    Cada entrada guarda también las dimensiones de la imagen original, de modo
+    que la validación y la inserción salen de una sola lectura del archivo.
+
+    Args:
+        presupuesto_bytes (int): Suma máxima del tamaño de las imágenes guardadas
+    """
+    def __init__(self, presupuesto_bytes: int):
+        self.presupuesto_bytes = presupuesto_bytes
+        self._entradas: "OrderedDict[Tuple[str, bool], Tuple[Tuple[int, int], ImagenDocx, Tuple[int, int]]]" = OrderedDict()
+        self._bytes_usados = 0
+        self._bloqueo = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+        self._desalojos = 0
+
+    def obtener(self, ruta: str, optimizar: bool = False,
+                estado: Optional[os.stat_result] = None) -> Tuple[ImagenDocx, Tuple[int, int]]:
+        """
+        Devuelve la imagen analizada, leyéndola de disco solo si cambió o no está.
+
+        Args:
+            ruta (str): Ruta al archivo de imagen
+            optimizar (bool): Devolver la variante redimensionada y recomprimida
+            estado (os.stat_result, opcional): Resultado de os.stat ya obtenido
+
+        Returns:
+            Tuple[Image, Tuple[int, int]]: (imagen de python-docx con su hash SHA1
+                ya calculado, (ancho, alto) en píxeles de la imagen original)
+        """
+        clave = (os.path.abspath(ruta), optimizar)
+        estado = estado or os.stat(ruta)
+        firma = (estado.st_mtime_ns, estado.st_size)
+
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == firma:
+                self._entradas.move_to_end(clave)
+                self._aciertos += 1
+                incrementar('imagenes_cache_aciertos')
+                return entrada[1], entrada[2]
+
+        imagen, dimensiones = _leer_imagen(ruta, optimizar)
+        imagen.sha1  # Se calcula una sola vez y queda guardado en el objeto
+
+        with self._bloqueo:
+            self._fallos += 1
+            incrementar('imagenes_cache_fallos')
+            self._descartar(clave)
+            if len(imagen.blob) <= self.presupuesto_bytes:
+                self._entradas[clave] = (firma, imagen, dimensiones)
+                self._bytes_usados += len(imagen.blob)
+                while self._bytes_usados > self.presupuesto_bytes:
+                    antigua = next(iter(self._entradas))
+                    self._descartar(antigua)
+                    self._desalojos += 1
+                    incrementar('imagenes_cache_desalojos')
+        return imagen, dimensiones
+
+    def _descartar(self, clave: Tuple[str, bool]) -> None:
+        """Quita una entrada (si existe) y descuenta sus bytes"""
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes_usados -= len(entrada[1].blob)
+
+    def limpiar(self) -> None:
+        """Vacía la caché sin reiniciar las estadísticas"""
+        with self._bloqueo:
+            self._entradas.clear()
+            self._bytes_usados = 0
+
+    def estadisticas(self) -> Dict[str, float]:
+        """Devuelve entradas, bytes, aciertos, fallos, desalojos y tasa de aciertos"""
+        with self._bloqueo:
+            consultas = self._aciertos + self._fallos
+            return {
+                'entradas': len(self._entradas),
+                'bytes_usados': self._bytes_usados,
+                'presupuesto_bytes': self.presupuesto_bytes,
+                'aciertos': self._aciertos,
+                'fallos': self._fallos,
+                'desalojos': self._desalojos,
+                'tasa_aciertos': self._aciertos / consultas if consultas else 0.0,
+            }
+
+
+# Caché compartida por todo el proceso
+cache_imagenes = CacheImagenes(CACHE_IMAGENES_BYTES)
+
+
+# Ancho en pulgadas con que se muestra la fotografía en el documento
+ANCHO_PULGADAS = 4.0
+
+# Versión del algoritmo de preparación; forma parte de la clave de la caché
+_VERSION_PREPARACION = 1
+
+def _recodificar(datos: bytes, ancho_px: int, calidad_jpeg: int, dpi: int) -> Tuple[bytes, str]:
+    """
+    Redimensiona (solo si es más ancha que ancho_px) y recomprime una imagen.
+
+    Returns:
+        Tuple[bytes, str]: (contenido_nuevo, extensión) o (b'', '') si no aplica
+    """
+    with Image.open(io.BytesIO(datos)) as img:
+        formato = img.format
+        if formato == 'GIF' and getattr(img, 'is_animated', False):
+            return b'', ''  # Las animaciones se incrustan tal cual
+
+        redimensionada = img.width > ancho_px
+        if redimensionada:
+            alto_px = max(1, round(img.height * ancho_px / img.width))
+            img = img.resize((ancho_px, alto_px), Image.LANCZOS)
+        resolucion = (dpi, dpi) if redimensionada else img.info.get('dpi', (dpi, dpi))
+
+        salida = io.BytesIO()
+        if formato == 'JPEG':
+            if img.mode not in ('RGB', 'L', 'CMYK'):
+                img = img.convert('RGB')
+            img.save(salida, 'JPEG', quality=calidad_jpeg, optimize=True, dpi=resolucion)
+            extension = '.jpg'
+        else:
+            # PNG, BMP y GIF estático se guardan como PNG optimizado (sin pérdida)
+            img.save(salida, 'PNG', optimize=True, dpi=resolucion)
+            extension = '.png'
+
+    contenido = salida.getvalue()
+    if not redimensionada and len(contenido) >= len(datos):
+        return b'', ''  # La recompresión no ahorra nada: se conserva el original
+    return contenido, extension
+
+
+def _variante(datos: bytes, ruta: str, dpi: int, calidad_jpeg: int, carpeta_cache: str,
+              ancho_pulgadas: float) -> Optional[Tuple[str, Optional[bytes]]]:
+    """
+    Busca (o calcula y guarda) la variante optimizada del contenido de una imagen.
+
+    Returns:
+        Tuple[str, bytes]: (ruta de la variante, contenido si se acaba de calcular
+            o None si ya estaba en disco), o None si se conserva el original
+    """
+    parametros = (_VERSION_PREPARACION, dpi, calidad_jpeg, ancho_pulgadas)
+    clave = hashlib.sha256(hashlib.sha256(datos).digest() + repr(parametros).encode()).hexdigest()
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    carpeta = os.path.join(carpeta_cache, clave[:2], clave)
+
+    # Variante ya calculada (por este u otro proceso)
+    existentes = os.listdir(carpeta) if os.path.isdir(carpeta) else []
+    candidata = next((a for a in existentes if os.path.splitext(a)[0] == nombre), None)
+    if candidata is not None:
+        return os.path.join(carpeta, candidata), None
+    if '.original' in existentes:
+        return None
+
+    contenido, extension = _recodificar(datos, round(ancho_pulgadas * dpi), calidad_jpeg, dpi)
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, nombre + extension if contenido else '.original')
+    # Escritura atómica: otro proceso nunca ve un archivo a medias
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, destino)
+    incrementar('imagenes_optimizadas')
+    return (destino, contenido) if contenido else None
+
+
+def _analizar(datos: bytes, nombre: str) -> ImagenDocx:
+    """Analiza la cabecera de una imagen ya leída en memoria"""
+    return ImagenDocx._from_stream(io.BytesIO(datos), datos, nombre)
+
+
+def _leer_imagen(ruta: str, optimizar: bool) -> Tuple[ImagenDocx, Tuple[int, int]]:
+    """
+    Lee el archivo una sola vez y devuelve la imagen a incrustar y sus dimensiones originales.
+
+    La misma cabecera analizada sirve para validar las dimensiones y para
+    insertar la imagen; con optimizar, se inserta la variante preparada.
+    """
+    with open(ruta, 'rb') as f:
+        datos = f.read()
+    registrar_etapa('validar_imagen', None, leidos=len(datos))
+    original = _analizar(datos, os.path.basename(ruta))
+    dimensiones = (original.px_width, original.px_height)
+    if optimizar:
+        variante = _variante(datos, ruta, IMAGEN_DPI, IMAGEN_CALIDAD_JPEG,
+                             CARPETA_CACHE_IMAGENES, ANCHO_PULGADAS)
+        if variante is not None:
+            ruta_variante, contenido = variante
+            if contenido is None:
+                with open(ruta_variante, 'rb') as f:
+                    contenido = f.read()
+                registrar_etapa('validar_imagen', None, leidos=len(contenido))
+            return _analizar(contenido, os.path.basename(ruta_variante)), dimensiones
+    return original, dimensiones
+
+
+@medido('validar_imagen')
+def cargar_imagen(ruta: str, tipo: str = 'arboles',
+                  optimizar: Optional[bool] = None) -> Tuple[Optional[ImagenDocx], str]:
+    """
+    Valida una imagen y la deja lista para incrustar con una sola lectura del archivo.
+
+    Aplica los mismos criterios que utils.validar_imagen (existencia, extensión,
+    tamaño y dimensiones), pero las dimensiones salen de la cabecera que
+    python-docx ya analiza para insertar la imagen, en lugar de abrirla con PIL.
+
+    Args:
+        ruta (str): Ruta completa al archivo de imagen
+        tipo (str): Tipo de imagen ('arboles', 'iconos', 'templates')
+        optimizar (bool, opcional): Preparar la imagen; None usa OPTIMIZAR_IMAGENES
+
+    Returns:
+        Tuple[Image, str]: (imagen, mensaje)
+            - imagen: Imagen lista para agregar_imagen, o None si no es válida
+            - mensaje: Descripción del resultado o error
+    """
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None, f"El archivo no existe: {ruta}"
+
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in EXTENSIONES_PERMITIDAS:
+        return None, f"Extensión no permitida. Use: {EXTENSIONES_PERMITIDAS}"
+
+    if estado.st_size > TAMANO_MAXIMO:
+        return None, f"Archivo demasiado grande. Máximo: {TAMANO_MAXIMO/1024/1024}MB"
+
+    try:
+        max_ancho, max_alto = DIMENSIONES_MAXIMAS[tipo]
+        imagen, (ancho, alto) = cache_imagenes.obtener(
+            ruta, OPTIMIZAR_IMAGENES if optimizar is None else optimizar, estado
+        )
+    except Exception as e:
+        logger.error(f"Error al validar imagen {ruta}: {str(e)}")
+        return None, f"Error al procesar la imagen: {str(e)}"
+
+    if ancho > max_ancho or alto > max_alto:
+        return None, f"Dimensiones exceden el máximo para {tipo}: {max_ancho}x{max_alto}"
+    return imagen, "Imagen válida"
+
+
+@medido('incrustar_imagen')
+def agregar_imagen(doc, imagen: ImagenDocx, ancho=None, alto=None):
+    """
+    Equivalente a doc.add_picture() con una imagen ya analizada.
+
+    Args:
+        doc (Document): Documento al que se agrega la imagen
+        imagen (Image): Imagen obtenida de la caché
+        ancho (Length, opcional): Ancho con que se muestra la imagen
+        alto (Length, opcional): Alto con que se muestra la imagen
+
+    Returns:
+        Run: Run que contiene la imagen
+    """
+    parte = doc.part
+    partes_imagen = parte.package.image_parts
+    parte_imagen = partes_imagen._get_by_sha1(imagen.sha1)
+    if parte_imagen is None:
+        parte_imagen = partes_imagen._add_image_part(imagen)
+    rId = parte.relate_to(parte_imagen, RT.IMAGE)
+
+    cx, cy = imagen.scaled_dimensions(ancho, alto)
+    inline = CT_Inline.new_pic_inline(parte.next_id, rId, imagen.filename, cx, cy)
+    run = doc.add_paragraph().add_run()
+    run._r.add_drawing(inline)
+    return run
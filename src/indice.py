@@ -0,0 +1,346 @@
+"""
+Módulo de Índice para el Generador de Documentos de Árboles
+Este módulo evita volver a renderizar registros que ya tienen un documento.
+
+Características principales:
+- Índice persistente en SQLite, compartido entre ejecuciones y procesos
+- Clave calculada con el registro, el contenido de su imagen, la plantilla
+  y las opciones de renderizado
+- Solo se reutiliza una salida que todavía existe en disco
+- Búsqueda en bloque para el modo por lotes
+- Dependencias de cada documento (registro, imagen y plantilla con sus
+  huellas) para regenerar solo los afectados cuando cambia un recurso
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import docx
+
+from src.config import RUTA_INDICE
+
+# Versión del formato de los documentos generados; cambiarla invalida el índice
+_VERSION_RENDER = 1
+
+# Claves por consulta en buscar_lote (SQLite admite hasta 999 parámetros)
+_CLAVES_POR_CONSULTA = 500
+
+# Última huella calculada de cada archivo en este proceso: ruta -> (mtime, tamaño,
+# huella). Una versión nueva reemplaza a la anterior, así que hay una entrada por
+# archivo y no una por cada versión que tuvo mientras el proceso estaba vivo
+_HUELLAS: Dict[str, Tuple[int, int, str]] = {}
+
+
+def huella_archivo(ruta: Optional[str]) -> str:
+    """
+    Devuelve el SHA-256 del contenido de un archivo, leyéndolo una vez por versión.
+
+    Args:
+        ruta (str, opcional): Ruta al archivo
+
+    Returns:
+        str: Hash hexadecimal, o 'ausente' si la ruta es None o no existe
+    """
+    if ruta is None:
+        return 'ausente'
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return 'ausente'
+    clave = os.path.abspath(ruta)
+    memo = _HUELLAS.get(clave)
+    if memo is not None and memo[:2] == (estado.st_mtime_ns, estado.st_size):
+        return memo[2]
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloque)
+    huella = sha.hexdigest()
+    _HUELLAS[clave] = (estado.st_mtime_ns, estado.st_size, huella)
+    return huella
+
+
+def huella_plantilla(ruta_plantilla: Optional[str]) -> str:
+    """Huella de la plantilla: su contenido, o la versión de python-docx para la de defecto"""
+    if ruta_plantilla is None:
+        return f'python-docx-{docx.__version__}'
+    return huella_archivo(ruta_plantilla)
+
+
+def ruta_imagen(data: dict, carpeta_imagenes: str) -> Optional[str]:
+    """Ruta de la imagen referenciada por el registro, o None si no tiene"""
+    if "imagen" not in data:
+        return None
+    return os.path.join(carpeta_imagenes, data["imagen"])
+
+
+def dependencias_documento(data: dict, carpeta_imagenes: str, carpeta_salida: str,
+                           ruta_plantilla: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """
+    Reúne lo necesario para saber si un documento quedó desactualizado y para
+    volver a generarlo: el registro, la imagen y la plantilla con sus huellas.
+
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+
+    Returns:
+        Dict[str, str]: Columnas de dependencias del índice
+    """
+    imagen = ruta_imagen(data, carpeta_imagenes)
+    return {
+        'registro': json.dumps(data, sort_keys=True, ensure_ascii=False, default=str),
+        'carpeta_imagenes': carpeta_imagenes,
+        'carpeta_salida': carpeta_salida,
+        'imagen': os.path.abspath(imagen) if imagen is not None else None,
+        'huella_imagen': huella_archivo(imagen),
+        'plantilla': os.path.abspath(ruta_plantilla) if ruta_plantilla is not None else None,
+        'huella_plantilla': huella_plantilla(ruta_plantilla),
+    }
+
+
+def clave_documento(data: dict, carpeta_imagenes: str, carpeta_salida: str,
+                    ruta_plantilla: Optional[str] = None, opciones: Tuple = (),
+                    dependencias: Optional[Dict[str, Optional[str]]] = None) -> str:
+    """
+    Calcula la clave de idempotencia de un registro.
+
+    Dos registros con la misma clave producen el mismo documento: mismo
+    contenido (sin importar el orden de los campos), misma imagen byte a byte,
+    misma plantilla, mismas opciones y misma carpeta de salida.
+
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+        opciones (Tuple): Opciones de renderizado que cambian el resultado
+        dependencias (Dict, opcional): Resultado de dependencias_documento() si
+            ya se calculó
+
+    Returns:
+        str: Hash hexadecimal SHA-256
+    """
+    if dependencias is None:
+        dependencias = dependencias_documento(data, carpeta_imagenes, carpeta_salida,
+                                              ruta_plantilla)
+    partes = [
+        str(_VERSION_RENDER),
+        dependencias['registro'],
+        dependencias['huella_imagen'],
+        dependencias['huella_plantilla'],
+        repr(opciones),
+        os.path.abspath(carpeta_salida),
+    ]
+    return hashlib.sha256('\x00'.join(partes).encode('utf-8')).hexdigest()
+
+
+# Columnas de dependencias (agregadas a índices creados sin ellas)
+_COLUMNAS_DEPENDENCIAS = ('registro', 'carpeta_imagenes', 'carpeta_salida', 'imagen',
+                          'huella_imagen', 'plantilla', 'huella_plantilla')
+
+
+class IndiceDocumentos:
+    """
+    Índice clave -> documento generado, guardado en SQLite.
+
+    Cada proceso abre su propia conexión (el índice se usa desde el pool de
+    procesos); el modo WAL permite lecturas mientras otro proceso escribe.
+
+    Args:
+        ruta (str): Ruta del archivo de base de datos
+    """
+    def __init__(self, ruta: str = RUTA_INDICE):
+        self.ruta = ruta
+        self._conexion_actual: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._bloqueo = threading.Lock()
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Devuelve la conexión de este proceso, creándola la primera vez"""
+        if self._conexion_actual is None or self._pid != os.getpid():
+            carpeta = os.path.dirname(self.ruta)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=30, check_same_thread=False)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS documentos ('
+                'clave TEXT PRIMARY KEY, id_arbol TEXT, ruta_salida TEXT NOT NULL)'
+            )
+            existentes = {fila[1] for fila in conexion.execute('PRAGMA table_info(documentos)')}
+            for columna in _COLUMNAS_DEPENDENCIAS:
+                if columna not in existentes:
+                    conexion.execute(f'ALTER TABLE documentos ADD COLUMN {columna} TEXT')
+            conexion.execute('CREATE INDEX IF NOT EXISTS documentos_imagen ON documentos (imagen)')
+            conexion.execute('CREATE INDEX IF NOT EXISTS documentos_salida ON documentos (ruta_salida)')
+            conexion.commit()
+            self._conexion_actual, self._pid = conexion, os.getpid()
+        return self._conexion_actual
+
+    def buscar(self, clave: str) -> Optional[str]:
+        """
+        Devuelve el documento ya generado para la clave, si todavía existe.
+
+        Args:
+            clave (str): Clave calculada con clave_documento()
+
+        Returns:
+            str: Ruta del documento, o None si hay que generarlo
+        """
+        return self.buscar_lote([clave]).get(clave)
+
+    def buscar_lote(self, claves: Iterable[str]) -> Dict[str, str]:
+        """
+        Busca muchas claves con pocas consultas.
+
+        Args:
+            claves (Iterable[str]): Claves calculadas con clave_documento()
+
+        Returns:
+            Dict[str, str]: Clave -> ruta del documento, solo para las claves
+                cuyo documento sigue existiendo
+        """
+        claves = list(claves)
+        encontrados = {}
+        with self._bloqueo:
+            conexion = self._conexion()
+            for inicio in range(0, len(claves), _CLAVES_POR_CONSULTA):
+                lote = claves[inicio:inicio + _CLAVES_POR_CONSULTA]
+                marcadores = ','.join('?' * len(lote))
+                filas = conexion.execute(
+                    f'SELECT clave, ruta_salida FROM documentos WHERE clave IN ({marcadores})',
+                    lote
+                )
+                encontrados.update(filas)
+        # Una salida borrada o movida no cuenta: se vuelve a generar
+        return {clave: ruta for clave, ruta in encontrados.items() if os.path.isfile(ruta)}
+
+    def registrar(self, clave: str, id_arbol: str, ruta_salida: str,
+                  dependencias: Optional[Dict[str, Optional[str]]] = None) -> None:
+        """
+        Guarda (o reemplaza) el documento generado para la clave.
+
+        Si el documento reemplaza a otro en la misma ruta (regeneración), la
+        entrada anterior se elimina.
+
+        Args:
+            clave (str): Clave calculada con clave_documento()
+            id_arbol (str): Identificador del árbol
+            ruta_salida (str): Ruta del documento generado
+            dependencias (Dict, opcional): Resultado de dependencias_documento()
+        """
+        dependencias = dependencias or {}
+        columnas = ('clave', 'id_arbol', 'ruta_salida') + _COLUMNAS_DEPENDENCIAS
+        valores = (clave, id_arbol, ruta_salida) + tuple(
+            dependencias.get(columna) for columna in _COLUMNAS_DEPENDENCIAS
+        )
+        with self._bloqueo:
+            conexion = self._conexion()
+            conexion.execute(
+                f'INSERT OR REPLACE INTO documentos ({", ".join(columnas)}) '
+                f'VALUES ({", ".join("?" * len(columnas))})', valores
+            )
+            conexion.execute('DELETE FROM documentos WHERE ruta_salida = ? AND clave != ?',
+                             (ruta_salida, clave))
+            conexion.commit()
+
+    def desactualizados(self, imagenes: Optional[Iterable[str]] = None) -> List[Dict[str, str]]:
+        """
+        Devuelve los documentos cuya imagen o plantilla cambió desde que se generaron.
+
+        Cada imagen y plantilla distinta se vuelve a leer una sola vez, sin
+        importar cuántos documentos dependan de ella.
+
+        Args:
+            imagenes (Iterable[str], opcional): Limitar la búsqueda a estas imágenes
+
+        Returns:
+            List[Dict[str, str]]: Filas del índice (con ruta_salida y dependencias)
+        """
+        condicion, parametros = 'imagen IS NOT NULL', []
+        if imagenes is not None:
+            parametros = sorted({os.path.abspath(imagen) for imagen in imagenes})
+            if not parametros:
+                return []
+            condicion = f'imagen IN ({",".join("?" * len(parametros))})'
+
+        with self._bloqueo:
+            conexion = self._conexion()
+            conexion.row_factory = sqlite3.Row
+            try:
+                pares_imagen = conexion.execute(
+                    f'SELECT DISTINCT imagen, huella_imagen FROM documentos WHERE {condicion}',
+                    parametros
+                ).fetchall()
+                pares_plantilla = [] if imagenes is not None else conexion.execute(
+                    'SELECT DISTINCT plantilla, huella_plantilla FROM documentos '
+                    'WHERE registro IS NOT NULL'
+                ).fetchall()
+
+                cambiados = [
+                    ('imagen', fila[0], fila[1]) for fila in pares_imagen
+                    if huella_archivo(fila[0]) != fila[1]
+                ] + [
+                    ('plantilla', fila[0], fila[1]) for fila in pares_plantilla
+                    if huella_plantilla(fila[0]) != fila[1]
+                ]
+
+                filas = {}
+                for columna, ruta, huella in cambiados:
+                    consulta = (f'SELECT * FROM documentos WHERE registro IS NOT NULL AND '
+                                f'{columna} IS ? AND huella_{columna} = ?')
+                    for fila in conexion.execute(consulta, (ruta, huella)):
+                        filas[fila['clave']] = dict(fila)
+            finally:
+                conexion.row_factory = None
+        return list(filas.values())
+
+    def cerrar(self) -> None:
+        """Cierra la conexión de este proceso"""
+        with self._bloqueo:
+            if self._conexion_actual is not None and self._pid == os.getpid():
+                self._conexion_actual.close()
+            self._conexion_actual = None
+
+
+# Índice por ruta, compartido por todo el proceso
+_INDICES: Dict[str, IndiceDocumentos] = {}
+
+
+def obtener_indice(ruta: str = RUTA_INDICE) -> IndiceDocumentos:
+    """Devuelve el índice de la ruta indicada (uno por proceso)"""
+    indice = _INDICES.get(ruta)
+    if indice is None:
+        indice = _INDICES.setdefault(ruta, IndiceDocumentos(ruta))
+    return indice
+
+
+def documentos_existentes(registros: List[dict], carpeta_imagenes: str, carpeta_salida: str,
+                          ruta_plantilla: Optional[str] = None,
+                          opciones: Tuple = ()) -> List[Optional[str]]:
+    """
+    Búsqueda en bloque para el modo por lotes.
+
+    Args:
+        registros (List[dict]): Registros a comprobar
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+        ruta_plantilla (str, opcional): Plantilla .docx base
+        opciones (Tuple): Opciones de renderizado (ver opciones_render del generador)
+
+    Returns:
+        List[Optional[str]]: Para cada registro, la ruta de su documento vigente
+            o None si hay que generarlo
+    """
+    claves = [clave_documento(r, carpeta_imagenes, carpeta_salida, ruta_plantilla, opciones)
+              for r in registros]
+    encontrados = obtener_indice().buscar_lote(claves)
+    return [encontrados.get(clave) for clave in claves]
@@ -0,0 +1,192 @@
+"""
+Módulo de Lectores para el Generador de Documentos de Árboles
+Este módulo lee inventarios en formato JSON Lines (un árbol por línea) sin
+cargarlos completos en memoria.
+
+Características principales:
+- Archivos .jsonl, .jsonl.gz y .jsonl.xz leídos línea por línea
+- Posición (offset) de cada registro para reanudar la lectura
+- Punto de control persistente con escritura atómica, ligado al tamaño y la
+  fecha de modificación del archivo (se descarta si el archivo se reemplazó)
+- Confirmación en orden: solo se avanza hasta la última línea cuyas
+  anteriores ya terminaron, aunque se rendericen en paralelo
+"""
+
+import gzip
+import json
+import lzma
+import os
+import tempfile
+from collections import OrderedDict
+from typing import IO, Iterator, Optional, Tuple
+
+from src.utils import logger
+
+# Extensiones reconocidas como JSON Lines (sin comprimir y comprimidas)
+EXTENSIONES_JSONL = ('.jsonl', '.jsonl.gz', '.jsonl.xz')
+
+
+def es_jsonl(ruta: str) -> bool:
+    """Indica si la ruta corresponde a un archivo JSON Lines"""
+    return ruta.endswith(EXTENSIONES_JSONL)
+
+
+def abrir_jsonl(ruta: str) -> IO[bytes]:
+    """
+    Abre un archivo JSON Lines en modo binario, descomprimiéndolo si hace falta.
+
+    Args:
+        ruta (str): Ruta a un archivo .jsonl, .jsonl.gz o .jsonl.xz
+
+    Returns:
+        IO[bytes]: Flujo binario con el contenido descomprimido
+    """
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, 'rb')
+    if ruta.endswith('.xz'):
+        return lzma.open(ruta, 'rb')
+    return open(ruta, 'rb')
+
+
+def leer_jsonl(ruta: str, offset: int = 0,
+               linea: int = 0) -> Iterator[Tuple[int, int, Optional[dict], str]]:
+    """
+    Recorre un archivo JSON Lines de a una línea, desde la posición indicada.
+
+    Las líneas vacías se saltan. Una línea que no es JSON válido (o no es un
+    objeto) se entrega con registro None y el mensaje de error, para que quien
+    lee decida cómo registrarla sin detener el recorrido.
+
+    Args:
+        ruta (str): Ruta al archivo .jsonl, .jsonl.gz o .jsonl.xz
+        offset (int): Posición (en bytes descomprimidos) desde donde leer
+        linea (int): Número de líneas ya leídas antes de offset
+
+    Returns:
+        Iterator[Tuple[int, int, dict, str]]: (número de línea, offset al final
+            de la línea, registro o None, mensaje de error)
+    """
+    with abrir_jsonl(ruta) as f:
+        if offset:
+            # En gzip/xz el salto descomprime sin analizar las líneas anteriores
+            f.seek(offset)
+        for contenido in f:
+            linea += 1
+            offset += len(contenido)
+            if not contenido.strip():
+                continue
+            try:
+                registro = json.loads(contenido)
+            except ValueError as e:
+                yield linea, offset, None, f"JSON inválido en la línea {linea}: {e}"
+                continue
+            if not isinstance(registro, dict):
+                yield linea, offset, None, f"La línea {linea} no es un objeto JSON"
+                continue
+            yield linea, offset, registro, ""
+
+
+class PuntoControl:
+    """
+    Última posición confirmada de un archivo JSON Lines, guardada junto a él.
+
+    El archivo <ruta>.checkpoint contiene el offset y el número de línea hasta
+    donde todos los registros ya se procesaron, junto con el tamaño y la fecha
+    de modificación (en ns) del archivo leído. Si el archivo se reemplazó (p. ej.
+    una nueva exportación con el mismo nombre), el punto de control no
+    corresponde a su contenido y se ignora.
+
+    Args:
+        ruta (str): Ruta al archivo JSON Lines
+    """
+    def __init__(self, ruta: str):
+        self.origen = ruta
+        self.ruta = ruta + '.checkpoint'
+
+    def _firma(self) -> Tuple[int, int]:
+        """Tamaño y fecha de modificación (ns) del archivo JSON Lines"""
+        estado = os.stat(self.origen)
+        return estado.st_size, estado.st_mtime_ns
+
+    def cargar(self) -> Tuple[int, int]:
+        """
+        Devuelve la posición guardada, o (0, 0) si no hay punto de control o
+        si pertenece a otra versión del archivo.
+
+        Returns:
+            Tuple[int, int]: (offset, número de línea)
+        """
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            posicion = int(datos['offset']), int(datos['linea'])
+            guardada = datos.get('tamano'), datos.get('mtime_ns')
+            actual = self._firma()
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, 0
+        if guardada != actual:
+            logger.warning(f"⚠️ {self.origen} cambió desde su punto de control; "
+                           f"se procesa desde el principio")
+            return 0, 0
+        return posicion
+
+    def guardar(self, offset: int, linea: int) -> None:
+        """Guarda la posición de forma atómica (nunca queda un archivo a medias)"""
+        try:
+            tamano, mtime_ns = self._firma()
+        except FileNotFoundError:
+            return  # El archivo ya no está: no hay nada que reanudar
+        carpeta = os.path.dirname(os.path.abspath(self.ruta))
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset, 'linea': linea, 'tamano': tamano,
+                       'mtime_ns': mtime_ns}, f)
+        os.replace(temporal, self.ruta)
+
+    def eliminar(self) -> None:
+        """Borra el punto de control (al terminar el archivo o al moverlo a procesados)"""
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+class MarcaConfirmada:
+    """
+    Calcula hasta dónde se puede confirmar cuando las líneas terminan en desorden.
+
+    Args:
+        offset (int): Posición inicial ya confirmada
+        linea (int): Número de línea inicial ya confirmado
+    """
+    def __init__(self, offset: int = 0, linea: int = 0):
+        self.offset = offset
+        self.linea = linea
+        self._en_curso: "OrderedDict[int, Tuple[int, bool]]" = OrderedDict()
+
+    def iniciar(self, linea: int, offset_fin: int) -> None:
+        """Registra una línea enviada a procesar (en orden de lectura)"""
+        self._en_curso[linea] = (offset_fin, False)
+
+    def completar(self, linea: int) -> bool:
+        """
+        Marca una línea como terminada y avanza la marca si corresponde.
+
+        Returns:
+            bool: True si la marca confirmada avanzó
+        """
+        self._en_curso[linea] = (self._en_curso[linea][0], True)
+        avanzo = False
+        while self._en_curso:
+            primera, (offset_fin, terminada) = next(iter(self._en_curso.items()))
+            if not terminada:
+                break
+            del self._en_curso[primera]
+            self.offset, self.linea = offset_fin, primera
+            avanzo = True
+        return avanzo
+
+    def avanzar(self, linea: int, offset_fin: int) -> None:
+        """Confirma directamente una línea que no requiere procesamiento"""
+        self.iniciar(linea, offset_fin)
+        self.completar(linea)
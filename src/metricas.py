@@ -0,0 +1,456 @@
+"""
+Módulo de Métricas para el Generador de Documentos de Árboles
+Este módulo mantiene contadores globales del proceso (cachés, documentos, errores)
+y la duración de cada etapa del procesamiento.
+
+Características principales:
+- Contadores con nombre, seguros entre hilos
+- Lectura instantánea de todos los valores para reportes
+- Ventana de latencias recientes con percentiles (p50, p90, p99)
+- Histogramas de duración por etapa (p50, p95, p99) con bytes leídos y escritos
+- Los trabajadores del pool envían sus métricas al proceso principal al terminar
+- Exportación como archivo de texto de Prometheus y como resumen JSON
+"""
+
+import functools
+import json
+import multiprocessing
+import multiprocessing.queues
+import multiprocessing.util
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.config import METRICAS_PROMETHEUS, METRICAS_JSON
+from src.publicacion import publicar
+
+_CONTADORES: Dict[str, int] = defaultdict(int)
+_BLOQUEO = threading.Lock()
+
+# Hilos con el registro suspendido (ver sin_registro)
+_SUSPENDIDO = threading.local()
+
+# Límites superiores (segundos) de las cubetas de los histogramas: seis por
+# década de 10 µs a 100 s; la última cubeta (+Inf) recoge el resto
+LIMITES_HISTOGRAMA: Tuple[float, ...] = tuple(
+    round(base * 10.0 ** exponente, 6)
+    for exponente in range(-5, 3) for base in (1, 1.5, 2, 3, 5, 7)
+)[:-5]
+
+# Prefijo de las métricas exportadas a Prometheus
+PREFIJO_PROMETHEUS = 'docx_generador'
+
+
+def incrementar(nombre: str, cantidad: int = 1) -> None:
+    """Suma una cantidad al contador indicado"""
+    if getattr(_SUSPENDIDO, 'activo', False):
+        return
+    with _BLOQUEO:
+        _CONTADORES[nombre] += cantidad
+
+
+def obtener_metricas() -> Dict[str, int]:
+    """Devuelve una copia de todos los contadores"""
+    with _BLOQUEO:
+        return dict(_CONTADORES)
+
+
+def reiniciar_metricas() -> None:
+    """Pone a cero todos los contadores y las etapas"""
+    with _BLOQUEO:
+        _CONTADORES.clear()
+        _ETAPAS.clear()
+
+
+def percentil(ordenados: List[float], fraccion: float) -> float:
+    """
+    Percentil por rango más cercano de una lista ya ordenada.
+
+    Args:
+        ordenados (List[float]): Valores en orden ascendente (no vacía)
+        fraccion (float): Percentil entre 0 y 1 (p. ej. 0.99)
+
+    Returns:
+        float: Valor del percentil
+    """
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fraccion))]
+
+
+class VentanaLatencias:
+    """
+    Últimas latencias registradas, para calcular percentiles sin guardar el historial.
+
+    Args:
+        tamano (int): Cantidad de mediciones recientes que se conservan
+    """
+    def __init__(self, tamano: int = 10000):
+        self._valores: "deque[float]" = deque(maxlen=tamano)
+        self._total = 0
+        self._bloqueo = threading.Lock()
+
+    def registrar(self, segundos: float) -> None:
+        """Agrega una medición (en segundos)"""
+        with self._bloqueo:
+            self._valores.append(segundos)
+            self._total += 1
+
+    def resumen(self) -> Dict[str, float]:
+        """
+        Devuelve el total de mediciones y, sobre la ventana, p50, p90, p99 y máximo.
+
+        Returns:
+            Dict[str, float]: Percentiles en milisegundos
+        """
+        with self._bloqueo:
+            ordenados = sorted(self._valores)
+            total = self._total
+        if not ordenados:
+            return {'total': total, 'ventana': 0}
+        return {
+            'total': total,
+            'ventana': len(ordenados),
+            'p50_ms': percentil(ordenados, 0.50) * 1000,
+            'p90_ms': percentil(ordenados, 0.90) * 1000,
+            'p99_ms': percentil(ordenados, 0.99) * 1000,
+            'max_ms': ordenados[-1] * 1000,
+        }
+
+
+class Histograma:
+    """
+    Histograma de duraciones con cubetas fijas, combinable entre procesos.
+
+    Los percentiles se estiman interpolando dentro de la cubeta que los
+    contiene (como histogram_quantile de Prometheus); el máximo es exacto.
+
+    Args:
+        limites (Tuple[float, ...]): Límites superiores de las cubetas, en segundos
+    """
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_HISTOGRAMA):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.cuenta = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos: float) -> None:
+        """Agrega una medición (en segundos)"""
+        self.cubetas[bisect_left(self.limites, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, fraccion: float) -> float:
+        """
+        Estima un percentil a partir de las cubetas.
+
+        Args:
+            fraccion (float): Percentil entre 0 y 1 (p. ej. 0.95)
+
+        Returns:
+            float: Duración estimada en segundos (0 si no hay mediciones)
+        """
+        objetivo = fraccion * self.cuenta
+        acumulado = 0
+        for indice, cantidad in enumerate(self.cubetas):
+            if cantidad and acumulado + cantidad >= objetivo:
+                inferior = self.limites[indice - 1] if indice else 0.0
+                superior = min(self.limites[indice] if indice < len(self.limites)
+                               else self.maximo, self.maximo)
+                return inferior + (superior - inferior) * (objetivo - acumulado) / cantidad
+            acumulado += cantidad
+        return self.maximo
+
+    def estado(self) -> dict:
+        """Valores del histograma, para enviarlos a otro proceso"""
+        return {'cubetas': list(self.cubetas), 'cuenta': self.cuenta,
+                'suma': self.suma, 'maximo': self.maximo}
+
+    def combinar(self, estado: dict) -> None:
+        """Suma las mediciones de otro histograma con los mismos límites (ver estado())"""
+        for indice, cantidad in enumerate(estado['cubetas']):
+            self.cubetas[indice] += cantidad
+        self.cuenta += estado['cuenta']
+        self.suma += estado['suma']
+        self.maximo = max(self.maximo, estado['maximo'])
+
+
+class EstadisticaEtapa:
+    """Duraciones y bytes leídos y escritos de una etapa del procesamiento"""
+    def __init__(self):
+        self.duraciones = Histograma()
+        self.leidos = 0
+        self.escritos = 0
+
+
+class MedicionEtapa:
+    """Bytes de una ejecución de etapa(), que quien la mide completa"""
+    __slots__ = ('leidos', 'escritos')
+
+    def __init__(self):
+        self.leidos = 0
+        self.escritos = 0
+
+
+_ETAPAS: Dict[str, EstadisticaEtapa] = {}
+
+
+def registrar_etapa(nombre: str, segundos: Optional[float], leidos: int = 0,
+                    escritos: int = 0) -> None:
+    """
+    Registra una ejecución de una etapa.
+
+    Args:
+        nombre (str): Nombre de la etapa (p. ej. 'guardar')
+        segundos (float, opcional): Duración; None solo suma los bytes
+        leidos (int): Bytes leídos durante la etapa
+        escritos (int): Bytes escritos durante la etapa
+    """
+    if getattr(_SUSPENDIDO, 'activo', False):
+        return
+    with _BLOQUEO:
+        estadistica = _ETAPAS.get(nombre)
+        if estadistica is None:
+            estadistica = _ETAPAS[nombre] = EstadisticaEtapa()
+        if segundos is not None:
+            estadistica.duraciones.registrar(segundos)
+        estadistica.leidos += leidos
+        estadistica.escritos += escritos
+
+
+@contextmanager
+def etapa(nombre: str) -> Iterator[MedicionEtapa]:
+    """
+    Mide la duración de un bloque como una ejecución de la etapa indicada.
+
+    Uso:
+        with etapa('leer_json') as medicion:
+            contenido = f.read()
+            medicion.leidos = len(contenido)
+
+    Las etapas pueden anidarse: cada una registra su propia duración completa.
+
+    Args:
+        nombre (str): Nombre de la etapa
+    """
+    medicion = MedicionEtapa()
+    inicio = time.perf_counter()
+    try:
+        yield medicion
+    finally:
+        registrar_etapa(nombre, time.perf_counter() - inicio, medicion.leidos, medicion.escritos)
+
+
+@contextmanager
+def sin_registro() -> Iterator[None]:
+    """
+    Descarta los contadores y etapas que registre este hilo dentro del bloque.
+
+    Sirve para repetir un trabajo ya contado (p. ej. volver a renderizar un
+    documento bajo el perfilador) sin duplicar sus métricas.
+    """
+    anterior = getattr(_SUSPENDIDO, 'activo', False)
+    _SUSPENDIDO.activo = True
+    try:
+        yield
+    finally:
+        _SUSPENDIDO.activo = anterior
+
+
+def medido(nombre: str) -> Callable[[Callable], Callable]:
+    """Decorador: cada llamada a la función se registra como una ejecución de la etapa"""
+    def decorador(funcion: Callable) -> Callable:
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                registrar_etapa(nombre, time.perf_counter() - inicio)
+        return envoltura
+    return decorador
+
+
+def resumen_etapas() -> Dict[str, Dict[str, float]]:
+    """
+    Devuelve por etapa el número de ejecuciones, el tiempo total, los
+    percentiles (p50, p95, p99), el máximo y los bytes leídos y escritos.
+
+    Returns:
+        Dict[str, Dict[str, float]]: Tiempos en milisegundos, ordenado por tiempo total
+    """
+    with _BLOQUEO:
+        etapas = sorted(_ETAPAS.items(), key=lambda par: -par[1].duraciones.suma)
+        return {
+            nombre: {
+                'cuenta': e.duraciones.cuenta,
+                'total_ms': e.duraciones.suma * 1000,
+                'p50_ms': e.duraciones.percentil(0.50) * 1000,
+                'p95_ms': e.duraciones.percentil(0.95) * 1000,
+                'p99_ms': e.duraciones.percentil(0.99) * 1000,
+                'max_ms': e.duraciones.maximo * 1000,
+                'bytes_leidos': e.leidos,
+                'bytes_escritos': e.escritos,
+            }
+            for nombre, e in etapas
+        }
+
+
+def instantanea() -> dict:
+    """Contadores y etapas del proceso, para combinarlos en otro proceso"""
+    with _BLOQUEO:
+        return {
+            'contadores': dict(_CONTADORES),
+            'etapas': {nombre: dict(e.duraciones.estado(), leidos=e.leidos, escritos=e.escritos)
+                       for nombre, e in _ETAPAS.items()},
+        }
+
+
+def combinar(datos: dict) -> None:
+    """Suma a este proceso una instantanea() de otro"""
+    with _BLOQUEO:
+        for nombre, cantidad in datos['contadores'].items():
+            _CONTADORES[nombre] += cantidad
+        for nombre, estado in datos['etapas'].items():
+            estadistica = _ETAPAS.get(nombre)
+            if estadistica is None:
+                estadistica = _ETAPAS[nombre] = EstadisticaEtapa()
+            estadistica.duraciones.combinar(estado)
+            estadistica.leidos += estado['leidos']
+            estadistica.escritos += estado['escritos']
+
+
+# Métricas de los trabajadores del pool: cada uno envía su instantanea() al
+# terminar y un hilo del proceso principal las combina
+_cola_procesos: Optional[multiprocessing.queues.Queue] = None
+_SINCRONIZAR = 'sincronizar'
+_sincronizado = threading.Event()
+
+
+def _recibir(cola: multiprocessing.queues.Queue) -> None:
+    """Combina las métricas que llegan de los trabajadores (hilo del proceso principal)"""
+    while True:
+        try:
+            datos = cola.get()
+        except (EOFError, OSError, ValueError):
+            return  # Cola cerrada al terminar el proceso
+        if datos == _SINCRONIZAR:
+            _sincronizado.set()
+        else:
+            combinar(datos)
+
+
+def cola_procesos() -> multiprocessing.queues.Queue:
+    """
+    Cola por la que los trabajadores del pool envían sus métricas a este proceso.
+
+    Se crea (con el hilo que las recibe) la primera vez que se pide.
+
+    Returns:
+        Queue: Cola para conectar_proceso()
+    """
+    global _cola_procesos
+    with _BLOQUEO:
+        if _cola_procesos is None:
+            _cola_procesos = multiprocessing.get_context('spawn').Queue()
+            threading.Thread(target=_recibir, args=(_cola_procesos,), daemon=True,
+                             name='metricas-trabajadores').start()
+        return _cola_procesos
+
+
+def conectar_proceso(cola: Optional[multiprocessing.queues.Queue]) -> None:
+    """
+    Envía las métricas de este proceso (un trabajador del pool) al principal al terminar.
+
+    Args:
+        cola (Queue, opcional): Cola devuelta por cola_procesos() en el proceso principal
+    """
+    if cola is not None:
+        # Antes de que multiprocessing cierre sus colas al terminar el proceso
+        # (un atexit llegaría tarde)
+        multiprocessing.util.Finalize(None, lambda: cola.put(instantanea()), exitpriority=100)
+
+
+def recoger_trabajadores(espera: float = 5.0) -> bool:
+    """
+    Espera a que se combinen las métricas de los trabajadores que ya terminaron.
+
+    Se llama después de cerrar el pool: sus métricas están en la cola antes
+    que la marca que se envía aquí.
+
+    Args:
+        espera (float): Segundos máximos de espera
+
+    Returns:
+        bool: True si se combinaron todas
+    """
+    if _cola_procesos is None:
+        return True
+    _sincronizado.clear()
+    _cola_procesos.put(_SINCRONIZAR)
+    return _sincronizado.wait(espera)
+
+
+def _etiqueta(valor: str) -> str:
+    """Escapa el valor de una etiqueta de Prometheus"""
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def texto_prometheus() -> str:
+    """
+    Métricas en el formato de texto de Prometheus (para el textfile collector).
+
+    Returns:
+        str: Histograma de duración y bytes por etapa, y los contadores del proceso
+    """
+    prefijo = PREFIJO_PROMETHEUS
+    with _BLOQUEO:
+        etapas = [(_etiqueta(nombre), e.duraciones.estado(), e.leidos, e.escritos)
+                  for nombre, e in sorted(_ETAPAS.items())]
+        contadores = sorted(_CONTADORES.items())
+
+    lineas = [f'# HELP {prefijo}_etapa_segundos Duración de cada etapa del procesamiento',
+              f'# TYPE {prefijo}_etapa_segundos histogram']
+    for nombre, duraciones, _, _ in etapas:
+        acumulado = 0
+        for limite, cantidad in zip(LIMITES_HISTOGRAMA + (float('inf'),), duraciones['cubetas']):
+            acumulado += cantidad
+            le = '+Inf' if limite == float('inf') else repr(limite)
+            lineas.append(f'{prefijo}_etapa_segundos_bucket{{etapa="{nombre}",le="{le}"}} '
+                          f'{acumulado}')
+        lineas.append(f'{prefijo}_etapa_segundos_sum{{etapa="{nombre}"}} {duraciones["suma"]!r}')
+        lineas.append(f'{prefijo}_etapa_segundos_count{{etapa="{nombre}"}} {duraciones["cuenta"]}')
+
+    for indice, sufijo, ayuda in ((2, 'leidos', 'Bytes leídos'),
+                                  (3, 'escritos', 'Bytes escritos')):
+        lineas.append(f'# HELP {prefijo}_etapa_bytes_{sufijo}_total {ayuda} en cada etapa')
+        lineas.append(f'# TYPE {prefijo}_etapa_bytes_{sufijo}_total counter')
+        for datos in etapas:
+            lineas.append(f'{prefijo}_etapa_bytes_{sufijo}_total{{etapa="{datos[0]}"}} '
+                          f'{datos[indice]}')
+
+    lineas.append(f'# HELP {prefijo}_eventos_total Contadores del proceso (cachés, documentos)')
+    lineas.append(f'# TYPE {prefijo}_eventos_total counter')
+    for nombre, valor in contadores:
+        lineas.append(f'{prefijo}_eventos_total{{nombre="{_etiqueta(nombre)}"}} {valor}')
+    return '\n'.join(lineas) + '\n'
+
+
+def exportar_metricas(ruta_prometheus: Optional[str] = METRICAS_PROMETHEUS,
+                      ruta_json: Optional[str] = METRICAS_JSON) -> None:
+    """
+    Escribe las métricas de etapas y contadores (de forma atómica).
+
+    Args:
+        ruta_prometheus (str, opcional): Archivo de texto de Prometheus; None no lo escribe
+        ruta_json (str, opcional): Resumen JSON con percentiles; None no lo escribe
+    """
+    if ruta_prometheus:
+        publicar(ruta_prometheus, texto_prometheus().encode('utf-8'))
+    if ruta_json:
+        resumen = {'etapas': resumen_etapas(), 'contadores': obtener_metricas()}
+        publicar(ruta_json, json.dumps(resumen, ensure_ascii=False, indent=2).encode('utf-8'))
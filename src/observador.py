@@ -1,13 +1,19 @@
 # Importaciones necesarias para el funcionamiento del observador
 import time         # Para pausas y manejo de tiempo
 import os          # Para operaciones del sistema de archivos
-import json        # Para procesar archivos JSON
-import shutil      # Para mover archivos
+import threading   # Para el escaneo del backlog en segundo plano
 # Importaciones de watchdog para monitoreo de archivos
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from src.generador import generar_documento
-from src.utils import logger, validar_json, crear_carpetas_necesarias
+from src.procesamiento import (  # Pool, backlog y métricas por etapa
+    ProcesadorArchivos, escanear_carpeta, firma_archivo, reportar_metricas
+)
+from src.metricas import etapa  # Duración del escaneo de reconciliación
+from src.lectores import es_jsonl  # Inventarios JSON Lines (.jsonl, .jsonl.gz, .jsonl.xz)
+from src.config import (
+    INTERVALO_ESTADO, INTERVALO_RECONCILIACION, ESPERA_ESCRITURA, VIGILAR_IMAGENES, USAR_INDICE
+)
+from src.utils import logger, crear_carpetas_necesarias, EXTENSIONES_PERMITIDAS
 
 # Definición de las rutas principales del sistema
 CARPETA_ENTRADA = "entrada"          # Carpeta donde se colocan los archivos a procesar
@@ -25,15 +31,102 @@ CARPETAS_REQUERIDAS = [
 
 crear_carpetas_necesarias(CARPETAS_REQUERIDAS)
 
+class EsperaEscritura:
+    """
+    Entrega un archivo cuando su tamaño y fecha de modificación dejan de
+    cambiar durante `espera` segundos.
+
+    Es el respaldo para copias (rsync, scp) en sistemas sin eventos de cierre:
+    el archivo solo se lee cuando la escritura terminó.
+
+    Args:
+        entregar (Callable): Recibe (ruta, firma) del archivo completo, p. ej.
+            ProcesadorArchivos.encolar
+        espera (float): Segundos sin cambios para considerar completo un archivo
+    """
+    def __init__(self, entregar, espera):
+        self.entregar = entregar
+        self.espera = espera
+        self._candidatos = {}  # ruta -> (firma, instante del último cambio)
+        self._bloqueo = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._revisar, name="espera_escritura", daemon=True)
+        self._hilo.start()
+
+    def vigilar(self, ruta):
+        """Registra (o reinicia la espera de) un archivo que se está escribiendo"""
+        with self._bloqueo:
+            self._candidatos[ruta] = (firma_archivo(ruta), time.monotonic())
+
+    def descartar(self, ruta):
+        """Deja de vigilar un archivo (ya completo, movido o eliminado)"""
+        with self._bloqueo:
+            self._candidatos.pop(ruta, None)
+
+    def _revisar(self):
+        """Hilo que entrega los archivos cuya firma se mantuvo estable"""
+        while not self._detener.wait(self.espera / 4):
+            with self._bloqueo:
+                candidatos = list(self._candidatos.items())
+            ahora = time.monotonic()
+            for ruta, (firma_anterior, instante) in candidatos:
+                firma = firma_archivo(ruta)
+                with self._bloqueo:
+                    if self._candidatos.get(ruta) != (firma_anterior, instante):
+                        continue  # Llegó un evento nuevo mientras se revisaba
+                    if firma is None:
+                        del self._candidatos[ruta]  # Se movió o eliminó
+                        continue
+                    if firma != firma_anterior:
+                        self._candidatos[ruta] = (firma, ahora)  # Sigue creciendo
+                        continue
+                    if ahora - instante < self.espera:
+                        continue
+                    del self._candidatos[ruta]
+                self.entregar(ruta, firma)
+
+    def detener(self):
+        """Detiene el hilo de revisión; los archivos aún inestables quedan en la carpeta"""
+        self._detener.set()
+        self._hilo.join()
+
 class ManejadorEventos(FileSystemEventHandler):
     """
     Clase que maneja los eventos del sistema de archivos.
     Hereda de FileSystemEventHandler de watchdog.
+
+    Un JSON se entrega al pool solo cuando su escritura terminó:
+    - al renombrarse dentro de la carpeta (protocolo "temporal y luego renombrar")
+    - al cerrarse tras escribirlo (si el sistema emite eventos de cierre)
+    - o cuando su tamaño y fecha dejan de cambiar (EsperaEscritura)
+
+    Args:
+        procesador (ProcesadorArchivos): Pool al que se entregan los archivos
+        espera (EsperaEscritura): Vigilancia de archivos que aún se escriben
     """
+    def __init__(self, procesador, espera):
+        super().__init__()
+        self.procesador = procesador
+        self.espera = espera
+        self._carpeta = os.path.abspath(CARPETA_ENTRADA)
+
+    def _es_json_de_entrada(self, ruta):
+        """Indica si la ruta es un JSON o JSON Lines directamente dentro de la carpeta de entrada"""
+        return ((ruta.endswith('.json') or es_jsonl(ruta))
+                and os.path.dirname(os.path.abspath(ruta)) == self._carpeta)
+
+    def _entregar(self, ruta):
+        """Entrega un archivo completo al pool (si la cola está llena se espera un lugar)"""
+        self.espera.descartar(ruta)
+        firma = firma_archivo(ruta)
+        if firma is not None:
+            self.procesador.encolar(ruta, firma)
+
     def on_created(self, event):
         """
-        Se ejecuta cuando se detecta la creación de un nuevo archivo
-        
+        Se ejecuta cuando se detecta la creación de un nuevo archivo.
+        El archivo puede estar a medio copiar, así que solo se empieza a vigilar.
+
         Args:
             event: Evento que contiene información sobre el archivo creado
         """
@@ -41,59 +134,205 @@ class ManejadorEventos(FileSystemEventHandler):
         if event.is_directory:
             return
 
-        # Solo procesa archivos JSON
-        if event.src_path.endswith('.json'):
-            try:
-                logger.info(f"📥 Archivo detectado: {event.src_path}")
-                
-                # Lee y carga el contenido del archivo JSON
-                with open(event.src_path, 'r', encoding='utf-8') as f:
-                    datos = json.load(f)
-
-                # Validar JSON
-                es_valido, mensaje = validar_json(datos)
-                if not es_valido:
-                    logger.error(f"JSON inválido: {mensaje}")
-                    return
-
-                # Genera el documento con los datos del JSON
-                generar_documento(datos, CARPETA_IMAGENES, CARPETA_SALIDA)
-
-                # Mueve el archivo JSON a la carpeta de procesados
-                nombre_archivo = os.path.basename(event.src_path)
-                destino = os.path.join(CARPETA_PROCESADOS, nombre_archivo)
-                shutil.move(event.src_path, destino)
-                logger.info(f"✅ Archivo procesado y movido a: {destino}")
-
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Error de formato JSON en {event.src_path}: {e}")
-            except Exception as e:
-                logger.error(f"❌ Error al procesar {event.src_path}: {e}")
-
-def iniciar_observador():
+        # Solo procesa archivos JSON y JSON Lines
+        if self._es_json_de_entrada(event.src_path):
+            self.espera.vigilar(event.src_path)
+
+    def on_modified(self, event):
+        """Cada escritura reinicia la espera del archivo"""
+        if not event.is_directory and self._es_json_de_entrada(event.src_path):
+            self.espera.vigilar(event.src_path)
+
+    def on_closed(self, event):
+        """El archivo se cerró después de escribirlo: está completo"""
+        if not event.is_directory and self._es_json_de_entrada(event.src_path):
+            self._entregar(event.src_path)
+
+    def on_moved(self, event):
+        """
+        Un archivo renombrado dentro de la carpeta de entrada ya está completo.
+        Los movimientos hacia procesados/ (hechos por el propio pool) se ignoran.
+        """
+        if event.is_directory:
+            return
+        self.espera.descartar(event.src_path)
+        if self._es_json_de_entrada(event.dest_path):
+            self._entregar(event.dest_path)
+
+class ManejadorImagenes(FileSystemEventHandler):
+    """
+    Regenera los documentos que usan una imagen cuando esta cambia.
+
+    Igual que con los JSON, una imagen se considera modificada cuando su
+    escritura terminó (cierre, renombrado o firma estable); una imagen
+    eliminada regenera sus documentos sin ella. La búsqueda de esos documentos
+    y su envío al pool ocurren en el hilo de regeneración del procesador, no
+    en el hilo de eventos de watchdog.
+
+    Args:
+        procesador (ProcesadorArchivos): Pool donde se regeneran los documentos
+        espera (EsperaEscritura): Vigilancia de imágenes que aún se escriben
+    """
+    def __init__(self, procesador, espera):
+        super().__init__()
+        self.procesador = procesador
+        self.espera = espera
+
+    @staticmethod
+    def _es_imagen(ruta):
+        """Indica si la ruta tiene una extensión de imagen permitida"""
+        return os.path.splitext(ruta)[1].lower() in EXTENSIONES_PERMITIDAS
+
+    def on_created(self, event):
+        """Una imagen nueva puede estar a medio copiar: se empieza a vigilar"""
+        if not event.is_directory and self._es_imagen(event.src_path):
+            self.espera.vigilar(event.src_path)
+
+    def on_modified(self, event):
+        """Cada escritura reinicia la espera de la imagen"""
+        if not event.is_directory and self._es_imagen(event.src_path):
+            self.espera.vigilar(event.src_path)
+
+    def on_closed(self, event):
+        """La imagen se cerró después de escribirla: se regeneran sus documentos"""
+        if not event.is_directory and self._es_imagen(event.src_path):
+            self.espera.descartar(event.src_path)
+            self.procesador.solicitar_regeneracion([event.src_path])
+
+    def on_moved(self, event):
+        """Renombrar cambia tanto la imagen de origen (ya no existe) como la de destino"""
+        if event.is_directory:
+            return
+        self.espera.descartar(event.src_path)
+        rutas = [ruta for ruta in (event.src_path, event.dest_path) if self._es_imagen(ruta)]
+        if rutas:
+            self.procesador.solicitar_regeneracion(rutas)
+
+    def on_deleted(self, event):
+        """Los documentos de una imagen eliminada se regeneran sin ella"""
+        if not event.is_directory and self._es_imagen(event.src_path):
+            self.espera.descartar(event.src_path)
+            self.procesador.solicitar_regeneracion([event.src_path])
+
+def _reportar_estado(procesador):
+    """Registra cuántos archivos hay en proceso, en cola, completados y fallidos"""
+    estado = procesador.estado()
+    logger.info(
+        f"📊 En proceso: {estado['en_proceso']} | En cola: {estado['en_cola']} | "
+        f"Completados: {estado['completados']} | Fallidos: {estado['fallidos']}"
+    )
+
+def _reconciliar(procesador, detener, intervalo):
+    """
+    Encola el backlog de la carpeta de entrada al iniciar y vuelve a revisarla
+    cada cierto intervalo, por si se perdieron eventos (p. ej. por desbordamiento
+    de inotify). Los archivos ya pendientes no se encolan dos veces. Al iniciar
+    también se regeneran los documentos cuyas imágenes o plantilla cambiaron
+    mientras el observador estaba detenido.
+
+    Args:
+        procesador (ProcesadorArchivos): Pool al que se entregan los archivos
+        detener (threading.Event): Evento que indica que el observador se detiene
+        intervalo (float): Segundos entre reconciliaciones
+    """
+    primera = True
+    while not detener.is_set():
+        try:
+            # Los archivos modificados hace poco pueden estar copiándose todavía
+            with etapa('reconciliar'):
+                encolados = escanear_carpeta(CARPETA_ENTRADA, procesador, ESPERA_ESCRITURA)
+            if primera:
+                logger.info(f"🔎 Backlog inicial: {encolados} archivos encolados")
+                if VIGILAR_IMAGENES:
+                    procesador.regenerar()
+            elif encolados:
+                logger.info(f"🔁 Reconciliación: {encolados} archivos sin evento encolados")
+        except Exception as e:
+            logger.error(f"❌ Error al escanear {CARPETA_ENTRADA}: {e}")
+        primera = False
+        detener.wait(intervalo)
+
+def iniciar_observador(trabajadores=None, tamano_cola=None, perfilado=None):
     """
     Función principal que inicia el sistema de observación.
     Configura y mantiene ejecutando el observador hasta que se detenga manualmente.
+    Al presionar Ctrl+C se dejan de aceptar archivos y se terminan los pendientes;
+    un segundo Ctrl+C cancela los que aún no empezaron.
+
+    Args:
+        trabajadores (int, opcional): Procesos del pool (None usa TRABAJADORES)
+        tamano_cola (int, opcional): Archivos en espera (None usa TAMANO_COLA)
+        perfilado (Perfilado, opcional): Documentos a perfilar con cProfile (--profile)
     """
+    observador = None
+    procesador = None
+    espera = None
+    espera_imagenes = None
+    detener = threading.Event()
     try:
-        # Crea instancias del observador y manejador
+        # Crea el pool de procesos, el observador y el manejador
+        procesador = ProcesadorArchivos(CARPETA_IMAGENES, CARPETA_SALIDA, CARPETA_PROCESADOS,
+                                        trabajadores, tamano_cola, perfilado)
+        espera = EsperaEscritura(procesador.encolar, ESPERA_ESCRITURA)
         observador = Observer()
-        manejador = ManejadorEventos()
+        manejador = ManejadorEventos(procesador, espera)
         
         # Configura el observador para monitorear la carpeta de entrada
         observador.schedule(manejador, path=CARPETA_ENTRADA, recursive=False)
+        if VIGILAR_IMAGENES and USAR_INDICE:
+            # Una imagen modificada regenera solo los documentos que la usan
+            espera_imagenes = EsperaEscritura(
+                lambda ruta, firma: procesador.solicitar_regeneracion([ruta]), ESPERA_ESCRITURA
+            )
+            observador.schedule(ManejadorImagenes(procesador, espera_imagenes),
+                                path=CARPETA_IMAGENES, recursive=True)
         observador.start()
-        logger.info("👀 Observando la carpeta de entrada. Presiona Ctrl+C para detener...")
+        logger.info(f"👀 Observando la carpeta de entrada con {procesador.trabajadores} "
+                    f"procesos. Presiona Ctrl+C para detener...")
 
-        # Mantiene el programa ejecutándose
+        # El backlog se escanea después de arrancar el observador para no perder
+        # archivos creados entre ambos pasos (los duplicados se descartan)
+        threading.Thread(
+            target=_reconciliar, args=(procesador, detener, INTERVALO_RECONCILIACION),
+            name="reconciliacion", daemon=True
+        ).start()
+
+        # Mantiene el programa ejecutándose y reporta el estado mientras hay trabajo
+        ultimo_reporte = time.monotonic()
         while True:
             time.sleep(1)
+            if procesador.ocupado() and time.monotonic() - ultimo_reporte >= INTERVALO_ESTADO:
+                _reportar_estado(procesador)
+                ultimo_reporte = time.monotonic()
     except KeyboardInterrupt:
         # Maneja la interrupción del usuario (Ctrl+C)
         logger.info("🛑 Deteniendo el observador...")
-        observador.stop()
-        observador.join()
+        detener.set()
+        if observador is not None:
+            observador.stop()
+            observador.join()
+        for vigilancia in (espera, espera_imagenes):
+            if vigilancia is not None:
+                vigilancia.detener()
+        if procesador is None:
+            return
+        _reportar_estado(procesador)
+        logger.info("⏳ Terminando los archivos pendientes (Ctrl+C otra vez para cancelar)...")
+        try:
+            procesador.detener(esperar=True)
+        except KeyboardInterrupt:
+            procesador.detener(esperar=False)
+            logger.info("⚠️ Archivos en cola cancelados")
+        _reportar_estado(procesador)
+        reportar_metricas()
         logger.info("✅ Observador detenido correctamente")
     except Exception as e:
         logger.error(f"❌ Error en el observador: {e}")
-    
\ No newline at end of file
+        detener.set()
+        if observador is not None:
+            observador.stop()
+        for vigilancia in (espera, espera_imagenes):
+            if vigilancia is not None:
+                vigilancia.detener()
+        if procesador is not None:
+            procesador.detener(esperar=False)
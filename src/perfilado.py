@@ -0,0 +1,244 @@
+"""
+Módulo de Perfilado para el Generador de Documentos de Árboles
+Este módulo captura perfiles de cProfile de documentos concretos, para
+reproducir y corregir los registros lentos (una tabla extendida enorme, una
+imagen gigante) en lugar de verlos solo en los promedios.
+
+Características principales:
+- Perfil de 1 de cada N documentos o de los que superan un umbral de latencia
+- Se perfila el renderizado en memoria, dentro de cada trabajador del pool
+- Los documentos rápidos no pagan el costo del perfilador: solo el que supera
+  el umbral se vuelve a renderizar bajo cProfile
+- Por cada documento capturado: .pstats, pilas colapsadas (.folded, listas
+  para flamegraph.pl o speedscope) y el registro en .json para reproducirlo
+- Archivos nombrados con el id del registro y la duración medida
+- Opciones de línea de comandos compartidas por main.py y watch.py
+"""
+
+import argparse
+import cProfile
+import itertools
+import json
+import marshal
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.config import PERFIL_CARPETA, PERFIL_CADA, PERFIL_UMBRAL_MS
+from src.metricas import incrementar, sin_registro
+from src.publicacion import publicar
+from src.utils import logger
+
+# Función en pstats: (archivo, línea, nombre)
+Funcion = Tuple[str, int, str]
+
+# Las ramas de la pila que suman menos que esto (segundos) no se recorren
+_TIEMPO_MINIMO = 1e-6
+
+# Límites del recorrido del grafo de llamadas: en grafos con muchos caminos
+# (varias funciones que llaman a las mismas) su número crece exponencialmente
+_MAX_NODOS = 100_000
+_MAX_PROFUNDIDAD = 200
+
+
+class Perfilado(NamedTuple):
+    """
+    Qué documentos se perfilan y dónde se guardan sus perfiles.
+
+    Args:
+        carpeta (str): Carpeta de los perfiles
+        cada (int, opcional): Perfilar 1 de cada N documentos de cada trabajador
+        umbral_ms (float, opcional): Los documentos que tarden al menos esto (sin
+            perfilador) se vuelven a renderizar bajo cProfile y se guarda su perfil
+    """
+    carpeta: str = PERFIL_CARPETA
+    cada: Optional[int] = PERFIL_CADA
+    umbral_ms: Optional[float] = PERFIL_UMBRAL_MS
+
+
+# Perfilado de este proceso (None: desactivado) y documentos vistos
+_perfilado: Optional[Perfilado] = None
+_documentos = itertools.count(1)
+_capturas = itertools.count(1)
+
+
+def configurar(perfilado: Optional[Perfilado]) -> None:
+    """Activa (o desactiva con None) el perfilado en este proceso"""
+    global _perfilado
+    _perfilado = perfilado
+    if perfilado is not None:
+        os.makedirs(perfilado.carpeta, exist_ok=True)
+
+
+def _nombre_funcion(funcion: Funcion) -> str:
+    """Nombre legible de una función de pstats, sin ';' (separador de las pilas)"""
+    archivo, linea, nombre = funcion
+    if archivo == '~':
+        texto = nombre  # Función incorporada, p. ej. <built-in method zlib.compress>
+    else:
+        texto = f"{nombre} ({os.path.basename(archivo)}:{linea})"
+    return texto.replace(';', ',')
+
+
+def pilas_colapsadas(estadisticas: Dict) -> List[str]:
+    """
+    Convierte las estadísticas de cProfile en pilas colapsadas para flamegraph.
+
+    cProfile guarda quién llama a quién, no pilas completas: el tiempo de cada
+    función se reparte entre sus llamadores según el tiempo acumulado de cada
+    llamada, recorriendo el grafo desde las funciones raíz. El recorrido visita
+    como mucho _MAX_NODOS marcos y _MAX_PROFUNDIDAD niveles; la rama que ya no
+    se expande (o que suma menos de _TIEMPO_MINIMO) queda como tiempo propio de
+    la función que la llama, así que el total no cambia.
+
+    Args:
+        estadisticas (Dict): Atributo stats de cProfile.Profile (o pstats.Stats)
+
+    Returns:
+        List[str]: Líneas "raíz;...;función microsegundos" con el tiempo propio
+    """
+    llamados: Dict[Funcion, Dict[Funcion, tuple]] = defaultdict(dict)
+    for funcion, (_, _, _, _, llamadores) in estadisticas.items():
+        for llamador, arista in llamadores.items():
+            llamados[llamador][funcion] = arista
+    tiempos: Dict[Tuple[Funcion, ...], float] = defaultdict(float)
+    restantes = _MAX_NODOS
+
+    def recorrer(pila: Tuple[Funcion, ...], escala: float) -> None:
+        nonlocal restantes
+        restantes -= 1
+        funcion = pila[-1]
+        if restantes <= 0 or len(pila) >= _MAX_PROFUNDIDAD:
+            tiempos[pila] += estadisticas[funcion][3] * escala  # Toda la rama, sin expandir
+            return
+        tiempos[pila] += estadisticas[funcion][2] * escala
+        for hijo, (_, _, _, acumulado_arista) in llamados[funcion].items():
+            if hijo in pila:
+                continue  # Recursión: su tiempo ya está en la llamada exterior
+            acumulado_hijo = estadisticas[hijo][3]
+            if acumulado_hijo <= 0 or acumulado_arista * escala < _TIEMPO_MINIMO:
+                tiempos[pila] += acumulado_arista * escala  # Rama despreciable
+                continue
+            recorrer(pila + (hijo,), escala * acumulado_arista / acumulado_hijo)
+
+    for funcion, datos in estadisticas.items():
+        if not datos[4]:
+            recorrer((funcion,), 1.0)
+
+    # El redondeo a microsegundos arrastra el resto de una línea a la siguiente,
+    # para que la suma de las líneas sea el tiempo total del perfil
+    lineas = []
+    acumulado = 0.0
+    emitidos = 0
+    for pila, segundos in tiempos.items():
+        acumulado += segundos * 1e6
+        microsegundos = round(acumulado) - emitidos
+        if microsegundos > 0:
+            emitidos += microsegundos
+            lineas.append(f"{';'.join(_nombre_funcion(f) for f in pila)} {microsegundos}")
+    return lineas
+
+
+def guardar_perfil(perfil: cProfile.Profile, data: dict, segundos: float,
+                   carpeta: str) -> str:
+    """
+    Guarda el perfil de un documento: .pstats, .folded y el registro en .json.
+
+    Args:
+        perfil (cProfile.Profile): Perfil ya detenido
+        data (dict): Registro perfilado
+        segundos (float): Duración medida del documento
+        carpeta (str): Carpeta de los perfiles
+
+    Returns:
+        str: Ruta base de los archivos (sin extensión)
+    """
+    identificador = ''.join(c for c in str(data.get('id', '')) if c.isalnum() or c in '-_')
+    base = os.path.join(carpeta, f"{identificador or 'sin_id'}_{segundos * 1000:.0f}ms_"
+                                 f"{os.getpid()}_{next(_capturas)}")
+    perfil.create_stats()
+    # Mismo contenido que Profile.dump_stats(): se abre con pstats.Stats(ruta)
+    publicar(f"{base}.pstats", marshal.dumps(perfil.stats))
+    publicar(f"{base}.folded", '\n'.join(pilas_colapsadas(perfil.stats)).encode('utf-8') + b'\n')
+    publicar(f"{base}.json", json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+    incrementar('perfiles_guardados')
+    return base
+
+
+def perfilar(data: dict, funcion: Callable, *argumentos, **opciones):
+    """
+    Ejecuta funcion(*argumentos, **opciones) para el registro `data`, guardando
+    su perfil si corresponde según el perfilado configurado en este proceso.
+
+    1 de cada `cada` documentos se ejecuta directamente bajo cProfile. Los demás
+    se ejecutan sin perfilador; si uno tarda al menos `umbral_ms`, se vuelve a
+    ejecutar bajo cProfile (sin registrar de nuevo sus métricas) para guardar
+    el perfil. Solo los documentos lentos pagan el costo: se renderizan dos
+    veces, y la segunda con las cachés ya cargadas por la primera.
+
+    Args:
+        data (dict): Registro cuyo documento se genera (para nombrar el perfil)
+        funcion (Callable): Renderizado del documento, sin efectos secundarios
+
+    Returns:
+        El resultado de funcion
+    """
+    perfilado = _perfilado
+    if perfilado is None:
+        return funcion(*argumentos, **opciones)
+
+    numero = next(_documentos)
+    if perfilado.cada and numero % perfilado.cada == 0:
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        resultado = perfil.runcall(funcion, *argumentos, **opciones)
+        _guardar(perfil, data, time.perf_counter() - inicio, perfilado, lento=False)
+        return resultado
+
+    inicio = time.perf_counter()
+    resultado = funcion(*argumentos, **opciones)
+    segundos = time.perf_counter() - inicio
+    if perfilado.umbral_ms is not None and segundos * 1000 >= perfilado.umbral_ms:
+        perfil = cProfile.Profile()
+        with sin_registro():
+            perfil.runcall(funcion, *argumentos, **opciones)
+        _guardar(perfil, data, segundos, perfilado, lento=True)
+    return resultado
+
+
+def _guardar(perfil: cProfile.Profile, data: dict, segundos: float, perfilado: Perfilado,
+             lento: bool) -> None:
+    """Guarda el perfil sin interrumpir la generación si falla la escritura"""
+    try:
+        base = guardar_perfil(perfil, data, segundos, perfilado.carpeta)
+    except OSError as e:
+        logger.error(f"❌ No se pudo guardar el perfil de {data.get('id')}: {e}")
+        return
+    if lento:
+        logger.warning(f"🐢 Documento lento {data.get('id')}: {segundos * 1000:.0f} ms, "
+                       f"perfil en {base}.pstats")
+
+
+def agregar_argumentos(parser: argparse.ArgumentParser) -> None:
+    """Agrega --profile y sus opciones a la línea de comandos de main.py o watch.py"""
+    grupo = parser.add_argument_group("perfilado")
+    grupo.add_argument("--profile", action="store_true",
+                       help="Perfilar documentos con cProfile (ver --profile-cada y "
+                            "--profile-umbral); los documentos lentos se renderizan dos veces")
+    grupo.add_argument("--profile-cada", type=int, default=PERFIL_CADA, metavar="N",
+                       help="Perfilar 1 de cada N documentos de cada proceso")
+    grupo.add_argument("--profile-umbral", type=float, default=PERFIL_UMBRAL_MS, metavar="MS",
+                       help="Volver a renderizar bajo cProfile y guardar el perfil de los "
+                            "documentos que tarden al menos MS milisegundos "
+                            f"(por defecto {PERFIL_UMBRAL_MS}; 0 desactiva)")
+    grupo.add_argument("--profile-carpeta", default=PERFIL_CARPETA, metavar="CARPETA",
+                       help=f"Carpeta de los perfiles (por defecto {PERFIL_CARPETA}/)")
+
+
+def desde_argumentos(args: argparse.Namespace) -> Optional[Perfilado]:
+    """Perfilado indicado en la línea de comandos, o None si no se pidió --profile"""
+    if not args.profile:
+        return None
+    return Perfilado(args.profile_carpeta, args.profile_cada or None,
+                     args.profile_umbral or None)
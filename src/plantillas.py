@@ -0,0 +1,279 @@
+"""
+Módulo de Plantillas para el Generador de Documentos de Árboles
+Este módulo mantiene un pool de plantillas .docx ya analizadas en memoria.
+
+Características principales:
+- Cada plantilla se abre y analiza una sola vez por proceso
+- Cada documento nuevo es una copia independiente del grafo de partes
+- La parte de estilos se comparte entre copias hasta que un documento la usa
+- Fragmentos XML fijos (p. ej. tablas) construidos una vez por plantilla
+- Caché nombre -> styleId construida al cargar cada plantilla
+- Recarga automática cuando el archivo de la plantilla cambia en disco
+- Copia propia de la plantilla con los estilos de carácter del formato
+  compacto: los documentos normales nunca los llevan
+"""
+
+import copy
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from docx import Document
+from docx.document import Document as DocumentoDocx
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.part import XmlPart
+from docx.package import Package
+from docx.parts.styles import StylesPart
+from docx.shared import Pt, RGBColor
+
+from src.metricas import incrementar
+
+
+# Estilos de carácter del formato compacto: cada run referencia el estilo por
+# su id en lugar de repetir negrita, tamaño y color en su propio w:rPr
+ESTILOS_CARACTER = {
+    'DescripcionArbol': {'negrita': True, 'tamano': Pt(12), 'color': RGBColor(0, 102, 204)},
+    'PieTabla': {'cursiva': True, 'tamano': Pt(9), 'color': RGBColor(100, 100, 100)},
+    'PieFoto': {'cursiva': True, 'tamano': Pt(9), 'color': RGBColor(100, 100, 100)},
+}
+
+
+class _ParteEstilosCompartida(StylesPart):
+    """
+    Parte de estilos que comparte el elemento XML de la plantilla hasta que se usa.
+
+    La generación resuelve los estilos con la caché de la plantilla y no toca
+    styles.xml, así que no es necesario copiar (ni volver a serializar) sus
+    miles de elementos en cada documento: al guardar se usa la serialización
+    de la plantilla. El primer acceso al elemento (doc.styles, un estilo por
+    nombre) lo copia, y desde entonces el documento guarda su propia copia.
+    """
+    def __init__(self, partname, content_type, element, package, plantilla):
+        super().__init__(partname, content_type, element, package)
+        self._plantilla = plantilla
+        self._propia = False
+
+    @property
+    def element(self):
+        if not self._propia:
+            self._element = copy.deepcopy(self._element)
+            self._propia = True
+        return self._element
+
+    @property
+    def blob(self):
+        if self._propia:
+            return super().blob
+        return self._plantilla.blob_estilos(self)
+
+
+class PlantillaDocumento:
+    """
+    Plantilla .docx analizada una sola vez que entrega copias independientes.
+
+    Args:
+        ruta (str, opcional): Ruta a la plantilla .docx. Si es None se usa la
+            plantilla por defecto de python-docx.
+        compacta (bool): Agregar a esta copia de la plantilla los estilos de
+            ESTILOS_CARACTER que le falten (formato compacto)
+    """
+    def __init__(self, ruta: Optional[str] = None, compacta: bool = False):
+        self.ruta = ruta
+        self.compacta = compacta
+        self._documento = Document(ruta)
+        self._paquete = self._documento.part.package
+        if compacta:
+            self._agregar_estilos_compactos()
+        self._blob_estilos = None
+        self._fragmentos = {}
+        self._ids_estilo = self._indexar_estilos()
+        # Aumenta cada vez que cambia la plantilla base (p. ej. al inyectar estilos)
+        self.version = 0
+
+    def _indexar_estilos(self) -> Dict[Tuple[str, int], Optional[str]]:
+        """
+        Recorre styles.xml una sola vez y asocia (nombre, tipo) con su styleId.
+
+        Igual que python-docx, el estilo por defecto de cada tipo se resuelve a
+        None para no escribir una referencia redundante.
+        """
+        estilos = self._documento.styles
+        defectos = {}
+        indice = {}
+        for estilo in estilos:
+            tipo = estilo.type
+            if tipo not in defectos:
+                defectos[tipo] = estilos.default(tipo)
+            # Con nombres repetidos python-docx usa el primero del documento
+            indice.setdefault(
+                (estilo.name, tipo), None if estilo == defectos[tipo] else estilo.style_id
+            )
+        return indice
+
+    def id_estilo(self, nombre: str, tipo: int) -> Optional[str]:
+        """
+        Devuelve el styleId de un estilo por su nombre visible.
+
+        Args:
+            nombre (str): Nombre del estilo (p. ej. 'Intense Quote')
+            tipo (WD_STYLE_TYPE): Tipo de estilo (párrafo, carácter, tabla)
+
+        Returns:
+            str: styleId, o None si el estilo es el predeterminado de su tipo
+        """
+        clave = (nombre, tipo)
+        if clave in self._ids_estilo:
+            incrementar('estilos_cache_aciertos')
+            return self._ids_estilo[clave]
+        # Resolución lenta (lanza KeyError/ValueError igual que python-docx)
+        incrementar('estilos_cache_fallos')
+        id_estilo = self._documento.part.get_style_id(nombre, tipo)
+        self._ids_estilo[clave] = id_estilo
+        return id_estilo
+
+    def _agregar_estilos_compactos(self) -> None:
+        """Agrega a styles.xml de esta copia los estilos de ESTILOS_CARACTER que falten"""
+        estilos = self._documento.styles
+        presentes = {(estilo.name, estilo.type) for estilo in estilos}
+        for nombre, formato in ESTILOS_CARACTER.items():
+            if (nombre, WD_STYLE_TYPE.CHARACTER) in presentes:
+                continue
+            estilo = estilos.add_style(nombre, WD_STYLE_TYPE.CHARACTER)
+            estilo.font.bold = formato.get('negrita')
+            estilo.font.italic = formato.get('cursiva')
+            estilo.font.size = formato.get('tamano')
+            estilo.font.color.rgb = formato.get('color')
+
+    def estilos_compactos(self) -> Dict[str, str]:
+        """
+        Devuelve el styleId de cada estilo de ESTILOS_CARACTER presente en la plantilla.
+
+        Returns:
+            Dict[str, str]: Nombre del estilo -> styleId (todos si la plantilla es compacta)
+        """
+        tipo = WD_STYLE_TYPE.CHARACTER
+        return {
+            nombre: self._ids_estilo[(nombre, tipo)]
+            for nombre in ESTILOS_CARACTER if (nombre, tipo) in self._ids_estilo
+        }
+
+    def _clonar_parte(self, parte, paquete):
+        """Crea la copia de una parte para el paquete indicado"""
+        if parte.content_type == CT.WML_STYLES:
+            return _ParteEstilosCompartida(
+                parte.partname, parte.content_type, parte.element, paquete, self
+            )
+        if isinstance(parte, XmlPart):
+            return type(parte)(
+                parte.partname, parte.content_type,
+                copy.deepcopy(parte.element), paquete
+            )
+        # Las partes binarias (imágenes, temas, miniaturas) son inmutables
+        return type(parte).load(parte.partname, parte.content_type, parte.blob, paquete)
+
+    def blob_estilos(self, parte) -> bytes:
+        """Serialización de styles.xml, calculada una vez por versión de la plantilla"""
+        blob = self._blob_estilos
+        if blob is None:
+            blob = self._blob_estilos = XmlPart.blob.fget(parte)
+        return blob
+
+    def nuevo_documento(self) -> DocumentoDocx:
+        """
+        Devuelve un documento nuevo equivalente a abrir la plantilla desde disco.
+
+        Returns:
+            Document: Documento de python-docx independiente de la plantilla
+        """
+        paquete = Package()
+        copias = {}
+        for parte in self._paquete.iter_parts():
+            copias[parte] = self._clonar_parte(parte, paquete)
+
+        # Reconstruir las relaciones del paquete y de cada parte
+        for origen, destino in [(self._paquete, paquete)] + list(copias.items()):
+            for rel in origen.rels.values():
+                objetivo = rel.target_ref if rel.is_external else copias[rel.target_part]
+                destino.load_rel(rel.reltype, objetivo, rel.rId, rel.is_external)
+
+        paquete.after_unmarshal()
+        return paquete.main_document_part.document
+
+    def fragmento(self, clave: str, constructor: Callable):
+        """
+        Devuelve una copia de un fragmento XML construido una sola vez por plantilla.
+
+        Args:
+            clave (str): Identificador del fragmento dentro de la plantilla
+            constructor (Callable): Función que recibe un documento nuevo de la
+                plantilla y devuelve el elemento XML del fragmento
+
+        Returns:
+            Elemento lxml independiente, listo para insertarse en un documento
+        """
+        elemento = self._fragmentos.get(clave)
+        if elemento is None:
+            elemento = constructor(self.nuevo_documento())
+            if elemento.getparent() is not None:
+                elemento.getparent().remove(elemento)
+            self._fragmentos[clave] = elemento
+        return copy.deepcopy(elemento)
+
+    def invalidar(self) -> None:
+        """Descarta las cachés de la plantilla tras modificar su documento base"""
+        self._blob_estilos = None
+        self._fragmentos.clear()
+        self._ids_estilo = self._indexar_estilos()
+        self.version += 1
+
+    @property
+    def documento_base(self) -> DocumentoDocx:
+        """Documento original de la plantilla (no debe usarse para generar)"""
+        return self._documento
+
+
+# Pool de plantillas por (ruta, compacta), compartido por todo el proceso.
+# Cada entrada guarda la firma (mtime, tamaño) del archivo con que se cargó.
+_PLANTILLAS: Dict[Tuple[Optional[str], bool],
+                  Tuple[Optional[Tuple[int, int]], PlantillaDocumento]] = {}
+_BLOQUEO = threading.Lock()
+
+
+def _firma_archivo(ruta: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Devuelve (mtime, tamaño) de la plantilla, o None para la de defecto"""
+    if ruta is None:
+        return None
+    estado = os.stat(ruta)
+    return estado.st_mtime_ns, estado.st_size
+
+
+def obtener_plantilla(ruta: Optional[str] = None, compacta: bool = False) -> PlantillaDocumento:
+    """
+    Devuelve la plantilla de la ruta indicada, cargándola la primera vez.
+
+    Args:
+        ruta (str, opcional): Ruta a la plantilla .docx (None para la de defecto)
+        compacta (bool): Devolver la copia de la plantilla con los estilos del
+            formato compacto (se carga aparte y no altera la normal)
+
+    Returns:
+        PlantillaDocumento: Plantilla lista para generar documentos
+    """
+    clave = (ruta, compacta)
+    firma = _firma_archivo(ruta)
+    entrada = _PLANTILLAS.get(clave)
+    if entrada is None or entrada[0] != firma:
+        with _BLOQUEO:
+            entrada = _PLANTILLAS.get(clave)
+            if entrada is None or entrada[0] != firma:
+                # Plantilla nueva o modificada: sus cachés se construyen desde cero
+                entrada = (firma, PlantillaDocumento(ruta, compacta))
+                _PLANTILLAS[clave] = entrada
+    return entrada[1]
+
+
+def limpiar_plantillas() -> None:
+    """Vacía el pool de plantillas (útil cuando cambia una plantilla en disco)"""
+    with _BLOQUEO:
+        _PLANTILLAS.clear()
@@ -0,0 +1,745 @@
+"""
+Módulo de Procesamiento para el Generador de Documentos de Árboles
+Este módulo reparte la generación de documentos entre varios procesos.
+
+Características principales:
+- Pool de procesos acotado con número de trabajadores configurable
+- Cola con contrapresión: quien encola espera cuando la cola está llena
+- Conteo de archivos en proceso, en cola, completados y fallidos
+- Un mismo archivo no se encola dos veces mientras está pendiente
+- Escaneo de carpetas con os.scandir para el backlog y la reconciliación
+- Los archivos que fallaron no se reintentan hasta que cambian en disco
+- Reparto a demanda de iterables de cualquier tamaño con memoria acotada
+- Inventarios JSON Lines renderizados registro a registro en paralelo,
+  con punto de control para reanudar una ejecución interrumpida
+- Registros validados contra el esquema por bloques, antes de llegar al pool
+- Registros sin cambios detectados en bloque con el índice de idempotencia
+- Regeneración en paralelo de los documentos cuya imagen o plantilla cambió,
+  en un hilo propio para no bloquear a quien la pide
+- Detención ordenada que termina los archivos ya aceptados
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.bitacora import cola_procesos, conectar_proceso
+from src.config import TRABAJADORES, TAMANO_COLA, INTERVALO_PUNTO_CONTROL, USAR_INDICE, LOTE_INDICE
+from src.esquema import validar_lote
+from src.generador import generar_documento, generar_o_reutilizar, opciones_render
+from src.indice import documentos_existentes, obtener_indice
+from src.lectores import EXTENSIONES_JSONL, MarcaConfirmada, PuntoControl, es_jsonl, leer_jsonl
+from src import metricas
+from src.metricas import etapa, incrementar
+from src import perfilado as perfiles
+from src.perfilado import Perfilado
+from src.utils import logger, validar_json
+
+
+def renderizar_registro(datos: dict, carpeta_imagenes: str,
+                        carpeta_salida: str) -> Tuple[bool, str, bool]:
+    """
+    Valida un registro ya leído y genera su documento.
+
+    Se ejecuta dentro de un proceso del pool, por lo que no lanza excepciones.
+
+    Args:
+        datos (dict): Diccionario con los datos del árbol
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+
+    Returns:
+        Tuple[bool, str, bool]: (éxito, ruta del documento o mensaje de error,
+            True si el índice encontró el documento sin cambios y no se generó)
+    """
+    try:
+        # Validar JSON
+        with etapa('validar_json'):
+            es_valido, mensaje = validar_json(datos)
+        if not es_valido:
+            logger.error(f"JSON inválido: {mensaje}")
+            return False, mensaje, False
+
+        # Genera el documento con los datos del JSON (o reutiliza el vigente)
+        return (True, *generar_o_reutilizar(datos, carpeta_imagenes, carpeta_salida))
+    except Exception as e:
+        logger.error(f"❌ Error al procesar el registro {datos.get('id')}: {e}")
+        return False, str(e), False
+
+
+def regenerar_documento(fila: Dict[str, str]) -> Tuple[bool, str]:
+    """
+    Vuelve a generar, en la misma ruta, un documento cuya imagen o plantilla cambió.
+
+    Se ejecuta dentro de un proceso del pool, por lo que no lanza excepciones.
+
+    Args:
+        fila (Dict[str, str]): Fila del índice (ver IndiceDocumentos.desactualizados)
+
+    Returns:
+        Tuple[bool, str]: (éxito, ruta del documento o mensaje de error)
+    """
+    try:
+        logger.info(f"🔄 Dependencias modificadas, se regenera: {fila['ruta_salida']}")
+        datos = json.loads(fila['registro'])
+        return True, generar_documento(datos, fila['carpeta_imagenes'], fila['carpeta_salida'],
+                                       fila['plantilla'], reutilizar=True,
+                                       ruta_destino=fila['ruta_salida'])
+    except Exception as e:
+        logger.error(f"❌ Error al regenerar {fila.get('ruta_salida')}: {e}")
+        return False, str(e)
+
+
+def documentos_desactualizados(imagenes: Optional[Iterable[str]] = None) -> List[Dict[str, str]]:
+    """
+    Documentos del índice cuya imagen o plantilla cambió, o [] si el índice
+    está desactivado (USAR_INDICE).
+
+    Args:
+        imagenes (Iterable[str], opcional): Limitar la búsqueda a estas imágenes
+    """
+    if not USAR_INDICE:
+        return []
+    return obtener_indice().desactualizados(imagenes)
+
+
+def procesar_archivo(ruta: str, carpeta_imagenes: str, carpeta_salida: str,
+                     carpeta_procesados: Optional[str] = None) -> Tuple[bool, str, bool]:
+    """
+    Lee, valida y renderiza un archivo JSON, y lo mueve a la carpeta de procesados.
+
+    Se ejecuta dentro de un proceso del pool, por lo que no lanza excepciones:
+    cualquier error se registra y se devuelve como resultado.
+
+    Args:
+        ruta (str): Ruta al archivo JSON
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+        carpeta_procesados (str, opcional): Carpeta a la que se mueve el JSON
+            procesado; si es None el archivo se deja donde está
+
+    Returns:
+        Tuple[bool, str, bool]: (éxito, ruta del documento o mensaje de error,
+            documento reutilizado) como en renderizar_registro
+    """
+    try:
+        logger.info(f"📥 Archivo detectado: {ruta}")
+
+        # Lee y carga el contenido del archivo JSON
+        try:
+            with etapa('leer_json') as medicion, open(ruta, 'rb') as f:
+                contenido = f.read()
+                medicion.leidos = len(contenido)
+                datos = json.loads(contenido)
+        except FileNotFoundError:
+            # Otro escaneo lo encontró justo antes de que se moviera a procesados
+            logger.warning(f"⚠️ El archivo ya no existe: {ruta}")
+            return False, "El archivo ya no existe", False
+
+        exito, resultado, reutilizado = renderizar_registro(datos, carpeta_imagenes, carpeta_salida)
+        if not exito or carpeta_procesados is None:
+            return exito, resultado, reutilizado
+
+        # Mueve el archivo JSON a la carpeta de procesados
+        destino = os.path.join(carpeta_procesados, os.path.basename(ruta))
+        with etapa('mover'):
+            shutil.move(ruta, destino)
+        logger.info(f"✅ Archivo procesado y movido a: {destino}")
+        return True, resultado, reutilizado
+
+    except json.JSONDecodeError as e:
+        logger.error(f"❌ Error de formato JSON en {ruta}: {e}")
+        return False, str(e), False
+    except Exception as e:
+        logger.error(f"❌ Error al procesar {ruta}: {e}")
+        return False, str(e), False
+
+
+def _validar_bloque(lote: List[Tuple[int, int, Optional[dict], str]]
+                    ) -> List[Tuple[int, int, Optional[dict], str]]:
+    """
+    Valida de una vez todas las líneas de un bloque leído con leer_jsonl.
+
+    Returns:
+        List[Tuple[int, int, dict, str]]: El mismo bloque; las líneas que no
+            cumplen el esquema quedan con registro None y todos sus errores
+    """
+    errores = iter(validar_lote(registro for _, _, registro, _ in lote if registro is not None))
+    revisado = []
+    for numero, offset_fin, registro, error in lote:
+        if registro is not None:
+            errores_registro = next(errores)
+            if errores_registro:
+                registro = None
+                error = f"Registro inválido en la línea {numero}: {'; '.join(errores_registro)}"
+        revisado.append((numero, offset_fin, registro, error))
+    return revisado
+
+
+def procesar_jsonl(ruta: str, enviar: Callable[[dict], Future], en_vuelo: int,
+                   detener: Optional[threading.Event] = None,
+                   existentes: Optional[Callable[[List[dict]], List[Optional[str]]]] = None
+                   ) -> Dict[str, int]:
+    """
+    Renderiza en paralelo los registros de un archivo JSON Lines, reanudando
+    desde su punto de control.
+
+    El archivo se lee línea por línea y nunca hay más de `en_vuelo` registros
+    enviados sin terminar, así que la memoria no depende del tamaño del
+    inventario. El punto de control avanza solo hasta la última línea cuyas
+    anteriores ya terminaron. Ante Ctrl+C (o el evento `detener`) se dejan de
+    enviar registros, se esperan los que ya empezaron y se guarda la posición.
+
+    Args:
+        ruta (str): Ruta al archivo .jsonl, .jsonl.gz o .jsonl.xz
+        enviar (Callable): Envía un registro al pool y devuelve su Future, cuyo
+            resultado empieza por el éxito, como en renderizar_registro
+        en_vuelo (int): Máximo de registros enviados sin terminar
+        detener (threading.Event, opcional): Interrumpe la lectura al activarse
+        existentes (Callable, opcional): Búsqueda en bloque de documentos ya
+            generados (ver omitir_existentes); los registros encontrados no se envían
+
+    Returns:
+        Dict[str, int]: Registros completados, fallidos (de ellos, 'invalidos'
+            los que no llegaron al pool por JSON o esquema inválido) y
+            reutilizados, última línea confirmada y si se llegó al final del archivo
+    """
+    punto = PuntoControl(ruta)
+    offset, linea = punto.cargar()
+    marca = MarcaConfirmada(offset, linea)
+    if linea:
+        logger.info(f"⏩ Reanudando {ruta} desde la línea {linea + 1}")
+
+    resumen = {'completados': 0, 'fallidos': 0, 'invalidos': 0, 'reutilizados': 0,
+               'linea': linea, 'terminado': False}
+    pendientes: Dict[Future, int] = {}
+    ultimo_guardado = time.monotonic()
+
+    def recoger(bloquear: bool) -> None:
+        nonlocal ultimo_guardado
+        hechos, _ = wait(list(pendientes), timeout=None if bloquear else 0,
+                         return_when=FIRST_COMPLETED)
+        for futuro in hechos:
+            numero = pendientes.pop(futuro)
+            if futuro.cancelled():
+                continue  # No se procesó: la marca no debe pasar de esta línea
+            try:
+                exito = futuro.result()[0]
+            except Exception as e:  # Proceso trabajador caído
+                logger.error(f"❌ Error en la línea {numero} de {ruta}: {e}")
+                exito = False
+            resumen['completados' if exito else 'fallidos'] += 1
+            marca.completar(numero)
+        if time.monotonic() - ultimo_guardado >= INTERVALO_PUNTO_CONTROL:
+            punto.guardar(marca.offset, marca.linea)
+            ultimo_guardado = time.monotonic()
+
+    def detenido() -> bool:
+        return detener is not None and detener.is_set()
+
+    try:
+        lineas = leer_jsonl(ruta, offset, linea)
+        while not detenido():
+            # Todo el bloque se valida (y se busca en el índice) antes de enviar nada al pool
+            lote = _validar_bloque(list(islice(lineas, LOTE_INDICE)))
+            if not lote:
+                resumen['terminado'] = True
+                break
+            validos = [registro for _, _, registro, _ in lote if registro is not None]
+            reutilizados = iter(existentes(validos) if existentes is not None and validos else [])
+            for numero, offset_fin, registro, error in lote:
+                if detenido():
+                    break
+                if registro is None:
+                    logger.error(f"❌ {ruta}: {error}")
+                    resumen['fallidos'] += 1
+                    resumen['invalidos'] += 1
+                    marca.avanzar(numero, offset_fin)
+                    continue
+                if next(reutilizados, None) is not None:
+                    resumen['reutilizados'] += 1
+                    marca.avanzar(numero, offset_fin)
+                    continue
+                while len(pendientes) >= en_vuelo:
+                    recoger(bloquear=True)
+                marca.iniciar(numero, offset_fin)
+                pendientes[enviar(registro)] = numero
+        while pendientes:
+            recoger(bloquear=True)
+    except KeyboardInterrupt:
+        # Se cancelan los registros que no empezaron y se esperan los demás
+        for futuro in pendientes:
+            futuro.cancel()
+        while pendientes:
+            recoger(bloquear=True)
+        raise
+    finally:
+        punto.guardar(marca.offset, marca.linea)
+        resumen['linea'] = marca.linea
+    return resumen
+
+
+def omitir_existentes(carpeta_imagenes: str,
+                      carpeta_salida: str) -> Optional[Callable[[List[dict]], List[Optional[str]]]]:
+    """
+    Devuelve la búsqueda en bloque del índice para procesar_jsonl, o None si
+    el índice está desactivado (USAR_INDICE).
+
+    Args:
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+    """
+    if not USAR_INDICE:
+        return None
+    opciones = opciones_render()
+
+    def existentes(registros: List[dict]) -> List[Optional[str]]:
+        return documentos_existentes(registros, carpeta_imagenes, carpeta_salida, None, opciones)
+    return existentes
+
+
+def mapear_acotado(pool: ProcessPoolExecutor, funcion: Callable, elementos: Iterable,
+                   en_vuelo: int, *argumentos) -> Iterator[Tuple[object, object]]:
+    """
+    Aplica funcion(elemento, *argumentos) en el pool consumiendo `elementos` a demanda.
+
+    A diferencia de pool.map(), no agota el iterable de entrada: nunca hay más
+    de `en_vuelo` elementos enviados sin terminar, así que la memoria no
+    depende de cuántos haya. Los resultados se entregan en orden de llegada.
+
+    Args:
+        pool (ProcessPoolExecutor): Pool donde se ejecuta la función
+        funcion (Callable): Función de nivel de módulo (serializable)
+        elementos (Iterable): Primer argumento de cada llamada (p. ej. un generador)
+        en_vuelo (int): Máximo de llamadas enviadas sin terminar
+        *argumentos: Argumentos adicionales, iguales para todas las llamadas
+
+    Returns:
+        Iterator[Tuple[object, object]]: (elemento, resultado); si la llamada
+            lanzó una excepción, el resultado es la excepción
+    """
+    pendientes: Dict[Future, object] = {}
+
+    def recoger(bloquear: bool) -> Iterator[Tuple[object, object]]:
+        hechos, _ = wait(list(pendientes), timeout=None if bloquear else 0,
+                         return_when=FIRST_COMPLETED)
+        for futuro in hechos:
+            elemento = pendientes.pop(futuro)
+            if not futuro.cancelled():
+                yield elemento, futuro.exception() or futuro.result()
+
+    try:
+        for elemento in elementos:
+            while len(pendientes) >= en_vuelo:
+                yield from recoger(bloquear=True)
+            pendientes[pool.submit(funcion, elemento, *argumentos)] = elemento
+        while pendientes:
+            yield from recoger(bloquear=True)
+    finally:
+        # Si se interrumpe el consumo, no se empiezan los elementos restantes
+        for futuro in pendientes:
+            futuro.cancel()
+
+
+def firma_archivo(ruta: str) -> Optional[Tuple[int, int]]:
+    """Devuelve (mtime, tamaño) del archivo, o None si ya no existe"""
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return estado.st_mtime_ns, estado.st_size
+
+
+def escanear_carpeta(carpeta: str, procesador: "ProcesadorArchivos",
+                     antiguedad_minima: float = 0.0,
+                     extensiones: Tuple[str, ...] = ('.json',) + EXTENSIONES_JSONL) -> int:
+    """
+    Encola los archivos de una carpeta que aún no se procesaron.
+
+    Usa os.scandir, que obtiene el tipo de cada entrada sin una llamada a stat
+    adicional; los archivos pendientes o fallidos sin cambios se omiten.
+
+    Args:
+        carpeta (str): Carpeta a recorrer (sin subcarpetas)
+        procesador (ProcesadorArchivos): Pool al que se entregan los archivos
+        antiguedad_minima (float): Segundos desde la última modificación para
+            considerar completo un archivo (los más recientes se omiten)
+        extensiones (Tuple[str, ...]): Extensiones de los archivos a encolar
+
+    Returns:
+        int: Número de archivos encolados
+    """
+    encolados = 0
+    limite = time.time() - antiguedad_minima
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if not entrada.name.endswith(extensiones) or not entrada.is_file():
+                continue
+            try:
+                estado = entrada.stat()
+            except FileNotFoundError:
+                continue  # Se procesó y movió mientras se recorría la carpeta
+            if estado.st_mtime > limite:
+                continue  # Posiblemente a medio copiar: lo entregará su evento o el próximo escaneo
+            if procesador.encolar(entrada.path, (estado.st_mtime_ns, estado.st_size)):
+                encolados += 1
+    return encolados
+
+
+def _iniciar_trabajador(calentar: Optional[Callable[..., None]] = None,
+                        argumentos: Tuple = (), cola_log=None, cola_metricas=None,
+                        perfilado: Optional[Perfilado] = None) -> None:
+    """
+    Los trabajadores ignoran Ctrl+C: el proceso principal decide cuándo detenerlos.
+
+    Args:
+        calentar (Callable, opcional): Precarga cachés del proceso antes del primer trabajo
+        argumentos (Tuple): Argumentos de calentar
+        cola_log (Queue, opcional): Cola de la bitácora del proceso principal
+        cola_metricas (Queue, opcional): Cola de métricas del proceso principal
+        perfilado (Perfilado, opcional): Documentos a perfilar con cProfile
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    conectar_proceso(cola_log)
+    metricas.conectar_proceso(cola_metricas)
+    perfiles.configurar(perfilado)
+    if calentar is not None:
+        calentar(*argumentos)
+
+
+def numero_trabajadores(trabajadores: Optional[int] = None) -> int:
+    """Resuelve el número de procesos: el indicado, TRABAJADORES o todos los núcleos"""
+    return trabajadores or TRABAJADORES or os.cpu_count() or 1
+
+
+def crear_pool(trabajadores: Optional[int] = None,
+               calentar: Optional[Callable[..., None]] = None,
+               argumentos: Tuple = (),
+               perfilado: Optional[Perfilado] = None) -> ProcessPoolExecutor:
+    """
+    Crea el pool de procesos usado para renderizar documentos.
+
+    Args:
+        trabajadores (int, opcional): Número de procesos; None usa TRABAJADORES
+            (o todos los núcleos)
+        calentar (Callable, opcional): Función de nivel de módulo que cada
+            trabajador ejecuta al arrancar (p. ej. cargar plantillas e imágenes)
+        argumentos (Tuple): Argumentos de calentar
+        perfilado (Perfilado, opcional): Documentos que los trabajadores perfilan
+            con cProfile (None: ninguno)
+
+    Returns:
+        ProcessPoolExecutor: Pool cuyos trabajadores ignoran Ctrl+C
+    """
+    # 'spawn' evita heredar por fork los hilos de watchdog y de logging; los
+    # trabajadores escriben su bitácora y entregan sus métricas a través del
+    # proceso principal
+    return ProcessPoolExecutor(
+        max_workers=numero_trabajadores(trabajadores),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_iniciar_trabajador,
+        initargs=(calentar, argumentos, cola_procesos(), metricas.cola_procesos(), perfilado),
+    )
+
+
+def reportar_metricas() -> None:
+    """
+    Combina las métricas de los trabajadores (con el pool ya cerrado), las
+    exporta (METRICAS_PROMETHEUS y METRICAS_JSON) y registra el tiempo por etapa.
+    """
+    if not metricas.recoger_trabajadores():
+        logger.warning("⚠️ No llegaron las métricas de todos los trabajadores")
+    try:
+        metricas.exportar_metricas()
+    except OSError as e:
+        logger.error(f"❌ No se pudieron exportar las métricas: {e}")
+    for nombre, datos in metricas.resumen_etapas().items():
+        if datos['cuenta']:
+            logger.info(f"⏱️ {nombre}: {datos['cuenta']} veces, p50 {datos['p50_ms']:.2f} ms, "
+                        f"p95 {datos['p95_ms']:.2f} ms, p99 {datos['p99_ms']:.2f} ms, "
+                        f"total {datos['total_ms'] / 1000:.2f} s")
+
+
+class ProcesadorArchivos:
+    """
+    Pool de procesos acotado que procesa archivos JSON con contrapresión.
+
+    Como mucho hay `trabajadores` archivos en proceso y `tamano_cola` esperando;
+    al superar ese límite, encolar() bloquea a quien llama (p. ej. el hilo de
+    eventos de watchdog) hasta que se libere un lugar.
+
+    Args:
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        carpeta_salida (str): Carpeta donde se guardan los documentos
+        carpeta_procesados (str): Carpeta a la que se mueven los JSON procesados
+        trabajadores (int, opcional): Número de procesos; None usa TRABAJADORES
+        tamano_cola (int, opcional): Archivos en espera; None usa TAMANO_COLA
+        perfilado (Perfilado, opcional): Documentos a perfilar con cProfile
+    """
+    def __init__(self, carpeta_imagenes: str, carpeta_salida: str, carpeta_procesados: str,
+                 trabajadores: Optional[int] = None, tamano_cola: Optional[int] = None,
+                 perfilado: Optional[Perfilado] = None):
+        self.carpeta_imagenes = carpeta_imagenes
+        self.carpeta_salida = carpeta_salida
+        self.carpeta_procesados = carpeta_procesados
+        self.trabajadores = numero_trabajadores(trabajadores)
+        self.tamano_cola = TAMANO_COLA if tamano_cola is None else tamano_cola
+
+        self._pool = crear_pool(self.trabajadores, perfilado=perfilado)
+        self._lugares = threading.BoundedSemaphore(self.trabajadores + self.tamano_cola)
+        self._bloqueo = threading.Lock()
+        self._pendientes: Set[str] = set()
+        # Firma (mtime, tamaño) de los archivos que fallaron, para no reintentarlos sin cambios
+        self._firmas_fallidas: Dict[str, Tuple[int, int]] = {}
+        self._completados = 0
+        self._fallidos = 0
+        self._detenido = False
+        # Inventarios JSON Lines en curso y registros suyos enviados al pool
+        self._hilos_jsonl: Dict[str, threading.Thread] = {}
+        self._registros_en_vuelo = 0
+        self._detener_jsonl = threading.Event()
+        # Imágenes modificadas que esperan al hilo de regeneración
+        self._imagenes_cambiadas: Set[str] = set()
+        self._aviso_regeneracion = threading.Event()
+        self._hilo_regeneracion: Optional[threading.Thread] = None
+
+    def encolar(self, ruta: str, firma: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        Agrega un archivo al pool, esperando si la cola está llena.
+
+        Args:
+            ruta (str): Ruta al archivo JSON
+            firma (Tuple[int, int], opcional): (mtime, tamaño) del archivo; si
+                coincide con la de un intento fallido, el archivo no se reintenta
+
+        Returns:
+            bool: True si se aceptó; False si ya estaba pendiente, falló sin
+                cambios desde entonces o el procesador se está deteniendo
+        """
+        clave = os.path.abspath(ruta)
+        with self._bloqueo:
+            if self._detenido or clave in self._pendientes:
+                return False
+            if firma is not None and self._firmas_fallidas.get(clave) == firma:
+                return False
+            self._pendientes.add(clave)
+
+        if es_jsonl(ruta):
+            # Un hilo lee el inventario y reparte sus registros en el mismo pool
+            hilo = threading.Thread(target=self._procesar_jsonl, args=(clave, ruta),
+                                    name=f"jsonl:{os.path.basename(ruta)}", daemon=True)
+            with self._bloqueo:
+                self._hilos_jsonl[clave] = hilo
+            hilo.start()
+            return True
+
+        self._lugares.acquire()  # Contrapresión
+        try:
+            futuro = self._pool.submit(
+                procesar_archivo, ruta, self.carpeta_imagenes,
+                self.carpeta_salida, self.carpeta_procesados
+            )
+        except RuntimeError:
+            # El pool se cerró mientras se esperaba un lugar
+            self._lugares.release()
+            with self._bloqueo:
+                self._pendientes.discard(clave)
+            return False
+        futuro.add_done_callback(lambda f: self._terminado(clave, f, firma))
+        return True
+
+    def _enviar_registro(self, registro: dict) -> Future:
+        """Envía un registro de un JSON Lines al pool, respetando la contrapresión"""
+        return self._enviar(renderizar_registro, registro, self.carpeta_imagenes,
+                            self.carpeta_salida)
+
+    def _enviar(self, funcion: Callable, *argumentos) -> Future:
+        """Envía un trabajo suelto al pool, respetando la contrapresión"""
+        self._lugares.acquire()
+        try:
+            futuro = self._pool.submit(funcion, *argumentos)
+        except BaseException:
+            self._lugares.release()
+            raise
+        with self._bloqueo:
+            self._registros_en_vuelo += 1
+        futuro.add_done_callback(self._registro_terminado)
+        return futuro
+
+    def _registro_terminado(self, futuro: Future) -> None:
+        """Libera el lugar de un registro y actualiza los contadores"""
+        exito = (not futuro.cancelled() and futuro.exception() is None
+                 and futuro.result()[0])
+        with self._bloqueo:
+            self._registros_en_vuelo -= 1
+            if exito:
+                self._completados += 1
+            elif not futuro.cancelled():
+                self._fallidos += 1
+        self._lugares.release()
+
+    def regenerar(self, imagenes: Optional[Iterable[str]] = None) -> int:
+        """
+        Regenera los documentos que dependen de imágenes (o plantillas) modificadas.
+
+        Args:
+            imagenes (Iterable[str], opcional): Imágenes que cambiaron; None
+                revisa todas las imágenes y plantillas del índice
+
+        Returns:
+            int: Número de documentos enviados a regenerar
+        """
+        enviados = 0
+        for fila in documentos_desactualizados(imagenes):
+            with self._bloqueo:
+                if self._detenido:
+                    break
+            try:
+                self._enviar(regenerar_documento, fila)
+            except RuntimeError:
+                break  # El pool se cerró mientras se esperaba un lugar
+            enviados += 1
+        if enviados:
+            logger.info(f"🔄 {enviados} documentos enviados a regenerar")
+        return enviados
+
+    def solicitar_regeneracion(self, imagenes: Iterable[str]) -> None:
+        """
+        Pide regenerar los documentos de unas imágenes, sin esperar a que se envíen.
+
+        La búsqueda en el índice y el envío al pool (que espera lugar en la cola)
+        se hacen en el hilo de regeneración, así que quien llama (p. ej. el hilo
+        de eventos de watchdog) vuelve de inmediato. Las imágenes que cambian
+        mientras ese hilo trabaja se atienden juntas en su siguiente vuelta.
+
+        Args:
+            imagenes (Iterable[str]): Imágenes que cambiaron
+        """
+        with self._bloqueo:
+            if self._detenido:
+                return
+            self._imagenes_cambiadas.update(imagenes)
+            if self._hilo_regeneracion is None:
+                self._hilo_regeneracion = threading.Thread(
+                    target=self._regenerar_solicitadas, name="regeneracion", daemon=True
+                )
+                self._hilo_regeneracion.start()
+        self._aviso_regeneracion.set()
+
+    def _regenerar_solicitadas(self) -> None:
+        """Hilo que regenera los documentos de las imágenes pedidas con solicitar_regeneracion"""
+        while True:
+            self._aviso_regeneracion.wait()
+            self._aviso_regeneracion.clear()
+            with self._bloqueo:
+                if self._detenido:
+                    return
+                imagenes = list(self._imagenes_cambiadas)
+                self._imagenes_cambiadas.clear()
+            try:
+                self.regenerar(imagenes)
+            except Exception as e:
+                logger.error(f"❌ Error al regenerar los documentos de {', '.join(imagenes)}: {e}")
+
+    def _procesar_jsonl(self, clave: str, ruta: str) -> None:
+        """Hilo que procesa un inventario JSON Lines y luego lo mueve a procesados"""
+        logger.info(f"📥 Inventario detectado: {ruta}")
+        try:
+            resumen = procesar_jsonl(
+                ruta, self._enviar_registro, self.trabajadores + self.tamano_cola,
+                self._detener_jsonl, omitir_existentes(self.carpeta_imagenes, self.carpeta_salida)
+            )
+            if resumen['terminado']:
+                destino = os.path.join(self.carpeta_procesados, os.path.basename(ruta))
+                shutil.move(ruta, destino)
+                PuntoControl(ruta).eliminar()
+                logger.info(f"✅ Inventario procesado ({resumen['completados']} documentos, "
+                            f"{resumen['fallidos']} fallidos) y movido a: {destino}")
+            else:
+                logger.info(f"⏸️ Inventario {ruta} interrumpido en la línea {resumen['linea']}")
+        except Exception as e:
+            logger.error(f"❌ Error al procesar {ruta}: {e}")
+        finally:
+            with self._bloqueo:
+                self._pendientes.discard(clave)
+                self._hilos_jsonl.pop(clave, None)
+
+    def _terminado(self, clave: str, futuro: Future,
+                   firma: Optional[Tuple[int, int]] = None) -> None:
+        """Libera el lugar del archivo y actualiza los contadores"""
+        if futuro.cancelled():
+            # No llegó a procesarse (p. ej. al detener): no es un fallo y el
+            # archivo debe volver a intentarse aunque no cambie
+            with self._bloqueo:
+                self._pendientes.discard(clave)
+            self._lugares.release()
+            return
+        try:
+            exito = futuro.result()[0]
+        except Exception as e:  # Proceso trabajador caído
+            logger.error(f"❌ Error al procesar {clave}: {e}")
+            exito = False
+        if not exito and firma is None:
+            firma = firma_archivo(clave)
+        with self._bloqueo:
+            self._pendientes.discard(clave)
+            if exito:
+                self._completados += 1
+                self._firmas_fallidas.pop(clave, None)
+            else:
+                self._fallidos += 1
+                if firma is not None:
+                    self._firmas_fallidas[clave] = firma
+        incrementar('archivos_procesados' if exito else 'archivos_fallidos')
+        self._lugares.release()
+
+    def estado(self) -> Dict[str, int]:
+        """Devuelve trabajos en proceso, en cola, completados, fallidos e inventarios en curso"""
+        with self._bloqueo:
+            # Cada JSON suelto es un trabajo; de los JSON Lines cuentan sus registros enviados
+            pendientes = len(self._pendientes) - len(self._hilos_jsonl) + self._registros_en_vuelo
+            # El pool mantiene ocupados a todos los trabajadores mientras haya trabajo
+            en_proceso = min(pendientes, self.trabajadores)
+            return {
+                'en_proceso': en_proceso,
+                'en_cola': pendientes - en_proceso,
+                'completados': self._completados,
+                'fallidos': self._fallidos,
+                'trabajadores': self.trabajadores,
+                'inventarios': len(self._hilos_jsonl),
+            }
+
+    def ocupado(self) -> bool:
+        """Indica si queda algún archivo o documento a regenerar pendiente"""
+        with self._bloqueo:
+            return (bool(self._pendientes) or self._registros_en_vuelo > 0
+                    or bool(self._imagenes_cambiadas))
+
+    def detener(self, esperar: bool = True) -> None:
+        """
+        Deja de aceptar archivos y cierra el pool.
+
+        Args:
+            esperar (bool): Terminar antes los archivos ya aceptados (drenar)
+        """
+        with self._bloqueo:
+            self._detenido = True
+            hilos = list(self._hilos_jsonl.values())
+            if self._hilo_regeneracion is not None:
+                hilos.append(self._hilo_regeneracion)
+        # Los inventarios dejan de leer, esperan sus registros y guardan su punto de
+        # control; la regeneración deja de enviar documentos
+        self._detener_jsonl.set()
+        self._aviso_regeneracion.set()
+        if not esperar:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        for hilo in hilos:
+            hilo.join()
+        self._pool.shutdown(wait=esperar, cancel_futures=not esperar)
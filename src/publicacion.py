@@ -0,0 +1,163 @@
+"""
+Módulo de Publicación para el Generador de Documentos de Árboles
+Este módulo escribe los documentos en salida/ de forma que nadie vea nunca un
+archivo a medias, aunque varios procesos generen a la vez.
+
+Características principales:
+- Escritura en un temporal oculto junto al destino y renombrado atómico
+- Temporales distintos por proceso y por escritura: dos publicaciones del
+  mismo documento nunca se pisan a medio escribir
+- Política de fsync seleccionable: ninguno, por archivo o por lote
+- Los pendientes de la política por lote se sincronizan al salir del proceso
+"""
+
+import atexit
+import itertools
+import os
+import threading
+from typing import List, Optional
+
+from src.config import FSYNC_PUBLICACION, FSYNC_LOTE
+
+POLITICAS_FSYNC = ('ninguno', 'archivo', 'lote')
+
+# Sufijo único de los temporales de este proceso
+_contador = itertools.count()
+
+# Documentos publicados con la política 'lote' que aún no se sincronizaron
+_pendientes: List[str] = []
+_bloqueo = threading.Lock()
+
+
+def _politica(fsync: Optional[str]) -> str:
+    """Resuelve y valida la política de fsync"""
+    politica = fsync or FSYNC_PUBLICACION
+    if politica not in POLITICAS_FSYNC:
+        raise ValueError(f"Política de fsync desconocida: {politica}")
+    return politica
+
+
+def ruta_temporal(destino: str) -> str:
+    """
+    Ruta temporal para escribir un destino antes de publicarlo.
+
+    Está en la misma carpeta (mismo sistema de archivos, para que el renombrado
+    sea atómico), es oculta y no termina en la extensión del destino, así que
+    quien busque *.docx no la encuentra.
+
+    Args:
+        destino (str): Ruta final del archivo
+
+    Returns:
+        str: Ruta del temporal, única para este proceso y esta escritura
+    """
+    carpeta, nombre = os.path.split(destino)
+    return os.path.join(carpeta, f'.{nombre}.{os.getpid()}.{next(_contador)}.tmp')
+
+
+def sincronizar_archivo(ruta: str) -> None:
+    """Fuerza a disco el contenido de un archivo ya escrito"""
+    descriptor = os.open(ruta, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def sincronizar_carpeta(carpeta: str) -> None:
+    """Fuerza a disco las entradas de una carpeta (p. ej. un renombrado)"""
+    try:
+        descriptor = os.open(carpeta or '.', os.O_RDONLY)
+    except OSError:
+        return  # En Windows no se pueden abrir carpetas
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass  # Algunos sistemas de archivos no admiten fsync de carpetas
+    finally:
+        os.close(descriptor)
+
+
+def publicar_archivo(temporal: str, destino: str, fsync: Optional[str] = None) -> str:
+    """
+    Publica en su destino un temporal ya escrito y cerrado.
+
+    Args:
+        temporal (str): Ruta devuelta por ruta_temporal()
+        destino (str): Ruta final del archivo
+        fsync (str, opcional): 'ninguno', 'archivo' o 'lote'. Si es None se usa
+            FSYNC_PUBLICACION de la configuración
+
+    Returns:
+        str: Ruta del archivo publicado
+    """
+    politica = _politica(fsync)
+    if politica == 'archivo':
+        sincronizar_archivo(temporal)
+    os.replace(temporal, destino)
+    if politica == 'archivo':
+        sincronizar_carpeta(os.path.dirname(destino))
+    elif politica == 'lote':
+        with _bloqueo:
+            _pendientes.append(destino)
+            lleno = len(_pendientes) >= FSYNC_LOTE
+        if lleno:
+            sincronizar_pendientes()
+    return destino
+
+
+def publicar(destino: str, contenido: bytes, fsync: Optional[str] = None) -> str:
+    """
+    Escribe un archivo completo de forma atómica: un temporal y un renombrado.
+
+    Args:
+        destino (str): Ruta final del archivo (se reemplaza si ya existe)
+        contenido (bytes): Contenido completo del archivo
+        fsync (str, opcional): Política de durabilidad (ver publicar_archivo)
+
+    Returns:
+        str: Ruta del archivo publicado
+    """
+    temporal = ruta_temporal(destino)
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        return publicar_archivo(temporal, destino, fsync)
+    except BaseException:
+        descartar(temporal)
+        raise
+
+
+def descartar(temporal: str) -> None:
+    """Borra un temporal que no llegó a publicarse"""
+    try:
+        os.remove(temporal)
+    except FileNotFoundError:
+        pass
+
+
+def sincronizar_pendientes() -> int:
+    """
+    Fuerza a disco los documentos publicados con la política 'lote' y sus carpetas.
+
+    Returns:
+        int: Documentos sincronizados
+    """
+    with _bloqueo:
+        rutas = _pendientes[:]
+        del _pendientes[:]
+    carpetas = set()
+    for ruta in rutas:
+        try:
+            sincronizar_archivo(ruta)
+        except FileNotFoundError:
+            continue  # Reemplazado o borrado desde que se publicó
+        carpetas.add(os.path.dirname(ruta))
+    for carpeta in carpetas:
+        sincronizar_carpeta(carpeta)
+    return len(rutas)
+
+
+# Lo que quede de un lote se sincroniza al terminar el proceso (también en los
+# trabajadores del pool)
+atexit.register(sincronizar_pendientes)
@@ -0,0 +1,484 @@
+"""
+Módulo de Renderizado XML para el Generador de Documentos de Árboles
+Motor alternativo que produce el mismo word/document.xml que la ruta de
+python-docx, pero concatenando fragmentos precompilados en lugar de crear
+miles de objetos proxy (párrafos, runs, celdas).
+
+Características principales:
+- Fragmentos y estilos compilados una sola vez por plantilla
+- Texto escapado con las mismas reglas que python-docx (tabs, saltos, espacios)
+- Partes estáticas del paquete comprimidas una sola vez por política de compresión
+- Comparador de document.xml para verificar la paridad entre motores
+"""
+
+import copy
+import io
+import os
+import re
+import weakref
+import zipfile
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from lxml import etree
+from docx.enum.style import WD_STYLE_TYPE
+from docx.image.constants import MIME_TYPE
+from docx.image.image import Image as ImagenDocx
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.oxml import serialize_part_xml
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI, PackURI
+from docx.opc.pkgwriter import _ContentTypesItem
+from docx.oxml.ns import nsdecls
+from docx.shared import Emu, Inches
+
+from src.empaquetado import POLITICA_DEFECTO, PoliticaCompresion, es_medio, escribir_parte
+from src.imagenes import cargar_imagen
+from src.metricas import etapa
+from src.plantillas import PlantillaDocumento, obtener_plantilla
+from src.utils import logger
+
+# Ancho con el que se inserta la fotografía (igual que en la ruta python-docx)
+ANCHO_IMAGEN = Inches(4.0)
+
+# Caracteres que lxml rechaza dentro de un documento XML
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+_SEPARADORES_RUN = re.compile('([\t\r\n])')
+_MARCADOR = 'renderizador-xml'
+
+# Tipos de imagen que puede producir python-docx y su extensión de parte
+_TIPOS_IMAGEN = {
+    'jpg': MIME_TYPE.JPEG,
+    'png': MIME_TYPE.PNG,
+    'gif': MIME_TYPE.GIF,
+    'bmp': MIME_TYPE.BMP,
+    'tiff': MIME_TYPE.TIFF,
+}
+
+# Formato directo de cada run, equivalente a ESTILOS_CARACTER de la plantilla
+_RPR_DIRECTO = {
+    'DescripcionArbol': '<w:rPr><w:b/><w:color w:val="0066CC"/><w:sz w:val="24"/></w:rPr>',
+    'PieTabla': '<w:rPr><w:i/><w:color w:val="646464"/><w:sz w:val="18"/></w:rPr>',
+    'PieFoto': '<w:rPr><w:i/><w:color w:val="646464"/><w:sz w:val="18"/></w:rPr>',
+}
+
+
+def _texto_t(texto: str) -> str:
+    """Devuelve el elemento w:t de un fragmento de texto sin tabs ni saltos"""
+    if _CARACTERES_INVALIDOS.search(texto):
+        raise ValueError(
+            "All strings must be XML compatible: Unicode or ASCII, "
+            "no NULL bytes or control characters"
+        )
+    if len(texto.strip()) < len(texto):
+        return f'<w:t xml:space="preserve">{escape(texto)}</w:t>'
+    return f'<w:t>{escape(texto)}</w:t>'
+
+
+def _contenido_run(texto: str) -> str:
+    """Traduce texto a contenido de w:r igual que Run.text de python-docx"""
+    partes = []
+    for fragmento in _SEPARADORES_RUN.split(texto):
+        if fragmento == '\t':
+            partes.append('<w:tab/>')
+        elif fragmento in ('\r', '\n'):
+            partes.append('<w:br/>')
+        elif fragmento:
+            partes.append(_texto_t(fragmento))
+    return ''.join(partes)
+
+
+def _run(texto: str, rpr: str = '') -> str:
+    return f'<w:r>{rpr}{_contenido_run(texto)}</w:r>'
+
+
+def filas_tabla_xml(filas: Iterable[Tuple[str, str]], ancho_columna: int) -> str:
+    """
+    Genera todos los w:tr de una tabla de dos columnas en una sola pasada.
+
+    Args:
+        filas (Iterable[Tuple[str, str]]): Texto de la celda izquierda y derecha
+        ancho_columna (int): Ancho de cada columna en twips
+
+    Returns:
+        str: XML de las filas, equivalente a add_row() + cell.text por fila
+    """
+    celda = f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{ancho_columna}"/></w:tcPr><w:p>'
+    return ''.join(
+        f'<w:tr>{celda}{_run(izquierda)}</w:p></w:tc>'
+        f'{celda}{_run(derecha)}</w:p></w:tc></w:tr>'
+        for izquierda, derecha in filas
+    )
+
+
+def _parrafo(texto: str = '', estilo: Optional[str] = None) -> str:
+    """Equivalente a doc.add_paragraph(texto, style)"""
+    ppr = f'<w:pPr><w:pStyle w:val={quoteattr(estilo)}/></w:pPr>' if estilo else ''
+    if not ppr and not texto:
+        return '<w:p/>'
+    return f'<w:p>{ppr}{_run(texto) if texto else ""}</w:p>'
+
+
+class MarcoPaquete(NamedTuple):
+    """
+    Partes fijas de un paquete .docx alrededor del contenido generado.
+
+    Args:
+        zip_estatico (bytes): ZIP parcial con todas las partes que no cambian
+        documento (str): Nombre de word/document.xml dentro del ZIP
+        documento_inicio (bytes): document.xml hasta el comienzo del contenido
+        documento_fin (bytes): document.xml desde el final del contenido
+        rels (str): Nombre del archivo de relaciones de document.xml
+        rels_inicio (bytes): Relaciones antes de las de imágenes
+        rels_fin (bytes): Relaciones después de las de imágenes
+    """
+    zip_estatico: bytes
+    documento: str
+    documento_inicio: bytes
+    documento_fin: bytes
+    rels: str
+    rels_inicio: bytes
+    rels_fin: bytes
+
+
+class RenderizadorXML:
+    """
+    Renderizador compilado para una plantilla concreta.
+
+    Args:
+        plantilla (PlantillaDocumento): Plantilla de la que se toman estilos,
+            dimensiones y partes estáticas
+    """
+    def __init__(self, plantilla: PlantillaDocumento):
+        doc = plantilla.documento_base
+        parte_doc = doc.part
+        self.version = plantilla.version
+
+        # Referencias a los estilos de carácter (solo en la copia compacta de la plantilla)
+        self._rpr_compacto = {
+            nombre: f'<w:rPr><w:rStyle w:val={quoteattr(id_estilo)}/></w:rPr>'
+            for nombre, id_estilo in plantilla.estilos_compactos().items()
+        }
+
+        # Identificadores de estilo resueltos una sola vez desde la caché de la plantilla
+        self._estilo_titulo = plantilla.id_estilo('Title', WD_STYLE_TYPE.PARAGRAPH)
+        self._estilo_cita = plantilla.id_estilo('Intense Quote', WD_STYLE_TYPE.PARAGRAPH)
+        self._estilo_tabla = plantilla.id_estilo('Light Grid Accent 1', WD_STYLE_TYPE.TABLE)
+        self._estilo_tabla_ext = plantilla.id_estilo('Table Grid', WD_STYLE_TYPE.TABLE)
+
+        # Ancho de columna de las tablas de dos columnas
+        seccion = doc.sections[-1]
+        ancho = Emu(seccion.page_width - seccion.left_margin - seccion.right_margin)
+        self._ancho_columna = Emu(ancho / 2).twips
+
+        # Identificadores para la imagen
+        self._id_forma = parte_doc.next_id
+        self._rid_imagen = next(
+            f'rId{n}' for n in range(1, len(parte_doc.rels) + 2)
+            if f'rId{n}' not in parte_doc.rels
+        )
+        usados = [parte.partname.idx for parte in parte_doc.package.image_parts]
+        self._indice_imagen = next(
+            n for n in range(1, len(usados) + 2) if n not in usados
+        )
+
+        # document.xml y sus relaciones partidos alrededor del contenido generado
+        self._documento_inicio, self._documento_fin = self._partir_documento(parte_doc.element)
+        self._rels_nombre = parte_doc.partname.rels_uri.membername
+        self._rels_inicio, self._rels_fin = self._partir_rels(parte_doc.rels.xml)
+        self._documento_nombre = parte_doc.partname.membername
+        self._documento_base_uri = parte_doc.partname.baseURI
+
+        self._parte_doc = parte_doc
+        self._zips_estaticos = {}  # Política de compresión -> ZIP parcial
+
+    @staticmethod
+    def _partir_documento(elemento) -> Tuple[bytes, bytes]:
+        """Separa document.xml en la parte anterior y posterior al contenido nuevo"""
+        elemento = copy.deepcopy(elemento)
+        marcador = etree.Comment(_MARCADOR)
+        cuerpo = elemento.body
+        if cuerpo.sectPr is not None:
+            cuerpo.sectPr.addprevious(marcador)
+        else:
+            cuerpo.append(marcador)
+        inicio, fin = serialize_part_xml(elemento).split(f'<!--{_MARCADOR}-->'.encode())
+        return inicio, fin
+
+    @staticmethod
+    def _partir_rels(xml: bytes) -> Tuple[bytes, bytes]:
+        """Separa el XML de relaciones para poder añadir la de la imagen"""
+        elemento = etree.fromstring(xml)
+        elemento.append(etree.Comment(_MARCADOR))
+        serializado = etree.tostring(elemento, encoding='UTF-8', standalone=True)
+        inicio, fin = serializado.split(f'<!--{_MARCADOR}-->'.encode())
+        return inicio, fin
+
+    def marco(self, politica: PoliticaCompresion = POLITICA_DEFECTO) -> MarcoPaquete:
+        """Devuelve las partes fijas del paquete para escribir el contenido aparte"""
+        return MarcoPaquete(
+            self._zip_estatico(politica), self._documento_nombre, self._documento_inicio,
+            self._documento_fin, self._rels_nombre, self._rels_inicio, self._rels_fin
+        )
+
+    @property
+    def primer_id_forma(self) -> int:
+        """Primer id de forma (wp:docPr) libre; los siguientes también lo están"""
+        return self._id_forma
+
+    def identificadores_imagen(self) -> Iterator[Tuple[str, str]]:
+        """
+        Genera identificadores libres para las imágenes nuevas del documento.
+
+        Returns:
+            Iterator[Tuple[str, str]]: (rId, nombre de la parte sin extensión)
+        """
+        usados = {parte.partname.idx for parte in self._parte_doc.package.image_parts}
+        rid, indice = 0, 0
+        while True:
+            rid += 1
+            if f'rId{rid}' in self._parte_doc.rels:
+                continue
+            indice += 1
+            while indice in usados:
+                indice += 1
+            yield f'rId{rid}', f'/word/media/image{indice}'
+
+    def relacion_imagen(self, rid: str, nombre_parte: PackURI) -> bytes:
+        """Elemento Relationship de document.xml hacia una imagen"""
+        destino = nombre_parte.relative_ref(self._documento_base_uri)
+        return f'<Relationship Id="{rid}" Type="{RT.IMAGE}" Target="{destino}"/>'.encode('utf-8')
+
+    def _zip_estatico(self, politica: PoliticaCompresion) -> bytes:
+        """
+        Comprime una sola vez por política todas las partes que no cambian entre documentos.
+
+        Returns:
+            bytes: Archivo ZIP parcial al que se agregan las partes dinámicas
+        """
+        zip_estatico = self._zips_estaticos.get(politica)
+        if zip_estatico is None:
+            zip_estatico = self._zips_estaticos[politica] = \
+                self._comprimir_partes_estaticas(self._parte_doc, politica)
+        return zip_estatico
+
+    @staticmethod
+    def _comprimir_partes_estaticas(parte_doc, politica: PoliticaCompresion) -> bytes:
+        """Construye el ZIP parcial con las partes estáticas de la plantilla"""
+        paquete = parte_doc.package
+        partes = list(paquete.iter_parts())
+
+        tipos = _ContentTypesItem.from_parts(partes)
+        # Las imágenes se registran como Default para no depender de cada documento
+        for extension, tipo in _TIPOS_IMAGEN.items():
+            tipos._add_content_type(PackURI(f'/word/media/image.{extension}'), tipo)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            escribir_parte(zf, CONTENT_TYPES_URI.membername, tipos.blob, politica)
+            escribir_parte(zf, PACKAGE_URI.rels_uri.membername, paquete.rels.xml, politica)
+            for parte in partes:
+                if parte is parte_doc:
+                    continue
+                escribir_parte(zf, parte.partname.membername, parte.blob, politica,
+                               es_medio(parte.content_type))
+                if len(parte.rels):
+                    escribir_parte(zf, parte.partname.rels_uri.membername, parte.rels.xml,
+                                   politica)
+        return buffer.getvalue()
+
+    def _tabla(self, estilo: Optional[str], filas: Iterable[Tuple[str, str]],
+               autoajuste: bool = False) -> str:
+        """Equivalente a doc.add_table(rows, cols=2) con estilo y texto por celda"""
+        ancho = self._ancho_columna
+        return ''.join([
+            '<w:tbl><w:tblPr>',
+            f'<w:tblStyle w:val={quoteattr(estilo)}/>' if estilo else '',
+            '<w:tblW w:type="auto" w:w="0"/>',
+            '<w:tblLayout w:type="autofit"/>' if autoajuste else '',
+            '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" '
+            'w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+            '</w:tblPr><w:tblGrid>',
+            f'<w:gridCol w:w="{ancho}"/><w:gridCol w:w="{ancho}"/>',
+            '</w:tblGrid>',
+            filas_tabla_xml(filas, ancho),
+            '</w:tbl>',
+        ])
+
+    def _imagen(self, imagen: ImagenDocx, rid: str, id_forma: int) -> str:
+        """Equivalente al párrafo creado por doc.add_picture(ruta, width=4in)"""
+        cx, cy = imagen.scaled_dimensions(ANCHO_IMAGEN, None)
+        return (
+            f'<w:p><w:r><w:drawing><wp:inline {nsdecls("wp", "a", "pic", "r")}>'
+            f'<wp:extent cx="{cx}" cy="{cy}"/>'
+            f'<wp:docPr id="{id_forma}" name="Picture {id_forma}"/>'
+            '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+            '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name={quoteattr(imagen.filename)}/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            '<a:prstGeom prst="rect"/></pic:spPr></pic:pic>'
+            '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+        )
+
+    def cuerpo(self, data, carpeta_imagenes, formato_compacto: bool = False,
+               referenciar: Optional[Callable[[ImagenDocx], Tuple[str, int]]] = None
+               ) -> Tuple[str, Optional[ImagenDocx]]:
+        """
+        Genera el contenido de w:body con el mismo diseño que construir_documento.
+
+        Args:
+            referenciar (Callable, opcional): Devuelve (rId, id de forma) para la
+                imagen; por defecto los de un documento con una sola imagen
+
+        Returns:
+            Tuple[str, Image]: (xml_del_cuerpo, imagen_incrustada_o_None)
+        """
+        rpr = self._rpr_compacto if formato_compacto else _RPR_DIRECTO
+        partes = [
+            _parrafo(f"🌳 {data['nombre']}", self._estilo_titulo),
+            '<w:p/>',
+            f"<w:p>{_run(data['descripcion'], rpr['DescripcionArbol'])}</w:p>",
+            '<w:p/>',
+            _parrafo("📊 Información Técnica:", self._estilo_cita),
+            self._tabla(self._estilo_tabla, [
+                ("📍 Ubicación", data.get("ubicacion", "No especificada")),
+                ("�� Especie", data.get("especie", "Desconocida")),
+                ("📏 Altura (m)", str(data.get("altura_metros", "N/A"))),
+                ("⏳ Edad Aproximada", data.get("edad_aproximada", "N/A")),
+                ("❤️ Estado de Salud", data.get("estado_salud", "No registrado"))
+            ]),
+            '<w:p/>',
+        ]
+
+        if "pie_tabla" in data:
+            partes.append(f"<w:p>{_run(data['pie_tabla'], rpr['PieTabla'])}</w:p>")
+            partes.append('<w:p/>')
+
+        if "tabla_extendida" in data:
+            partes.append(_parrafo("📑 Información Extendida:"))
+            filas = [("Atributo", "Valor")]
+            filas.extend((entrada["atributo"], entrada["valor"]) for entrada in data["tabla_extendida"])
+            partes.append(self._tabla(self._estilo_tabla_ext, filas, autoajuste=True))
+            partes.append('<w:p/>')
+
+        partes.append(_parrafo(f"📅 Fecha de registro: {data['fecha']}"))
+        partes.append('<w:p/>')
+
+        imagen = None
+        if "imagen" in data:
+            imagen_path = os.path.join(carpeta_imagenes, data["imagen"])
+            imagen, mensaje = cargar_imagen(imagen_path)
+            if imagen is not None:
+                partes.append(_parrafo("📸 Fotografía del Árbol:"))
+                rid, id_forma = (referenciar(imagen) if referenciar is not None
+                                 else (self._rid_imagen, self._id_forma))
+                with etapa('incrustar_imagen'):
+                    partes.append(self._imagen(imagen, rid, id_forma))
+                if "pie_imagen" in data:
+                    partes.append(f"<w:p>{_run(data['pie_imagen'], rpr['PieFoto'])}</w:p>")
+            else:
+                logger.warning(f"⚠️ Problema con la imagen: {mensaje}")
+                partes.append(_parrafo(f"⚠️ Imagen no válida: {mensaje}"))
+        else:
+            partes.append(_parrafo("⚠️ No se proporcionó imagen."))
+
+        return ''.join(partes), imagen
+
+    def renderizar(self, data, carpeta_imagenes, formato_compacto: bool = False,
+                   politica: PoliticaCompresion = POLITICA_DEFECTO) -> bytes:
+        """
+        Genera el paquete .docx completo del árbol.
+
+        Args:
+            politica (PoliticaCompresion): Compresión de partes XML y medios
+
+        Returns:
+            bytes: Contenido del archivo .docx
+        """
+        with etapa('construir'):
+            cuerpo, imagen = self.cuerpo(data, carpeta_imagenes, formato_compacto)
+
+        with etapa('guardar') as medicion:
+            buffer = io.BytesIO(self._zip_estatico(politica))
+            with zipfile.ZipFile(buffer, 'a', compression=zipfile.ZIP_DEFLATED) as zf:
+                escribir_parte(
+                    zf, self._documento_nombre,
+                    self._documento_inicio + cuerpo.encode('utf-8') + self._documento_fin, politica
+                )
+                relacion = b''
+                if imagen is not None:
+                    nombre_parte = PackURI(f'/word/media/image{self._indice_imagen}.{imagen.ext}')
+                    relacion = self.relacion_imagen(self._rid_imagen, nombre_parte)
+                    escribir_parte(zf, nombre_parte.membername, imagen.blob, politica, medio=True)
+                escribir_parte(zf, self._rels_nombre,
+                               self._rels_inicio + relacion + self._rels_fin, politica)
+            contenido = buffer.getvalue()
+            medicion.escritos = len(contenido)
+        return contenido
+
+
+# Renderizadores compilados por plantilla; se descartan junto con la plantilla
+_RENDERIZADORES = weakref.WeakKeyDictionary()
+
+
+def obtener_renderizador(ruta_plantilla: Optional[str] = None,
+                         formato_compacto: bool = False) -> RenderizadorXML:
+    """Devuelve el renderizador compilado de la plantilla indicada"""
+    plantilla = obtener_plantilla(ruta_plantilla, formato_compacto)
+    renderizador = _RENDERIZADORES.get(plantilla)
+    # Se recompila si la plantilla cambió desde la última compilación
+    if renderizador is None or renderizador.version != plantilla.version:
+        renderizador = RenderizadorXML(plantilla)
+        _RENDERIZADORES[plantilla] = renderizador
+    return renderizador
+
+
+def renderizar_documento_xml(data, carpeta_imagenes, ruta_plantilla=None,
+                             formato_compacto=False, politica=None) -> bytes:
+    """
+    Genera el .docx del árbol con el motor XML.
+
+    Args:
+        data (dict): Diccionario con los datos del árbol
+        carpeta_imagenes (str): Ruta a la carpeta donde se encuentran las imágenes
+        ruta_plantilla (str, opcional): Plantilla .docx base (None para la de defecto)
+        formato_compacto (bool): Referenciar estilos de carácter en lugar de
+            formatear cada run directamente
+        politica (PoliticaCompresion, opcional): Compresión del paquete; None usa
+            la política configurada
+
+    Returns:
+        bytes: Contenido del archivo .docx
+    """
+    renderizador = obtener_renderizador(ruta_plantilla, formato_compacto)
+    return renderizador.renderizar(data, carpeta_imagenes, formato_compacto,
+                                   politica or POLITICA_DEFECTO)
+
+
+def comparar_document_xml(xml_a: bytes, xml_b: bytes) -> Tuple[bool, str]:
+    """
+    Compara dos document.xml ignorando dónde se declaran los espacios de nombres.
+
+    Returns:
+        Tuple[bool, str]: (son_iguales, mensaje con la primera diferencia)
+    """
+    def comparar(a, b, ruta):
+        if a.tag != b.tag:
+            return f"{ruta}: etiqueta {a.tag} != {b.tag}"
+        ruta = f"{ruta}/{etree.QName(a).localname}"
+        if dict(a.attrib) != dict(b.attrib):
+            return f"{ruta}: atributos {dict(a.attrib)} != {dict(b.attrib)}"
+        if (a.text or '') != (b.text or ''):
+            return f"{ruta}: texto {a.text!r} != {b.text!r}"
+        if len(a) != len(b):
+            return f"{ruta}: {len(a)} hijos != {len(b)} hijos"
+        for indice, (hijo_a, hijo_b) in enumerate(zip(a, b)):
+            diferencia = comparar(hijo_a, hijo_b, f"{ruta}[{indice}]")
+            if diferencia:
+                return diferencia
+        return ''
+
+    diferencia = comparar(etree.fromstring(xml_a), etree.fromstring(xml_b), '')
+    if diferencia:
+        return False, diferencia
+    return True, "document.xml idénticos"
@@ -0,0 +1,332 @@
+"""
+Módulo de Servicio HTTP para el Generador de Documentos de Árboles
+Este módulo genera documentos bajo demanda por HTTP local, sin pasar por las
+carpetas entrada/ y salida/.
+
+Características principales:
+- Servidor asyncio de la biblioteca estándar (HTTP/1.1 con keep-alive)
+- POST /documentos con el JSON del árbol: responde los bytes del .docx
+- Pool de procesos detrás del bucle de eventos, con la plantilla y las
+  imágenes ya cargadas en cada trabajador antes de la primera solicitud
+- Respuesta 503 inmediata cuando el pool está saturado, en lugar de acumular latencia
+- Latencia por solicitud y de renderizado (p50, p90, p99) en GET /metricas
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from src.config import (
+    CACHE_IMAGENES_BYTES, SERVICIO_HOST, SERVICIO_PUERTO, SERVICIO_MAX_CUERPO, SERVICIO_EN_COLA
+)
+from src.generador import documento_en_memoria
+from src.imagenes import cargar_imagen
+from src.metricas import VentanaLatencias, incrementar, obtener_metricas
+from src.procesamiento import crear_pool, numero_trabajadores
+from src.esquema import validar_registro
+from src.utils import logger, EXTENSIONES_PERMITIDAS
+
+TIPO_DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Registro sin imagen con el que cada trabajador recorre una vez todo el renderizado
+REGISTRO_CALENTAMIENTO = {
+    "id": "CALENTAMIENTO",
+    "nombre": "Calentamiento",
+    "descripcion": "Registro de precarga del servicio",
+    "fecha": "2024-01-01",
+    "pie_tabla": "Pie de tabla",
+    "tabla_extendida": [{"atributo": "Atributo", "valor": "Valor"}],
+}
+
+_MOTIVOS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+def _longitud_cuerpo(valor: str) -> Optional[int]:
+    """
+    Interpreta la cabecera Content-Length.
+
+    Solo se aceptan dígitos ASCII: int() también admitiría signo, espacios
+    internos o '_', y una longitud negativa haría fallar la lectura del cuerpo.
+
+    Returns:
+        int: Longitud en bytes, o None si el valor no es un entero no negativo
+    """
+    if not (valor.isascii() and valor.isdigit()):
+        return None
+    return int(valor)
+
+
+def calentar_trabajador(carpeta_imagenes: str) -> None:
+    """
+    Precarga la plantilla y las imágenes en un proceso del pool.
+
+    Se renderiza un documento de prueba (plantilla, estilos y fragmentos quedan
+    en caché) y se cargan las imágenes de la carpeta hasta llenar el
+    presupuesto de la caché de imágenes.
+
+    Args:
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+    """
+    try:
+        documento_en_memoria(REGISTRO_CALENTAMIENTO, carpeta_imagenes)
+        cargados = 0
+        for raiz, _, archivos in os.walk(carpeta_imagenes):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                if os.path.splitext(nombre)[1].lower() not in EXTENSIONES_PERMITIDAS:
+                    continue
+                cargados += os.path.getsize(ruta)
+                if cargados > CACHE_IMAGENES_BYTES:
+                    return
+                cargar_imagen(ruta)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo precargar el trabajador: {e}")
+
+
+def renderizar_solicitud(datos: dict, carpeta_imagenes: str) -> Tuple[bytes, float]:
+    """
+    Genera el .docx de una solicitud dentro de un proceso del pool.
+
+    Args:
+        datos (dict): Diccionario con los datos del árbol (ya validado)
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+
+    Returns:
+        Tuple[bytes, float]: (contenido del .docx, segundos de renderizado)
+    """
+    inicio = time.perf_counter()
+    contenido = documento_en_memoria(datos, carpeta_imagenes)
+    return contenido, time.perf_counter() - inicio
+
+
+def _respuesta_json(estado: int, cuerpo: dict) -> Tuple[int, str, bytes, Dict[str, str]]:
+    """Respuesta con un cuerpo JSON"""
+    return (estado, 'application/json; charset=utf-8',
+            json.dumps(cuerpo, ensure_ascii=False).encode('utf-8'), {})
+
+
+class ServicioDocumentos:
+    """
+    Servidor HTTP que genera documentos con un pool de procesos precargado.
+
+    Rutas:
+        POST /documentos  JSON del árbol -> .docx (400 si no es válido,
+                          503 si el pool está saturado)
+        GET  /metricas    Latencias (p50, p90, p99, máximo) y contadores
+        GET  /salud       Estado del servicio
+
+    Args:
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        trabajadores (int, opcional): Número de procesos; None usa TRABAJADORES
+        en_cola (int, opcional): Solicitudes esperando un proceso antes de
+            responder 503; None usa SERVICIO_EN_COLA
+        max_cuerpo (int): Bytes máximos del JSON recibido
+    """
+    def __init__(self, carpeta_imagenes: str, trabajadores: Optional[int] = None,
+                 en_cola: Optional[int] = None, max_cuerpo: int = SERVICIO_MAX_CUERPO):
+        self.carpeta_imagenes = carpeta_imagenes
+        self.trabajadores = numero_trabajadores(trabajadores)
+        self.max_en_vuelo = self.trabajadores + (SERVICIO_EN_COLA if en_cola is None else en_cola)
+        self.max_cuerpo = max_cuerpo
+        self.latencias = VentanaLatencias()
+        self.latencias_render = VentanaLatencias()
+        self._en_vuelo = 0
+        self._pool = crear_pool(self.trabajadores, calentar_trabajador, (carpeta_imagenes,))
+        self._servidor: Optional[asyncio.AbstractServer] = None
+
+    def precargar(self) -> None:
+        """Arranca todos los trabajadores (y su precarga) antes de aceptar solicitudes"""
+        # Cada proceso se crea al enviar trabajos; basta con ocuparlos a todos a la vez
+        futuros = [self._pool.submit(time.sleep, 0.05) for _ in range(self.trabajadores)]
+        for futuro in futuros:
+            futuro.result()
+
+    async def iniciar(self, host: str = SERVICIO_HOST,
+                      puerto: int = SERVICIO_PUERTO) -> asyncio.AbstractServer:
+        """
+        Empieza a aceptar conexiones.
+
+        Args:
+            host (str): Dirección en la que escuchar
+            puerto (int): Puerto en el que escuchar (0 elige uno libre)
+
+        Returns:
+            asyncio.AbstractServer: Servidor ya escuchando
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.precargar)
+        self._servidor = await asyncio.start_server(self._atender, host, puerto)
+        return self._servidor
+
+    def cerrar(self) -> None:
+        """Deja de aceptar conexiones y cierra el pool, cancelando lo que no empezó"""
+        if self._servidor is not None:
+            self._servidor.close()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+        """Atiende las solicitudes de una conexión (keep-alive) hasta que se cierre"""
+        try:
+            while True:
+                try:
+                    cabecera = await lector.readuntil(b'\r\n\r\n')
+                except asyncio.IncompleteReadError:
+                    break  # El cliente cerró la conexión
+                except asyncio.LimitOverrunError:
+                    await self._responder(escritor, *_respuesta_json(
+                        431, {'error': 'Cabeceras demasiado grandes'}), mantener=False)
+                    break
+
+                inicio = time.perf_counter()
+                lineas = cabecera.decode('latin-1').split('\r\n')
+                try:
+                    metodo, ruta, version = lineas[0].split(' ', 2)
+                except ValueError:
+                    await self._responder(escritor, *_respuesta_json(
+                        400, {'error': 'Solicitud mal formada'}), mantener=False)
+                    break
+                cabeceras = {}
+                for linea in lineas[1:]:
+                    nombre, _, valor = linea.partition(':')
+                    if nombre:
+                        cabeceras[nombre.strip().lower()] = valor.strip()
+                conexion = cabeceras.get('connection', '').lower()
+                mantener = (conexion != 'close' if version == 'HTTP/1.1'
+                            else conexion == 'keep-alive')
+
+                cuerpo = b''
+                if metodo == 'POST':
+                    if 'content-length' not in cabeceras:
+                        await self._responder(escritor, *_respuesta_json(
+                            411, {'error': 'Se requiere Content-Length'}), mantener=False)
+                        break
+                    longitud = _longitud_cuerpo(cabeceras['content-length'])
+                    if longitud is None:
+                        await self._responder(escritor, *_respuesta_json(
+                            400, {'error': 'Content-Length inválido'}), mantener=False)
+                        break
+                    if longitud > self.max_cuerpo:
+                        await self._responder(escritor, *_respuesta_json(
+                            413, {'error': f'Máximo {self.max_cuerpo} bytes'}), mantener=False)
+                        break
+                    cuerpo = await lector.readexactly(longitud)
+
+                estado, tipo, contenido, extra = await self._despachar(metodo, ruta, cuerpo)
+                await self._responder(escritor, estado, tipo, contenido, extra, mantener)
+                duracion = time.perf_counter() - inicio
+                if ruta == '/documentos':
+                    self.latencias.registrar(duracion)
+                    logger.info(f"🌐 {metodo} {ruta} {estado} {duracion * 1000:.1f} ms",
+                                extra={'etapa': 'solicitud', 'duracion': duracion})
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # El cliente se desconectó a mitad de una solicitud
+        finally:
+            escritor.close()
+
+    async def _despachar(self, metodo: str, ruta: str,
+                         cuerpo: bytes) -> Tuple[int, str, bytes, Dict[str, str]]:
+        """Resuelve una solicitud y devuelve (estado, tipo de contenido, cuerpo, cabeceras)"""
+        ruta = ruta.split('?', 1)[0]
+        if ruta == '/documentos':
+            if metodo != 'POST':
+                return _respuesta_json(405, {'error': 'Use POST'})
+            return await self._generar(cuerpo)
+        if ruta == '/metricas' and metodo == 'GET':
+            return _respuesta_json(200, {
+                'solicitudes': self.latencias.resumen(),
+                'renderizado': self.latencias_render.resumen(),
+                'en_vuelo': self._en_vuelo,
+                'trabajadores': self.trabajadores,
+                'contadores': obtener_metricas(),
+            })
+        if ruta == '/salud' and metodo == 'GET':
+            return _respuesta_json(200, {'estado': 'ok'})
+        return _respuesta_json(404, {'error': f'Ruta desconocida: {ruta}'})
+
+    async def _generar(self, cuerpo: bytes) -> Tuple[int, str, bytes, Dict[str, str]]:
+        """Valida el JSON recibido y lo renderiza en el pool"""
+        try:
+            datos = json.loads(cuerpo)
+        except ValueError as e:
+            return _respuesta_json(400, {'error': f'JSON inválido: {e}'})
+        try:
+            errores = validar_registro(datos)
+        except Exception as e:
+            # Un fallo del validador es culpa del registro recibido, no del servicio
+            return _respuesta_json(400, {'error': f'Registro inválido: {e}'})
+        if errores:
+            return _respuesta_json(400, {'error': 'Registro inválido', 'errores': errores})
+
+        # Con el pool saturado, esperar solo haría crecer la latencia de todos
+        if self._en_vuelo >= self.max_en_vuelo:
+            incrementar('servicio_rechazadas')
+            estado, tipo, contenido, extra = _respuesta_json(503, {'error': 'Servicio saturado'})
+            extra['Retry-After'] = '1'
+            return estado, tipo, contenido, extra
+
+        self._en_vuelo += 1
+        try:
+            contenido, segundos = await asyncio.get_running_loop().run_in_executor(
+                self._pool, renderizar_solicitud, datos, self.carpeta_imagenes
+            )
+        except Exception as e:
+            logger.error(f"❌ Error al generar el documento {datos.get('id')}: {e}")
+            incrementar('servicio_errores')
+            return _respuesta_json(500, {'error': str(e)})
+        finally:
+            self._en_vuelo -= 1
+
+        self.latencias_render.registrar(segundos)
+        incrementar('servicio_documentos')
+        nombre = ''.join(c for c in str(datos['id']) if c.isalnum() or c in '-_') or 'documento'
+        return 200, TIPO_DOCX, contenido, {
+            'Content-Disposition': f'attachment; filename="{nombre}.docx"',
+            'Server-Timing': f'render;dur={segundos * 1000:.1f}',
+        }
+
+    @staticmethod
+    async def _responder(escritor: asyncio.StreamWriter, estado: int, tipo: str, contenido: bytes,
+                         extra: Dict[str, str], mantener: bool = True) -> None:
+        """Escribe la respuesta HTTP completa"""
+        cabeceras = [
+            f'HTTP/1.1 {estado} {_MOTIVOS.get(estado, "")}',
+            f'Content-Type: {tipo}',
+            f'Content-Length: {len(contenido)}',
+            f'Connection: {"keep-alive" if mantener else "close"}',
+        ]
+        cabeceras.extend(f'{nombre}: {valor}' for nombre, valor in extra.items())
+        escritor.write(('\r\n'.join(cabeceras) + '\r\n\r\n').encode('latin-1') + contenido)
+        await escritor.drain()
+
+
+async def servir(carpeta_imagenes: str, host: str = SERVICIO_HOST, puerto: int = SERVICIO_PUERTO,
+                 trabajadores: Optional[int] = None) -> None:
+    """
+    Ejecuta el servicio hasta que se cancele (Ctrl+C).
+
+    Args:
+        carpeta_imagenes (str): Carpeta donde se encuentran las imágenes
+        host (str): Dirección en la que escuchar
+        puerto (int): Puerto en el que escuchar
+        trabajadores (int, opcional): Número de procesos; None usa TRABAJADORES
+    """
+    servicio = ServicioDocumentos(carpeta_imagenes, trabajadores)
+    try:
+        servidor = await servicio.iniciar(host, puerto)
+        logger.info(f"🌐 Servicio escuchando en http://{host}:{puerto} con "
+                    f"{servicio.trabajadores} procesos precargados. Presiona Ctrl+C para detener...")
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        servicio.cerrar()
+        resumen = servicio.latencias.resumen()
+        if resumen['ventana']:
+            logger.info(f"📈 {resumen['total']} solicitudes, p50 {resumen['p50_ms']:.1f} ms, "
+                        f"p99 {resumen['p99_ms']:.1f} ms")
@@ -3,7 +3,7 @@ Módulo de Utilidades para el Generador de Documentos de Árboles
 Este módulo proporciona funciones y configuraciones comunes utilizadas en todo el proyecto.
 
 Características principales:
-- Sistema de logging centralizado
+- Sistema de logging centralizado (encolado, ver src/bitacora.py)
 - Validación de imágenes y JSON
 - Gestión de archivos y carpetas
 - Generación de nombres únicos
@@ -12,20 +12,16 @@ Características principales:
 import os
 import logging
 from datetime import datetime
-from typing import List, Dict, Union, Tuple
+from typing import List, Dict, Optional, Union, Tuple
 from PIL import Image
+from src.bitacora import configurar_bitacora
+from src.esquema import validar_registro
 
 # Configuración del sistema de logging
-# Establece dos handlers: uno para archivo (app.log) y otro para consola
+# Los registros se encolan y un hilo en segundo plano los escribe en consola y
+# en app.log (con rotación); ver src/bitacora.py
 # Formato: [Fecha y Hora] - [Nivel de Log] - Mensaje
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),  # Almacena logs en archivo
-        logging.StreamHandler()          # Muestra logs en consola
-    ]
-)
+configurar_bitacora()
 logger = logging.getLogger(__name__)
 
 # Definición de constantes para validación de imágenes
@@ -85,11 +81,9 @@ def validar_json(datos: Dict) -> Tuple[bool, str]:
     """
     Valida la estructura y contenido de un JSON de árbol.
 
-    Validaciones:
-    1. Campos requeridos presentes
-    2. Formato de fecha válido (YYYY-MM-DD)
-    3. Tipos de datos correctos
-    4. Valores numéricos válidos (si existen)
+    Aplica el esquema completo de src.esquema (tipos de todos los campos,
+    fecha, números y filas de tabla_extendida) y reporta todos los errores
+    del registro, no solo el primero.
 
     Args:
         datos (Dict): Diccionario con los datos del árbol
@@ -97,30 +91,12 @@ def validar_json(datos: Dict) -> Tuple[bool, str]:
     Returns:
         Tuple[bool, str]: (es_valido, mensaje)
             - es_valido: True si el JSON es válido
-            - mensaje: Descripción del resultado o error
+            - mensaje: Descripción del resultado o errores separados por "; "
     """
-    campos_requeridos = ['id', 'nombre', 'descripcion', 'fecha']
-    
-    try:
-        for campo in campos_requeridos:
-            if campo not in datos:
-                return False, f"Campo requerido faltante: {campo}"
-
-        try:
-            datetime.strptime(datos['fecha'], '%Y-%m-%d')
-        except ValueError:
-            return False, "Formato de fecha inválido. Use: YYYY-MM-DD"
-
-        if 'altura_metros' in datos:
-            try:
-                float(datos['altura_metros'])
-            except ValueError:
-                return False, "La altura debe ser un número"
-
-        return True, "JSON válido"
-    except Exception as e:
-        logger.error(f"Error al validar JSON: {str(e)}")
-        return False, f"Error al validar JSON: {str(e)}"
+    errores = validar_registro(datos)
+    if errores:
+        return False, "; ".join(errores)
+    return True, "JSON válido"
 
 def crear_carpetas_necesarias(rutas: List[str]) -> None:
     """Crea las carpetas necesarias si no existen"""
@@ -132,8 +108,23 @@ def crear_carpetas_necesarias(rutas: List[str]) -> None:
             logger.error(f"Error al crear carpeta {ruta}: {str(e)}")
             raise
 
-def generar_nombre_archivo(nombre_base: str, extension: str) -> str:
-    """Genera un nombre de archivo único"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+def generar_nombre_archivo(nombre_base: str, extension: str, huella: Optional[str] = None) -> str:
+    """
+    Genera un nombre de archivo único.
+
+    Con huella (hash del contenido) el nombre es determinista: el mismo
+    contenido produce siempre el mismo nombre y contenidos distintos no
+    coinciden, aunque se generen en el mismo segundo y en paralelo. Sin huella
+    se usa la fecha y hora actual.
+
+    Args:
+        nombre_base (str): Nombre base (p. ej. el id del árbol)
+        extension (str): Extensión del archivo
+        huella (str, opcional): Hash hexadecimal del contenido
+
+    Returns:
+        str: Nombre del archivo
+    """
+    sufijo = huella[:16] if huella else datetime.now().strftime('%Y%m%d_%H%M%S')
     nombre_limpio = ''.join(c for c in nombre_base if c.isalnum() or c in '-_')
-    return f"{nombre_limpio}_{timestamp}{extension}"
+    return f"{nombre_limpio}_{sufijo}{extension}"
@@ -1,9 +1,19 @@
 # Archivo principal que inicia el sistema de observación
+import argparse
+
 # Importa la función principal del módulo observador
 from src.observador import iniciar_observador
+# Opciones de perfilado compartidas con main.py (--profile)
+from src.perfilado import agregar_argumentos, desde_argumentos
 
 # Punto de entrada principal del programa
 # Solo se ejecuta si este archivo se ejecuta directamente
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Observa entrada/ y genera los documentos")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="Número de procesos (por defecto, TRABAJADORES o todos los núcleos)")
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+
     # Inicia el sistema de observación de la carpeta de entrada
-    iniciar_observador()
\ No newline at end of file
+    iniciar_observador(args.jobs, perfilado=desde_argumentos(args))